@@ -0,0 +1,119 @@
+import functools
+from django.conf import settings
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+from . import search
+from .catalog_cache import async_cached_response
+from .stream_urls import async_with_stream_urls
+from .models import Album, Artist, Playlist, PlaylistSong, Song
+from .serializers import AlbumsSerializer, ArtistSerializer, PlaylistDetailSerializer, PlaylistSerializer, SongSerializer
+from .views import in_ranking_order, song_listing
+
+# Bản async của các API đọc catalog gọi nhiều nhất, dùng ORM async của Django (aget, async for...).
+# Chạy bằng ASGI (daphne backend.asgi:application) thì phần còn lại của request (middleware, cache,
+# serialize, chờ client) chạy trên event loop; driver DB vẫn là sync nên ORM async chỉ mượn một
+# luồng trong lúc chạy câu SQL. View sync dưới ASGI thì bị bọc cả view trong sync_to_async, giữ
+# luồng suốt request. Số liệu thực tế: python manage.py benchmark http.
+# Response giống hệt bản sync trong app/views.py (cùng serializer, cùng JSONRenderer của DRF và cùng
+# mục cache catalog). Các view này không qua xác thực / throttle của DRF vì catalog là dữ liệu công khai;
+# token chỉ được đọc để cấp link phát theo gói (app/stream_urls.py).
+# urls.py chọn bản async hay sync theo CATALOG_ASYNC_VIEWS.
+
+
+def _render(response):
+    # Response của DRF cần renderer mà bình thường APIView gán sau khi chọn định dạng
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = response.accepted_renderer.media_type
+    response.renderer_context = {}
+    return response
+
+
+def async_api_view(view):
+    # Tương đương @api_view(['GET']) cho view async: chỉ nhận GET, lỗi DRF (ValidationError...)
+    # thành response như exception_handler mặc định
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            exc = exceptions.MethodNotAllowed(request.method)
+            return _render(Response({'detail': exc.detail}, status=exc.status_code, headers={'Allow': 'GET, HEAD'}))
+        try:
+            response = await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = exception_handler(exc, {})
+        return _render(response)
+    return wrapper
+
+
+@async_api_view
+@async_with_stream_urls
+@async_cached_response('songs')
+async def get_songs(request):
+    search_query = request.GET.get('search', '').strip()
+    ranking = await search.asearch_song_ids(search_query) if search_query else None
+    error, fields, songs, paginator = song_listing(request, ranking)
+    if error:
+        return error
+    if paginator:
+        page = await paginator.apaginate_queryset(songs)
+        serializer = SongSerializer(page, many=True, fields=fields)
+        return Response(paginator.get_paginated_data(serializer.data))
+    if ranking is not None:
+        songs = in_ranking_order(await songs.ain_bulk(ranking), ranking)
+    else:
+        songs = [song async for song in songs]
+    serializer = SongSerializer(songs, many=True, fields=fields)
+    return Response(serializer.data)
+
+
+@async_api_view
+@async_with_stream_urls
+async def get_song_by_id(request, song_id):
+    try:
+        song = await Song.objects.for_listing().aget(id=song_id)
+    except Song.DoesNotExist:
+        return Response({'message': 'Không tìm thấy bài hát'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(SongSerializer(song).data, status=status.HTTP_200_OK)
+
+
+@async_api_view
+@async_cached_response('albums')
+async def get_albums(request):
+    albums = [album async for album in Album.objects.select_related('artist')]
+    return Response(AlbumsSerializer(albums, many=True).data)
+
+
+@async_api_view
+@async_cached_response('albums')
+async def get_album_details(request, pk):
+    try:
+        album = await Album.objects.select_related('artist').aget(pk=pk)
+    except Album.DoesNotExist:
+        return Response({'message': 'Album không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(AlbumsSerializer(album).data, status=status.HTTP_200_OK)
+
+
+@async_api_view
+@async_cached_response('artists')
+async def get_artists(request):
+    artists = [artist async for artist in Artist.objects.all()]
+    return Response(ArtistSerializer(artists, many=True).data)
+
+
+@async_api_view
+@async_with_stream_urls
+async def get_playlist(request, pk):
+    try:
+        playlist = await Playlist.objects.with_summary().aget(pk=pk)
+    except Playlist.DoesNotExist:
+        return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    # Serializer đọc ảnh xem trước / danh sách bài từ context thay vì tự query
+    context = {'cover_images': await PlaylistSong.objects.acover_images([playlist.id], settings.PLAYLIST_COVER_PREVIEW)}
+    if request.GET.get('summary') in ('1', 'true'):
+        return Response(PlaylistSerializer(playlist, context=context).data)
+    context['playlist_songs'] = [
+        playlist_song async for playlist_song in
+        PlaylistSong.objects.for_listing().filter(playlist=playlist).order_by('position', 'id')
+    ]
+    return Response(PlaylistDetailSerializer(playlist, context=context).data)
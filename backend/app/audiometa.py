@@ -0,0 +1,310 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from .models import Song
+from . import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+# Đọc thông tin file MP3 phía server (thời lượng, bitrate, sample rate, ảnh bìa nhúng trong ID3)
+# thay cho duration client gửi lên. Phần phân tích file là hàm thuần (không đụng DB) để chạy
+# trong ProcessPoolExecutor; việc ghi kết quả vào Song làm ở tiến trình chính.
+
+_BITRATES = {
+    # (MPEG-1?, layer) -> kbps theo chỉ số 0..14
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+SYNC_BLOCK = 64 * 1024  # cỡ khối đọc khi tìm frame đầu tiên
+_ARTWORK_EXTENSIONS = {'image/jpeg': '.jpg', 'image/jpg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'}
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def parse_frame_header(header):
+    # Trả về dict thông tin frame MPEG audio, None nếu 4 byte không phải header hợp lệ
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][sample_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = (samples // 8) * bitrate * 1000 // sample_rate + padding
+    mono = ((header[3] >> 6) & 0x03) == 3
+    return {
+        'mpeg1': mpeg1, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+        'samples': samples, 'length': length, 'mono': mono,
+    }
+
+
+def _parse_apic(frame):
+    # APIC: encoding, MIME\0, loại ảnh, mô tả\0 (theo encoding), dữ liệu ảnh
+    encoding = frame[0]
+    mime_end = frame.index(b'\x00', 1)
+    mime = frame[1:mime_end].decode('latin-1').lower() or 'image/jpeg'
+    start = mime_end + 2
+    terminator = b'\x00\x00' if encoding in (1, 2) else b'\x00'
+    end = frame.index(terminator, start)
+    # UTF-16: cặp \x00\x00 kết thúc phải nằm đúng ranh giới 2 byte
+    while len(terminator) == 2 and (end - start) % 2:
+        end = frame.index(terminator, end + 1)
+    position = end + len(terminator)
+    if mime == 'jpg':
+        mime = 'image/jpeg'
+    elif '/' not in mime:
+        mime = f'image/{mime}'
+    return mime, frame[position:]
+
+
+def _read_at(audio_file, offset, size):
+    audio_file.seek(offset)
+    return audio_file.read(size)
+
+
+def read_id3v2(audio_file):
+    # Trả về (kích thước tag kể cả header, (mime, bytes) ảnh bìa hoặc None). Chỉ đọc header của
+    # từng frame và thân frame ảnh bìa; các frame khác bỏ qua bằng seek
+    header = _read_at(audio_file, 0, 10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0, None
+    version = header[3]
+    flags = header[5]
+    size = _syncsafe(header[6:10]) + 10 + (10 if flags & 0x10 else 0)
+    artwork = None
+    position = 10
+    if flags & 0x40 and version >= 3:
+        # Bỏ qua extended header
+        extended = audio_file.read(4)
+        if len(extended) < 4:
+            return size, None
+        position += _syncsafe(extended) if version == 4 else int.from_bytes(extended, 'big') + 4
+    frame_header = 10 if version >= 3 else 6
+    while position + frame_header <= size:
+        raw = _read_at(audio_file, position, frame_header)
+        if len(raw) < frame_header:
+            break
+        if version >= 3:
+            frame_id = raw[:4]
+            frame_size = _syncsafe(raw[4:8]) if version == 4 else int.from_bytes(raw[4:8], 'big')
+        else:
+            frame_id = raw[:3]
+            frame_size = int.from_bytes(raw[3:6], 'big')
+        if not frame_id.strip(b'\x00') or frame_size <= 0:
+            break
+        if artwork is None and frame_id in (b'APIC', b'PIC'):
+            body = audio_file.read(min(frame_size, size - position - frame_header))
+            try:
+                if frame_id == b'PIC':
+                    # ID3v2.2: định dạng ảnh 3 ký tự thay cho MIME
+                    image_format = body[1:4].decode('latin-1').lower()
+                    mime, image = _parse_apic(body[:1] + f'image/{image_format}'.encode() + b'\x00' + body[4:])
+                else:
+                    mime, image = _parse_apic(body)
+                if image:
+                    artwork = (mime, image)
+            except (ValueError, IndexError):
+                pass
+        position += frame_header + frame_size
+    return size, artwork
+
+
+def _xing_frames(data, offset, frame):
+    # Header Xing/Info (VBR do LAME ghi) hoặc VBRI (Fraunhofer) chứa sẵn tổng số frame
+    if frame['mpeg1']:
+        side_info = 17 if frame['mono'] else 32
+    else:
+        side_info = 9 if frame['mono'] else 17
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 0x01:
+            return int.from_bytes(data[xing + 8:xing + 12], 'big')
+    vbri = offset + 36
+    if data[vbri:vbri + 4] == b'VBRI':
+        return int.from_bytes(data[vbri + 14:vbri + 18], 'big')
+    return None
+
+
+def _find_first_frame(audio_file, offset, end):
+    # Frame đầu tiên sau tag (bỏ qua rác giữa tag và audio): tìm byte đồng bộ theo từng khối,
+    # nhận khi frame kế tiếp cũng hợp lệ
+    while offset + 4 <= end:
+        block = _read_at(audio_file, offset, min(SYNC_BLOCK, end - offset))
+        index = block.find(b'\xff')
+        while index >= 0 and offset + index + 4 <= end:
+            candidate = offset + index
+            first = parse_frame_header(_read_at(audio_file, candidate, 4))
+            if first and candidate + first['length'] + 4 <= end:
+                if parse_frame_header(_read_at(audio_file, candidate + first['length'], 4)):
+                    return candidate, first
+            elif first and candidate + first['length'] == end:
+                return candidate, first
+            index = block.find(b'\xff', index + 1)
+        offset += len(block)
+    raise ValueError('Không tìm thấy frame MPEG audio')
+
+
+def extract_metadata(path):
+    # Hàm thuần, chạy được trong tiến trình con: trả về dict hoặc ném ValueError nếu không đọc được.
+    # Đọc file bằng seek / read từng phần (tag ID3, header từng frame) thay vì nạp cả file, bộ nhớ
+    # mỗi worker không phụ thuộc cỡ file
+    with open(path, 'rb') as audio_file:
+        end = os.fstat(audio_file.fileno()).st_size
+        tag_size, artwork = read_id3v2(audio_file)
+        if end >= 128 and _read_at(audio_file, end - 128, 3) == b'TAG':
+            end -= 128  # ID3v1 ở cuối file
+
+        audio_start, first = _find_first_frame(audio_file, tag_size, end)
+        frame_count = _xing_frames(_read_at(audio_file, audio_start, 64), 0, first)
+        if frame_count:
+            samples = frame_count * first['samples']
+            audio_bytes = end - audio_start
+        else:
+            # Không có header VBR: đi qua từng frame để tính chính xác (seek trong buffer của file)
+            samples = 0
+            position = audio_start
+            while position + 4 <= end:
+                frame = parse_frame_header(_read_at(audio_file, position, 4))
+                if frame is None or frame['length'] <= 0:
+                    break
+                samples += frame['samples']
+                position += frame['length']
+            audio_bytes = position - audio_start
+    duration = samples / first['sample_rate']
+    bitrate = round(audio_bytes * 8 / duration / 1000) if duration else first['bitrate']
+    return {
+        'duration': duration,
+        'bitrate': bitrate,
+        'sample_rate': first['sample_rate'],
+        'artwork': artwork,
+    }
+
+
+def song_path(song_url):
+    return os.path.join(str(settings.MEDIA_ROOT), *song_url.split('/'))
+
+
+def apply_metadata(song_id, metadata):
+    from .storage import album_cover_store
+
+    song = Song.objects.only('id', 'artwork').filter(id=song_id).first()
+    if song is None:
+        return
+    updates = {
+        # Làm tròn lên để bài 3:20.4 không bị hiển thị thành 3:20
+        'duration': max(int(-(-metadata['duration'] // 1)), 1),
+        'bitrate': metadata['bitrate'],
+        'sample_rate': metadata['sample_rate'],
+    }
+    artwork_name = None
+    if metadata.get('artwork'):
+        mime, image = metadata['artwork']
+        extension = _ARTWORK_EXTENSIONS.get(mime, '.jpg')
+        artwork_name = album_cover_store.save(ContentFile(image, name=f'artwork{extension}'))
+        updates['artwork'] = artwork_name
+    with transaction.atomic():
+        Song.objects.filter(id=song_id).update(**updates)
+        if artwork_name and artwork_name != song.artwork:
+            album_cover_store.acquire(artwork_name)
+            album_cover_store.release(song.artwork)
+    # update() không phát signal nên tự làm cũ cache danh sách bài hát
+    catalog_cache.invalidate('songs')
+
+
+def extract_song(song_id):
+    song_url = Song.objects.filter(id=song_id).values_list('song_url', flat=True).first()
+    if song_url is None:
+        return None
+    metadata = extract_metadata(song_path(song_url))
+    apply_metadata(song_id, metadata)
+    return metadata
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=settings.AUDIO_METADATA_WORKERS)
+    return _executor
+
+
+def _on_extracted(song_id, future):
+    # Chạy ở luồng quản lý của executor trong tiến trình chính
+    try:
+        apply_metadata(song_id, future.result())
+    except Exception:
+        logger.exception('Không đọc được thông tin file của bài hát %s', song_id)
+    finally:
+        connection.close()
+
+
+def _submit(song_id, path):
+    future = _get_executor().submit(extract_metadata, path)
+    future.add_done_callback(lambda done: _on_extracted(song_id, done))
+
+
+def enqueue_song(song_id, song_url):
+    # Đọc file ở tiến trình con sau khi transaction lưu bài hát đã commit, request không phải chờ
+    if not settings.AUDIO_METADATA_ENABLED:
+        return
+    if settings.AUDIO_METADATA_WORKERS <= 0:
+        transaction.on_commit(lambda: extract_song(song_id))
+    else:
+        path = song_path(song_url)
+        transaction.on_commit(lambda: _submit(song_id, path))
+
+
+def extract_many(songs, workers=None, chunksize=16):
+    # Dùng cho import hàng loạt: phân tích song song trên nhiều core, ghi kết quả tuần tự.
+    # songs là iterable (id, song_url); trả về (số bài thành công, danh sách (id, lỗi))
+    songs = list(songs)
+    workers = workers or os.cpu_count() or 1
+    done, failed = 0, []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        paths = [song_path(song_url) for _, song_url in songs]
+        results = executor.map(_safe_extract, paths, chunksize=chunksize)
+        for (song_id, _), (metadata, error) in zip(songs, results):
+            if error:
+                failed.append((song_id, error))
+                continue
+            apply_metadata(song_id, metadata)
+            done += 1
+    return done, failed
+
+
+def _safe_extract(path):
+    try:
+        return extract_metadata(path), None
+    except (OSError, ValueError) as e:
+        return None, str(e)
@@ -0,0 +1,254 @@
+import hashlib
+import threading
+import time
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from dataclasses import dataclass
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core import signing
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from .models import User
+
+# Xác thực người dùng:
+# - User.password_hash lưu bằng hasher đứng đầu PASSWORD_HASHERS (scrypt). Mật khẩu cũ còn lưu
+#   dạng chữ thường hoặc băm bằng thông số cũ được băm lại ngay lần đăng nhập đúng đầu tiên
+# - login trả về access token ký bằng SECRET_KEY (django.core.signing), không lưu ở server:
+#   id user + dấu vân tay của password_hash, hết hạn sau AUTH_TOKEN_MAX_AGE giây; đổi mật khẩu
+#   làm mọi token cũ mất hiệu lực
+# - token đã kiểm tra được giữ trong một LRU trong tiến trình (AUTH_TOKEN_CACHE_SIZE mục, sống
+#   AUTH_TOKEN_CACHE_TTL giây) cùng isPremium / status, nên request có token không cần query user.
+#   Thay đổi user trong chính tiến trình này xóa mục cache ngay; tiến trình khác thấy sau tối đa TTL
+# Client gửi "Authorization: Bearer <token>". Mặc định (AUTH_REQUIRE_TOKEN = True) user_id do client
+# gửi mà không kèm token bị từ chối (401); False chỉ để chạy với client cũ chưa gửi token.
+
+TOKEN_SALT = 'app.auth.token'
+KEYWORD = b'bearer'
+
+
+def is_hashed(encoded):
+    try:
+        identify_hasher(encoded)
+    except ValueError:
+        return False
+    return True
+
+
+def hash_password(raw_password):
+    return make_password(raw_password)
+
+
+def verify_password(user, raw_password):
+    # Đúng mật khẩu mà password_hash chưa theo hasher / thông số hiện tại thì băm lại và lưu
+    encoded = user.password_hash or ''
+
+    def rehash(raw):
+        user.password_hash = hash_password(raw)
+        User.objects.filter(id=user.id).update(password_hash=user.password_hash)
+
+    if not is_hashed(encoded):
+        # Dữ liệu cũ lưu mật khẩu dạng chữ thường
+        if encoded and constant_time_compare(raw_password, encoded):
+            rehash(raw_password)
+            return True
+        return False
+    return check_password(raw_password, encoded, setter=rehash)
+
+
+def set_password(user, raw_password):
+    user.password_hash = hash_password(raw_password)
+    User.objects.filter(id=user.id).update(password_hash=user.password_hash)
+    invalidate_user(user.id)
+
+
+def _fingerprint(password_hash):
+    return hashlib.sha256((password_hash or '').encode()).hexdigest()[:12]
+
+
+def issue_token(user):
+    return signing.dumps({'uid': user.id, 'pwd': _fingerprint(user.password_hash)}, salt=TOKEN_SALT, compress=True)
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    # Ảnh chụp các trường user cần cho phân quyền, giữ trong cache thay cho model
+    id: int
+    username: str
+    email: str
+    isPremium: bool
+    status: int
+
+    is_authenticated = True
+    is_anonymous = False
+
+
+class TokenCache:
+    # LRU token -> (AuthUser, hết hạn lúc); user_tokens để xóa mọi token của một user
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._user_tokens = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token, user):
+        with self._lock:
+            self._entries[token] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            self._user_tokens.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                old_token, (old_user, _) = self._entries.popitem(last=False)
+                self._discard(old_user.id, old_token)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in self._user_tokens.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def _discard(self, user_id, token):
+        tokens = self._user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._user_tokens[user_id]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+    return _cache
+
+
+def invalidate_user(user_id):
+    # Sau commit: request khác không kịp nạp lại bản ghi cũ vào cache trước khi transaction ghi xong
+    transaction.on_commit(lambda: get_token_cache().invalidate_user(user_id))
+
+
+def _on_user_change(sender, instance, **kwargs):
+    invalidate_user(instance.id)
+
+
+def connect_signals():
+    # Khóa / mở tài khoản, đổi premium (kể cả từ admin / VNPay) làm cũ token đã cache của user đó
+    post_save.connect(_on_user_change, sender=User, dispatch_uid='auth_user_save')
+    post_delete.connect(_on_user_change, sender=User, dispatch_uid='auth_user_delete')
+
+
+def authenticate_token(token):
+    # Trả về AuthUser hoặc ném AuthenticationFailed; chỉ query DB khi token chưa có trong cache
+    user = get_token_cache().get(token)
+    if user is not None:
+        return user
+    return _load_token(token)
+
+
+def _load_token(token):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed('Token đã hết hạn, vui lòng đăng nhập lại')
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed('Token không hợp lệ')
+    row = User.objects.filter(id=payload.get('uid')).values(
+        'id', 'username', 'email', 'isPremium', 'status', 'password_hash'
+    ).first()
+    if row is None or not constant_time_compare(_fingerprint(row.pop('password_hash')), payload.get('pwd', '')):
+        raise exceptions.AuthenticationFailed('Token không hợp lệ')
+    if row['status'] != 1:
+        raise exceptions.AuthenticationFailed('Tài khoản đã bị khóa hoặc chưa kích hoạt')
+    user = AuthUser(**{**row, 'isPremium': bool(row['isPremium'])})
+    get_token_cache().set(token, user)
+    return user
+
+
+def _bearer_token(request):
+    header = get_authorization_header(request).split()
+    if not header or header[0].lower() != KEYWORD:
+        return None
+    if len(header) != 2:
+        raise exceptions.AuthenticationFailed('Header Authorization không hợp lệ')
+    return header[1].decode()
+
+
+async def aauthenticate(request):
+    # Cho view async (không qua DRF): AuthUser, None nếu không gửi token, AuthenticationFailed nếu
+    # token sai; chỉ mượn luồng để query khi token chưa có trong cache
+    token = _bearer_token(request)
+    if token is None:
+        return None
+    user = get_token_cache().get(token)
+    if user is not None:
+        return user
+    return await sync_to_async(_load_token)(token)
+
+
+class TokenAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        token = _bearer_token(request)
+        if token is None:
+            return None
+        return authenticate_token(token), token
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+def current_user(request):
+    user = getattr(request, 'user', None)
+    return user if isinstance(user, AuthUser) else None
+
+
+def resolve_user_id(request, claimed=None):
+    # Người gọi: lấy từ token nếu có (user_id client gửi kèm phải trùng); không có token thì
+    # dùng user_id client gửi khi AUTH_REQUIRE_TOKEN = False
+    user = current_user(request)
+    if user is not None:
+        if claimed not in (None, '') and str(claimed) != str(user.id):
+            raise exceptions.PermissionDenied('user_id không khớp với token')
+        return user.id
+    if claimed in (None, ''):
+        return None
+    if settings.AUTH_REQUIRE_TOKEN:
+        raise exceptions.NotAuthenticated('Cần đăng nhập')
+    try:
+        return int(claimed)
+    except (TypeError, ValueError):
+        raise exceptions.ValidationError({'user_id': 'user_id phải là số nguyên'})
+
+
+def user_is_premium(request, user_id):
+    # Không query khi người gọi đã xác thực bằng token
+    user = current_user(request)
+    if user is not None and user.id == user_id:
+        return user.isPremium
+    if user_id is None:
+        return False
+    return User.objects.filter(id=user_id, isPremium=True).exists()
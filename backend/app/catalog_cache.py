@@ -0,0 +1,191 @@
+import functools
+import hashlib
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+# Cache các response đọc catalog (album, nghệ sĩ, bài hát) đã serialize sẵn.
+# Khóa có phiên bản theo nhóm: ghi vào nhóm nào chỉ cần tăng số phiên bản của nhóm đó,
+# các khóa cũ tự hết hạn, không phải tìm và xóa từng khóa. ETag dựng từ số phiên bản nên
+# trả 304 được mà không cần đọc dữ liệu đã cache.
+# Backend cấu hình qua CACHES[CATALOG_CACHE_ALIAS]: LocMemCache cho dev/test, RedisCache cho prod.
+
+# Thay đổi ở model nào làm cũ những nhóm nào (tên nghệ sĩ / album nằm trong response bài hát)
+INVALIDATES = {
+    'Artist': ('artists', 'albums', 'songs'),
+    'Album': ('albums', 'songs'),
+    'Song': ('songs',),
+}
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else None
+    return data
+
+
+def _version_key(namespace):
+    return f'catalog:version:{namespace}'
+
+
+def get_versions(namespaces):
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    missing = {key: 1 for key in keys if key not in found}
+    if missing:
+        # add() không ghi đè nếu tiến trình khác vừa tạo phiên bản
+        for key in missing:
+            cache.add(key, 1, timeout=None)
+        found.update(cache.get_many(list(missing)))
+    return [found.get(key, 1) for key in keys]
+
+
+async def aget_versions(namespaces):
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, 1, timeout=None)
+        found.update(await cache.aget_many(missing))
+    return [found.get(key, 1) for key in keys]
+
+
+def invalidate(*namespaces):
+    cache = get_cache()
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, timeout=None)
+    _count('invalidations')
+
+
+def invalidate_on_commit(*namespaces):
+    # Tăng phiên bản ngay (chính transaction này đọc lại thấy dữ liệu mới) và tăng lần nữa sau
+    # commit: request khác đọc chen vào trước commit sẽ cache dữ liệu cũ dưới phiên bản giữa,
+    # lần tăng thứ hai bỏ luôn khóa đó
+    invalidate(*namespaces)
+    transaction.on_commit(lambda: invalidate(*namespaces))
+
+
+def invalidate_model(model_name):
+    invalidate_on_commit(*INVALIDATES[model_name])
+
+
+def _on_catalog_change(sender, **kwargs):
+    invalidate_model(sender.__name__)
+
+
+def connect_signals():
+    # Bắt cả thay đổi từ trang admin / management command, không chỉ từ các view ghi
+    from .models import Album, Artist, Song
+
+    for model in (Album, Artist, Song):
+        post_save.connect(_on_catalog_change, sender=model, dispatch_uid=f'catalog_cache_save_{model.__name__}')
+        post_delete.connect(_on_catalog_change, sender=model, dispatch_uid=f'catalog_cache_delete_{model.__name__}')
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
+
+def _keys(request, view, versions):
+    # (ETag, khóa cache) của một request với các số phiên bản hiện tại. View thêm dữ liệu theo người
+    # gọi sau cache (stream_url, app/stream_urls.py) đặt request.catalog_etag_suffix: ETag khác theo
+    # người gọi, khóa cache vẫn dùng chung
+    version_tag = '.'.join(str(version) for version in versions)
+    path_hash = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    suffix = getattr(request, 'catalog_etag_suffix', '')
+    return f'W/"{version_tag}-{path_hash[:16]}{suffix}"', f'catalog:{view.__name__}:{version_tag}:{path_hash}'
+
+
+def _not_modified(etag):
+    _count('not_modified')
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def _hit(data, etag):
+    _count('hits')
+    return Response(data, headers={'ETag': etag, 'X-Cache': 'HIT'})
+
+
+def _mark_miss(response, etag):
+    response['ETag'] = etag
+    response['X-Cache'] = 'MISS'
+
+
+def cached_response(*namespaces):
+    # Đặt ngay dưới @api_view; chỉ cache response 200 của GET
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.CATALOG_CACHE_ENABLED or request.method != 'GET':
+                return view(request, *args, **kwargs)
+            etag, key = _keys(request, view, get_versions(namespaces))
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+            cache = get_cache()
+            data = cache.get(key)
+            if data is not None:
+                return _hit(data, etag)
+            _count('misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+                _mark_miss(response, etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def async_cached_response(*namespaces):
+    # Như cached_response cho view async (app/async_views.py). View cùng tên dùng chung khóa nên
+    # bản sync và async đọc / ghi cùng một mục cache
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not settings.CATALOG_CACHE_ENABLED or request.method != 'GET':
+                return await view(request, *args, **kwargs)
+            etag, key = _keys(request, view, await aget_versions(namespaces))
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+            cache = get_cache()
+            data = await cache.aget(key)
+            if data is not None:
+                return _hit(data, etag)
+            _count('misses')
+            response = await view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                await cache.aset(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+                _mark_miss(response, etag)
+            return response
+        return wrapper
+    return decorator
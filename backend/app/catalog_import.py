@@ -0,0 +1,322 @@
+import csv
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from itertools import islice
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from . import audiometa, catalog_cache, search, stats
+from .models import Album, Artist, ImportJob, Song
+from .storage import audio_store
+
+logger = logging.getLogger(__name__)
+
+# Import catalog hàng loạt từ một manifest (.csv, .jsonl hoặc mảng .json) và một thư mục audio
+# trên server, thay cho mỗi bài một request add_song:
+# - manifest đọc dạng stream, không nạp cả file vào bộ nhớ
+# - artist / album tra bằng dict tên -> id nạp một lần; tên mới được tạo theo lô
+# - mỗi lô CATALOG_IMPORT_BATCH_SIZE dòng: chép file audio song song (nhiều luồng, ngoài transaction)
+#   rồi ghi artist / album / bài hát / StoredFile / chỉ mục tìm kiếm / bộ đếm thống kê và
+#   ImportJob.rows_done trong MỘT transaction -> chạy lại sau lỗi bắt đầu đúng sau lô cuối đã commit
+# File đã chép của lô bị rollback chưa có bản ghi nào tham chiếu nên gc_storage sẽ dọn.
+#
+# Cột manifest: name, artist, file (đường dẫn trong thư mục audio) là bắt buộc;
+# album, release_date (YYYY-MM-DD, ngày tạo album mới), duration, premium, status, lyrics tùy chọn.
+
+
+class ManifestError(Exception):
+    pass
+
+
+def read_manifest(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return _read_csv(path)
+    if ext == '.jsonl':
+        return _read_json_lines(path)
+    if ext == '.json':
+        return _read_json_array(path)
+    raise ManifestError(f'Manifest phải là .csv, .jsonl hoặc .json: {path}')
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as manifest:
+        yield from csv.DictReader(manifest)
+
+
+def _read_json_lines(path):
+    with open(path, encoding='utf-8') as manifest:
+        for line in manifest:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_json_array(path, chunk_size=1 << 16):
+    # Đọc từng object của mảng JSON bằng raw_decode trên một bộ đệm trượt
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as manifest:
+        buffer, position = '', 0
+        opened, eof = False, False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                if eof:
+                    raise ManifestError('Mảng JSON trong manifest không kết thúc bằng ]')
+                buffer, position = manifest.read(chunk_size), 0
+                eof = not buffer
+                continue
+            if not opened:
+                if buffer[position] != '[':
+                    raise ManifestError('Manifest .json phải là một mảng các object')
+                opened = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ManifestError(f'Manifest JSON không hợp lệ: {e}')
+                more = manifest.read(chunk_size)
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield item
+
+
+def parse_row(row):
+    def text(key):
+        value = row.get(key)
+        return str(value).strip() if value not in (None, '') else ''
+
+    name, artist, file_name = text('name'), text('artist'), text('file')
+    if not all([name, artist, file_name]):
+        raise ValueError('Thiếu name / artist / file')
+    premium = int(text('premium') or 0)
+    if premium not in (0, 1):
+        raise ValueError('Giá trị premium phải là 0 hoặc 1')
+    return {
+        'name': name,
+        'artist': artist,
+        'album': text('album') or None,
+        'release_date': date.fromisoformat(text('release_date')) if text('release_date') else None,
+        'duration': int(text('duration') or 0),  # 0: chưa biết, --metadata đọc từ file
+        'premium': premium,
+        'status': int(text('status') or 1),
+        'lyrics': text('lyrics') or None,
+        'file': file_name,
+    }
+
+
+def inside(root, path):
+    root = os.path.realpath(root)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CatalogImporter:
+    def __init__(self, job, batch_size=None, copy_workers=None, extract_metadata=False, progress=None):
+        self.job = job
+        self.batch_size = batch_size or settings.CATALOG_IMPORT_BATCH_SIZE
+        self.copy_workers = copy_workers or settings.CATALOG_IMPORT_COPY_WORKERS
+        self.extract_metadata = extract_metadata
+        self.progress = progress
+        self.artists = {}
+        self.albums = {}
+
+    def run(self):
+        job = self.job
+        job.status = ImportJob.STATUS_RUNNING
+        job.save(update_fields=['status', 'updated_at'])
+        # Tên trùng nhau trong DB: dùng bản ghi id nhỏ nhất
+        for artist_id, name in Artist.objects.order_by('-id').values_list('id', 'name'):
+            self.artists[name] = artist_id
+        for album_id, artist_id, name in Album.objects.order_by('-id').values_list('id', 'artist_id', 'name'):
+            self.albums[(artist_id, name)] = album_id
+        try:
+            rows = islice(enumerate(read_manifest(job.manifest), start=1), job.rows_done, None)
+            with ThreadPoolExecutor(max_workers=self.copy_workers, thread_name_prefix='catalog-import') as executor:
+                for batch in _batches(rows, self.batch_size):
+                    self._import_batch(batch, executor)
+                    if self.progress:
+                        self.progress(job)
+        except Exception as e:
+            # Bỏ các số đếm của lô vừa rollback, giữ đúng điểm dừng đã commit
+            job.refresh_from_db()
+            job.status = ImportJob.STATUS_FAILED
+            self._add_errors([{'row': job.rows_done + 1, 'error': str(e)}])
+            job.save()
+            raise
+        job.status = ImportJob.STATUS_DONE
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    def _copy(self, row_number, item):
+        path = os.path.join(self.job.audio_dir, item['file'])
+        if not inside(self.job.audio_dir, path):
+            return row_number, None, 'Đường dẫn file nằm ngoài thư mục audio'
+        try:
+            return row_number, audio_store.copy_file(path), None
+        except OSError as e:
+            return row_number, None, f'Không chép được {item["file"]}: {e.strerror or e}'
+
+    def _import_batch(self, batch, executor):
+        parsed, errors = [], []
+        for row_number, row in batch:
+            try:
+                parsed.append((row_number, parse_row(row)))
+            except (AttributeError, TypeError, ValueError) as e:
+                errors.append({'row': row_number, 'error': str(e)})
+        items = dict(parsed)
+        copied = {}
+        for row_number, stored, error in executor.map(lambda args: self._copy(*args), parsed):
+            if error:
+                errors.append({'row': row_number, 'error': error})
+            else:
+                copied[row_number] = stored
+
+        job = self.job
+        with transaction.atomic():
+            new_artists = self._resolve_artists({items[row]['artist'] for row in copied})
+            new_albums = self._resolve_albums([items[row] for row in copied])
+            songs = [
+                Song(
+                    name=items[row]['name'],
+                    artist_id=self.artists[items[row]['artist']],
+                    album_id=self.albums[(self.artists[items[row]['artist']], items[row]['album'])]
+                    if items[row]['album'] else None,
+                    duration=items[row]['duration'],
+                    song_url=file_name,
+                    status=items[row]['status'],
+                    premium=items[row]['premium'],
+                    lyrics=items[row]['lyrics'],
+                )
+                for row, (file_name, _, _) in sorted(copied.items())
+            ]
+            song_ids = self._insert_songs(songs)
+            audio_store.register({file_name: (sha256, size) for file_name, sha256, size in copied.values()})
+            audio_store.acquire_many(Counter(song.song_url for song in songs))
+            if songs:
+                stats.increment(stats.SONGS, len(songs))
+                search.index_songs(Song.objects.select_related('artist', 'album').filter(id__in=song_ids))
+            if new_artists:
+                stats.increment(stats.ARTISTS, new_artists)
+            # bulk_create không phát tín hiệu post_save nên tự làm mới cache catalog
+            catalog_cache.invalidate_on_commit('artists', 'albums', 'songs')
+
+            job.rows_done = batch[-1][0]
+            job.songs_created += len(songs)
+            job.artists_created += new_artists
+            job.albums_created += new_albums
+            self._add_errors(errors)
+            job.save()
+
+        if self.extract_metadata and song_ids:
+            audiometa.extract_many(Song.objects.filter(id__in=song_ids).values_list('id', 'song_url'))
+
+    def _resolve_artists(self, names):
+        missing = sorted(name for name in names if name not in self.artists)
+        if missing:
+            Artist.objects.bulk_create([Artist(name=name) for name in missing])
+            for artist_id, name in Artist.objects.filter(name__in=missing).order_by('-id').values_list('id', 'name'):
+                self.artists[name] = artist_id
+        return len(missing)
+
+    def _resolve_albums(self, items):
+        missing = {}
+        for item in items:
+            if item['album']:
+                key = (self.artists[item['artist']], item['album'])
+                if key not in self.albums and key not in missing:
+                    missing[key] = item['release_date'] or timezone.localdate()
+        if missing:
+            Album.objects.bulk_create([
+                Album(artist_id=artist_id, name=name, created_at=created_at)
+                for (artist_id, name), created_at in missing.items()
+            ])
+            created = Album.objects.filter(
+                artist_id__in={artist_id for artist_id, _ in missing}, name__in={name for _, name in missing}
+            ).order_by('-id').values_list('id', 'artist_id', 'name')
+            for album_id, artist_id, name in created:
+                if (artist_id, name) in missing:
+                    self.albums[(artist_id, name)] = album_id
+        return len(missing)
+
+    def _insert_songs(self, songs):
+        if not songs:
+            return []
+        if connection.features.can_return_rows_from_bulk_insert:
+            return [song.id for song in Song.objects.bulk_create(songs)]
+        # MySQL không trả id sau bulk_create: lấy các bài mới hơn id lớn nhất trước khi INSERT.
+        # Bài do request khác tạo chen vào cùng file audio cũng bị lấy, chỉ khiến nó được đánh chỉ mục lại
+        before = Song.objects.aggregate(last=Max('id'))['last'] or 0
+        Song.objects.bulk_create(songs)
+        return list(Song.objects.filter(
+            id__gt=before, song_url__in={song.song_url for song in songs}
+        ).values_list('id', flat=True))
+
+    def _add_errors(self, errors):
+        job = self.job
+        job.error_count += len(errors)
+        room = settings.CATALOG_IMPORT_MAX_ERRORS - len(job.errors)
+        if room > 0:
+            job.errors = job.errors + errors[:room]
+
+
+# --- Chạy nền cho API ---------------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+_active = set()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(settings.CATALOG_IMPORT_WORKERS, 1), thread_name_prefix='catalog-import-job'
+                )
+    return _executor
+
+
+def is_active(job_id):
+    return job_id in _active
+
+
+def _run_job(job_id):
+    try:
+        CatalogImporter(ImportJob.objects.get(id=job_id)).run()
+    except Exception:
+        logger.exception('Import catalog %s thất bại, gọi resume để chạy tiếp', job_id)
+    finally:
+        _active.discard(job_id)
+        connection.close()
+
+
+def start(job):
+    # Chạy sau khi transaction tạo / cập nhật job đã commit
+    _active.add(job.id)
+    if settings.CATALOG_IMPORT_WORKERS <= 0:
+        transaction.on_commit(lambda: _run_job(job.id))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_job, job.id))
+
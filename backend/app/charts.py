@@ -0,0 +1,221 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import ChartEntry, ChartLock, Song, SongPlayCount
+
+# Bảng xếp hạng bài hát theo lượt nghe: trong ngày, trong tuần và mọi thời gian, toàn bộ
+# hoặc trong phạm vi một nghệ sĩ / album.
+# - Lượt nghe theo ngày / tuần cộng dồn vào SongPlayCount; mọi thời gian là Song.play_count
+# - Top-N của từng bảng lưu sẵn trong ChartEntry và được cập nhật tăng dần mỗi lần
+#   PlayCountAggregator flush: lượt nghe chỉ tăng nên top-N mới nằm trong (top-N cũ ∪ các bài
+#   vừa được nghe), không cần sắp xếp lại cả bảng
+# - API đọc thẳng N dòng theo index (chart, rank)
+# - Nhiều tiến trình flush cùng lúc: mỗi bảng có một dòng ChartLock, khóa (SELECT ... FOR UPDATE)
+#   theo thứ tự khóa trước khi đọc ChartEntry nên các lần cập nhật cùng một bảng chạy lần lượt;
+#   ràng buộc unique (chart, rank) chặn mọi lần ghi trùng còn sót
+# Lệnh rebuild_charts tính lại toàn bộ từ SongPlayCount / Song.play_count.
+
+DAY = SongPlayCount.PERIOD_DAY
+WEEK = SongPlayCount.PERIOD_WEEK
+ALL = 'all'
+PERIODS = (DAY, WEEK, ALL)
+SCOPES = ('artist', 'album')
+
+
+def period_start(period, today=None):
+    today = today or timezone.localdate()
+    if period == DAY:
+        return today
+    if period == WEEK:
+        return today - timedelta(days=today.weekday())
+    return None
+
+
+def chart_key(period, start=None, scope=None, scope_id=None):
+    key = period if start is None else f'{period}:{start.isoformat()}'
+    if scope:
+        key = f'{key}:{scope}:{scope_id}'
+    return key
+
+
+def top_n(scope=None):
+    return settings.CHARTS_SCOPED_TOP_N if scope else settings.CHARTS_TOP_N
+
+
+def _add_period_counts(pending, today):
+    # Tạo trước các dòng còn thiếu (plays = 0) rồi cộng bằng MỘT câu UPDATE mỗi cửa sổ,
+    # an toàn khi nhiều tiến trình cùng flush
+    increment = Case(
+        *[When(song_id=song_id, then=Value(count)) for song_id, count in pending.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    for period in (DAY, WEEK):
+        start = period_start(period, today)
+        SongPlayCount.objects.bulk_create(
+            [SongPlayCount(song_id=song_id, period=period, period_start=start) for song_id in pending],
+            ignore_conflicts=True,
+        )
+        SongPlayCount.objects.filter(period=period, period_start=start, song_id__in=list(pending)).update(
+            plays=F('plays') + increment
+        )
+
+
+def _current_counts(song_ids, today):
+    # {period: {song_id: plays}} cho các bài ứng viên, đọc từ nguồn chính xác
+    counts = {period: {} for period in PERIODS}
+    windows = Q()
+    for period in (DAY, WEEK):
+        windows |= Q(period=period, period_start=period_start(period, today))
+    for song_id, period, plays in SongPlayCount.objects.filter(windows, song_id__in=song_ids).values_list(
+        'song_id', 'period', 'plays'
+    ):
+        counts[period][song_id] = plays
+    counts[ALL] = dict(Song.objects.filter(id__in=song_ids).values_list('id', 'play_count'))
+    return counts
+
+
+def _rank(candidates, counts, limit):
+    ranked = sorted((song_id for song_id in candidates if counts.get(song_id)), key=lambda s: (-counts[s], s))
+    return [(rank, song_id, counts[song_id]) for rank, song_id in enumerate(ranked[:limit], start=1)]
+
+
+def _lock_charts(keys):
+    # Gọi trong transaction; khóa theo thứ tự để hai tiến trình không chờ nhau vòng tròn
+    keys = sorted(keys)
+    ChartLock.objects.bulk_create([ChartLock(chart=key) for key in keys], ignore_conflicts=True)
+    list(ChartLock.objects.select_for_update().filter(chart__in=keys).order_by('chart').values_list('chart', flat=True))
+
+
+def _replace_entries(desired, existing_rows):
+    # Chỉ xóa / thêm các dòng thực sự đổi (hạng, bài hát hoặc số lượt); gọi khi đã khóa các bảng
+    wanted = {(chart, rank, song_id, plays) for chart, rows in desired.items() for rank, song_id, plays in rows}
+    stale = [row_id for row_id, *row in existing_rows if tuple(row) not in wanted]
+    kept = {tuple(row) for _, *row in existing_rows}
+    new = [
+        ChartEntry(chart=chart, rank=rank, song_id=song_id, plays=plays)
+        for chart, rank, song_id, plays in wanted - kept
+    ]
+    if stale:
+        ChartEntry.objects.filter(id__in=stale).delete()
+    ChartEntry.objects.bulk_create(new, batch_size=1000)
+    return len(stale), len(new)
+
+
+def record_plays(pending, today=None):
+    # Gọi sau khi PlayCountAggregator đã ghi Song.play_count; pending là {song_id: số lượt}
+    today = today or timezone.localdate()
+    songs = {
+        song_id: {'artist': artist_id, 'album': album_id}
+        for song_id, artist_id, album_id in Song.objects.filter(id__in=list(pending)).values_list(
+            'id', 'artist_id', 'album_id'
+        )
+    }
+    if not songs:
+        return 0, 0
+    _add_period_counts({song_id: pending[song_id] for song_id in songs}, today)
+
+    # Các bảng bị ảnh hưởng và bài vừa được nghe thuộc từng bảng
+    touched = defaultdict(set)
+    periods = {}
+    for period in PERIODS:
+        start = period_start(period, today)
+        for song_id, scopes in songs.items():
+            touched[chart_key(period, start)].add(song_id)
+            periods[chart_key(period, start)] = (period, None)
+            for scope in settings.CHARTS_SCOPES:
+                if scopes[scope] is not None:
+                    key = chart_key(period, start, scope, scopes[scope])
+                    touched[key].add(song_id)
+                    periods[key] = (period, scope)
+
+    with transaction.atomic():
+        _lock_charts(touched)
+        existing_rows = list(
+            ChartEntry.objects.filter(chart__in=list(touched)).values_list('id', 'chart', 'rank', 'song_id', 'plays')
+        )
+        candidates = defaultdict(set)
+        for _, chart, _, song_id, _ in existing_rows:
+            candidates[chart].add(song_id)
+        all_ids = set(songs).union(*candidates.values())
+        counts = _current_counts(list(all_ids), today)
+
+        desired = {}
+        for key, song_ids in touched.items():
+            period, scope = periods[key]
+            desired[key] = _rank(candidates[key] | song_ids, counts[period], top_n(scope))
+        return _replace_entries(desired, existing_rows)
+
+
+def _ranked_rows(period, start, scope, limit):
+    # Top-N tính lại từ đầu: một query, ROW_NUMBER() theo phạm vi nếu có
+    if period == ALL:
+        rows = Song.objects.filter(play_count__gt=0)
+        plays, song = F('play_count'), F('id')
+        prefix = ''
+    else:
+        rows = SongPlayCount.objects.filter(period=period, period_start=start, plays__gt=0)
+        plays, song = F('plays'), F('song_id')
+        prefix = 'song__'
+    partition = [F(f'{prefix}{scope}_id')] if scope else None
+    rows = rows.annotate(
+        position=Window(RowNumber(), partition_by=partition, order_by=[plays.desc(), song.asc()]),
+        scope_id=F(f'{prefix}{scope}_id') if scope else Value(None, output_field=IntegerField()),
+        entry_song=song,
+        entry_plays=plays,
+    )
+    if scope:
+        rows = rows.filter(scope_id__isnull=False)
+    return rows.filter(position__lte=limit).values_list('scope_id', 'position', 'entry_song', 'entry_plays')
+
+
+def rebuild(today=None):
+    # Tính lại các bảng của ngày / tuần hiện tại và mọi thời gian; trả về số dòng đã ghi
+    today = today or timezone.localdate()
+    entries = []
+    keys = []
+    for period in PERIODS:
+        start = period_start(period, today)
+        for scope in (None, *settings.CHARTS_SCOPES):
+            for scope_id, rank, song_id, plays in _ranked_rows(period, start, scope, top_n(scope)):
+                entries.append(ChartEntry(
+                    chart=chart_key(period, start, scope, scope_id), rank=rank, song_id=song_id, plays=plays,
+                ))
+        keys.append(chart_key(period, start))
+    with transaction.atomic():
+        # record_plays luôn khóa cả bảng toàn bộ của mỗi kỳ nên khóa các bảng này là đủ chặn nó
+        _lock_charts(keys)
+        for key in keys:
+            ChartEntry.objects.filter(Q(chart=key) | Q(chart__startswith=f'{key}:')).delete()
+        ChartEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def prune(retention_days=None, today=None):
+    # Xóa lượt nghe theo cửa sổ và bảng xếp hạng của các ngày / tuần đã quá hạn lưu
+    today = today or timezone.localdate()
+    retention_days = settings.CHARTS_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = today - timedelta(days=retention_days)
+    removed, _ = SongPlayCount.objects.filter(period_start__lt=cutoff).delete()
+    old_charts = []
+    for key in ChartEntry.objects.exclude(chart__startswith=f'{ALL}').values_list('chart', flat=True).distinct():
+        if key.split(':')[1] < cutoff.isoformat():
+            old_charts.append(key)
+    if old_charts:
+        removed += ChartEntry.objects.filter(chart__in=old_charts).delete()[0]
+        ChartLock.objects.filter(chart__in=old_charts).delete()
+    return removed
+
+
+def get_chart(period, scope=None, scope_id=None, limit=None, today=None):
+    start = period_start(period, today)
+    limit = min(limit or top_n(scope), top_n(scope))
+    return (
+        ChartEntry.objects.filter(chart=chart_key(period, start, scope, scope_id))
+        .select_related('song__artist', 'song__album')
+        .order_by('rank')[:limit]
+    )
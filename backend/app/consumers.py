@@ -0,0 +1,53 @@
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework import exceptions
+from . import auth
+from .realtime import user_group
+
+
+@database_sync_to_async
+def _authenticate(token):
+    # Cùng access token với API (app/auth.py): chỉ query khi token chưa có trong cache
+    try:
+        return auth.authenticate_token(token)
+    except exceptions.AuthenticationFailed:
+        return None
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    # ws://.../ws/chat/ kèm access token nhận khi đăng nhập, gửi bằng subprotocol
+    # (new WebSocket(url, ['bearer', token]), không lộ token trong log URL) hoặc ?token=<token>.
+    # Nhận {"type": "message", "message": {...}} mỗi khi có tin nhắn gửi đi hoặc gửi tới user của
+    # token; tin nhắn vẫn gửi qua POST /api/send_message/
+
+    async def connect(self):
+        subprotocols = self.scope.get('subprotocols') or []
+        subprotocol = None
+        if len(subprotocols) == 2 and subprotocols[0].lower() == 'bearer':
+            subprotocol, token = subprotocols
+        else:
+            token = parse_qs(self.scope.get('query_string', b'').decode()).get('token', [''])[0]
+        if not token:
+            await self.close(code=4401)
+            return
+        user = await _authenticate(token)
+        if user is None:
+            await self.close(code=4401)
+            return
+        self.user_id = user.id
+        self.group_name = user_group(self.user_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept(subprotocol=subprotocol)
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Client gửi ping để giữ kết nối qua proxy
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def chat_message(self, event):
+        await self.send_json({'type': 'message', 'message': event['message']})
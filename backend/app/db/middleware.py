@@ -0,0 +1,50 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .pool import request_metrics
+from .router import request_state
+
+
+class DatabaseRequestMiddleware:
+    # Mở phạm vi request cho pool (đếm số lần lấy kết nối, thời gian chờ) và router (ghim về primary
+    # sau lần ghi đầu). Thêm "Server-Timing: db-pool;dur=<ms chờ pool>;desc=..." vào response.
+    # Chạy được cả sync lẫn async để không ép request ASGI qua sync_to_async
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, tokens = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self._finish(response, metrics)
+
+    async def __acall__(self, request):
+        metrics, tokens = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self._finish(response, metrics)
+
+    def _start(self):
+        metrics = {'checkouts': 0, 'wait': 0.0}
+        return metrics, (request_metrics.set(metrics), request_state.set({'pinned': False}))
+
+    def _reset(self, tokens):
+        request_metrics.reset(tokens[0])
+        request_state.reset(tokens[1])
+
+    def _finish(self, response, metrics):
+        if metrics['checkouts']:
+            timing = f'db-pool;dur={metrics["wait"] * 1000:.2f};desc="{metrics["checkouts"]} checkout"'
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
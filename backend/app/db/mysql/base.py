@@ -0,0 +1,8 @@
+from django.db.backends.mysql import base
+from ..pool import PooledDatabaseWrapperMixin
+
+# ENGINE 'app.db.mysql': backend MySQL của Django cộng pool kết nối (app/db/pool.py)
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
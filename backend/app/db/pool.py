@@ -0,0 +1,242 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Pool kết nối cho backend MySQL / SQLite (Django chỉ có pool sẵn cho PostgreSQL). Bật bằng
+# DATABASES[alias]['OPTIONS']['pool'] (True hoặc dict, giống cấu hình pool của backend postgresql)
+# với ENGINE 'app.db.mysql' hoặc 'app.db.sqlite3':
+#   max_size     - số kết nối tối đa của pool trong mỗi tiến trình (đang dùng + đang rảnh)
+#   timeout      - số giây chờ khi pool đã hết kết nối, quá thì OperationalError
+#   max_lifetime - kết nối sống lâu hơn bị đóng khi trả về và mở lại (server đóng kết nối rảnh lâu,
+#                  MySQL wait_timeout)
+#   check_after  - kết nối rảnh lâu hơn số giây này được ping trước khi đưa ra dùng
+# CONN_MAX_AGE để 0: cuối mỗi request Django "đóng" kết nối, thực ra là trả về pool. Kết nối bị
+# đóng giữa transaction hoặc đã gặp lỗi mà ping không qua thì bị bỏ, không trả về pool.
+# Số liệu: stats() (API /api/db-pool/stats/) và header Server-Timing do app.db.middleware thêm.
+
+DEFAULTS = {'max_size': 10, 'timeout': 5.0, 'max_lifetime': 1800.0, 'check_after': 30.0}
+COUNTERS = ('created', 'reused', 'waits', 'timeouts', 'health_check_failures', 'recycled', 'discarded')
+
+
+def _ping(raw):
+    cursor = raw.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        logger.debug('Đóng kết nối DB lỗi', exc_info=True)
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=None, timeout=None, max_lifetime=None, check_after=None,
+                 ping=_ping, clock=time.monotonic):
+        self.connect = connect
+        self.max_size = max_size or DEFAULTS['max_size']
+        self.timeout = DEFAULTS['timeout'] if timeout is None else timeout
+        self.max_lifetime = DEFAULTS['max_lifetime'] if max_lifetime is None else max_lifetime
+        self.check_after = DEFAULTS['check_after'] if check_after is None else check_after
+        self.ping = ping
+        self.clock = clock
+        self._lock = threading.Condition()
+        # Kết nối rảnh: (raw, lúc mở, lúc trả về); lấy ra từ cuối (kết nối vừa dùng còn "ấm")
+        self._idle = deque()
+        self._born = {}  # id(raw) -> lúc mở, cho cả kết nối đang được dùng
+        self._size = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.wait_time = 0.0
+
+    def acquire(self):
+        # Trả về (raw connection, có phải kết nối dùng lại không)
+        started = self.clock()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._lock:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise OperationalError(
+                            f'Hết kết nối trong pool ({self.max_size}) sau {self.timeout}s chờ'
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+                if waited:
+                    self.counters['waits'] += 1
+                    self.wait_time += self.clock() - started
+                    waited = False
+                if self._idle:
+                    raw, born, returned_at = self._idle.pop()
+                else:
+                    # Giữ chỗ trước rồi mới mở kết nối ngoài lock
+                    self._size += 1
+                    raw = None
+            if raw is None:
+                try:
+                    raw = self.connect()
+                except BaseException:
+                    self._forget(None)
+                    raise
+                with self._lock:
+                    self._born[id(raw)] = self.clock()
+                    self.counters['created'] += 1
+                return raw, False
+            if self.clock() - returned_at >= self.check_after:
+                try:
+                    self.ping(raw)
+                except Exception:
+                    # Server đã đóng kết nối rảnh: bỏ đi và lấy kết nối khác
+                    with self._lock:
+                        self.counters['health_check_failures'] += 1
+                    self._forget(raw)
+                    continue
+            with self._lock:
+                self.counters['reused'] += 1
+            return raw, True
+
+    def release(self, raw, discard=False):
+        now = self.clock()
+        with self._lock:
+            born = self._born.get(id(raw), now)
+            if not discard and now - born >= self.max_lifetime:
+                self.counters['recycled'] += 1
+                discard = True
+            elif discard:
+                self.counters['discarded'] += 1
+            if not discard:
+                self._idle.append((raw, born, now))
+                self._lock.notify()
+                return
+        self._forget(raw)
+
+    def _forget(self, raw):
+        if raw is not None:
+            _close_quietly(raw)
+        with self._lock:
+            if raw is not None:
+                self._born.pop(id(raw), None)
+            self._size -= 1
+            self._lock.notify()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _, _ in idle:
+            self._forget(raw)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self.counters,
+                'wait_time': round(self.wait_time, 6),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(settings_dict):
+    # Đổi NAME (DB test) hay máy chủ thì là pool khác
+    return tuple(str(settings_dict.get(key)) for key in ('ENGINE', 'NAME', 'HOST', 'PORT', 'USER'))
+
+
+def get_pool(wrapper, connect):
+    key = _pool_key(wrapper.settings_dict)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = wrapper.pool_options
+                pool = _pools[key] = ConnectionPool(connect, **{name: options.get(name) for name in DEFAULTS})
+                pool.alias = wrapper.alias
+    return pool
+
+
+def stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.alias: pool.stats() for pool in pools}
+
+
+def close_pools(alias=None):
+    # Đóng các kết nối rảnh và bỏ pool (của một alias hoặc tất cả)
+    with _pools_lock:
+        keys = [key for key, pool in _pools.items() if alias is None or pool.alias == alias]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+# Số liệu theo request: số lần lấy kết nối và thời gian chờ pool của request hiện tại
+# (app.db.middleware đặt giá trị; ngoài request là None)
+request_metrics = contextvars.ContextVar('db_pool_request_metrics', default=None)
+
+
+class PooledDatabaseWrapperMixin:
+    # Trộn trước DatabaseWrapper của backend gốc (xem app/db/mysql/base.py)
+    _pool_reused = False
+
+    @property
+    def pool_options(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options or getattr(self, 'is_in_memory_db', lambda: False)():
+            return None
+        return {} if options is True else options
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        if self.pool_options is None:
+            return super().get_new_connection(conn_params)
+        pool = get_pool(self, lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params))
+        started = time.monotonic()
+        raw, self._pool_reused = pool.acquire()
+        metrics = request_metrics.get()
+        if metrics is not None:
+            metrics['checkouts'] += 1
+            metrics['wait'] += time.monotonic() - started
+        return raw
+
+    def init_connection_state(self):
+        # Kết nối dùng lại đã được thiết lập (SET SESSION...) từ lần mở đầu tiên
+        if not self._pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None or self.pool_options is None:
+            return super()._close()
+        raw = self.connection
+        discard = self.in_atomic_block
+        if not discard:
+            try:
+                if self.errors_occurred:
+                    # Gặp lỗi DB trong lúc dùng: chỉ trả về pool nếu kết nối còn sống
+                    _ping(raw)
+                if not self.get_autocommit():
+                    raw.rollback()
+            except Exception:
+                discard = True
+        get_pool(self, None).release(raw, discard=discard)
+        self._pool_reused = False
+
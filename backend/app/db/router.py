@@ -0,0 +1,51 @@
+import contextvars
+import random
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Đọc catalog từ replica, ghi vào primary. Bật bằng DATABASE_REPLICAS = ['replica', ...] (alias trong
+# DATABASES, mỗi alias khai báo 'TEST': {'MIRROR': 'default'} để test dùng chung DB với default).
+# Chỉ chuyển sang replica khi đang trong một request (app.db.middleware) và:
+#   - model thuộc catalog (CATALOG_MODELS), dữ liệu đọc trễ vài giây so với primary không sao
+#   - request chưa ghi gì: sau lần ghi đầu tiên mọi lần đọc của request đó về primary để
+#     người dùng thấy ngay thay đổi của chính mình (replica có độ trễ sao chép)
+#   - không nằm trong transaction.atomic() của primary
+# Management command, task nền, shell... luôn đọc primary.
+
+CATALOG_MODELS = {
+    'song', 'album', 'artist', 'playlist', 'playlistsong', 'songsearchtoken', 'chartentry', 'songrendition',
+}
+
+# {'pinned': bool} của request hiện tại, None khi ngoài request
+request_state = contextvars.ContextVar('db_router_request_state', default=None)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        state = request_state.get()
+        if (
+            not replicas or state is None or state['pinned']
+            or model._meta.app_label != 'app' or model._meta.model_name not in CATALOG_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state['pinned'] = True
+        # Trả về rõ ràng: bản ghi đọc từ replica vẫn được lưu vào primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+from ..pool import PooledDatabaseWrapperMixin
+
+# ENGINE 'app.db.sqlite3': backend SQLite của Django cộng pool kết nối (app/db/pool.py), dùng để
+# chạy thử pool / router ở máy dev. DB trong bộ nhớ không dùng pool.
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,633 @@
+import asyncio
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.db.models import F
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from app import auth, charts, radio, ratelimit, stream_urls, uploads
+from app.db import pool as db_pool
+from app.models import Artist, Album, Playlist, PlaylistSong, Song, SongPlayCount, StoredFile, UploadSession, User
+from app.playcounts import PlayCountAggregator
+
+# Benchmark chạy trên DB đang cấu hình, dữ liệu tạm được xóa sau khi chạy xong:
+#   python manage.py benchmark playcount --plays 20000 --threads 8
+#   python manage.py benchmark websocket --connections 1000 --messages 50
+#   python manage.py benchmark charts --songs 50000 --requests 200
+#   python manage.py benchmark radio --songs 1000 --requests 200   (catalog 1x, 10x, 100x --songs)
+#   python manage.py benchmark login --requests 200 --threads 8
+#   python manage.py benchmark ratelimit --plays 100000 --threads 8
+#   python manage.py benchmark uploads --upload-mb 20 --threads 4 --requests 200
+#   python manage.py benchmark http --connections 200 --requests 20 --threads 8   (--requests mỗi kết nối)
+#   python manage.py benchmark dbpool --requests 500 --threads 8   (--requests mỗi luồng)
+#   python manage.py benchmark streamurls --requests 10000
+
+
+def _make_catalog(size):
+    artist = Artist.objects.create(name='__benchmark__')
+    album = Album.objects.create(name='__benchmark__', created_at=date.today(), artist=artist)
+    Song.objects.bulk_create([
+        Song(name=f'Benchmark {i}', artist=artist, album=album, duration=180, song_url=f'bench{i}.mp3')
+        for i in range(size)
+    ])
+    return artist, list(Song.objects.filter(artist=artist).values_list('id', flat=True))
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def _run_threads(threads, target):
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+
+def bench_playcount(command, options):
+    plays, threads, songs = options['plays'], options['threads'], options['songs']
+    artist, song_ids = _make_catalog(songs)
+    per_thread = plays // threads
+    total = per_thread * threads
+    try:
+        # Cách cũ: đọc - cộng - save() từng lượt, mỗi lượt một câu UPDATE toàn bộ cột
+        naive_plays = min(total, options['naive_plays'])
+        naive_per_thread = naive_plays // threads
+        errors = []
+
+        def naive(worker):
+            try:
+                for i in range(naive_per_thread):
+                    song = Song.objects.get(id=song_ids[(worker + i) % len(song_ids)])
+                    song.play_count += 1
+                    song.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        elapsed = _run_threads(threads, naive)
+        stored = sum(Song.objects.filter(id__in=song_ids).values_list('play_count', flat=True))
+        expected = naive_per_thread * threads
+        command.stdout.write(
+            f'naive   : {expected} lượt, {expected} câu UPDATE, {expected / elapsed:,.0f} lượt/s, '
+            f'mất {expected - stored} lượt, {len(errors)} lỗi'
+        )
+
+        Song.objects.filter(id__in=song_ids).update(play_count=0)
+        aggregator = PlayCountAggregator(flush_interval=3600, flush_threshold=options['threshold'], log_path='')
+
+        def batched(worker):
+            try:
+                for i in range(per_thread):
+                    aggregator.record(song_ids[(worker + i) % len(song_ids)])
+            finally:
+                connection.close()
+
+        elapsed = _run_threads(threads, batched)
+        aggregator.flush()
+        stored = sum(Song.objects.filter(id__in=song_ids).values_list('play_count', flat=True))
+        command.stdout.write(
+            f'batched : {total} lượt, {aggregator.db_writes} câu UPDATE, {total / elapsed:,.0f} lượt/s, '
+            f'mất {total - stored} lượt'
+        )
+    finally:
+        artist.delete()
+
+
+async def _websocket_round(connections, messages, user_id, token):
+    from channels.layers import get_channel_layer
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    from app.realtime import user_group
+    from app.routing import websocket_urlpatterns
+
+    application = URLRouter(websocket_urlpatterns)
+    clients = [WebsocketCommunicator(application, '/ws/chat/', subprotocols=['bearer', token]) for _ in range(connections)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client.connect() for client in clients))
+    connect_elapsed = time.perf_counter() - started
+    connected = [client for client, (accepted, _) in zip(clients, results) if accepted]
+
+    channel_layer = get_channel_layer()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(messages):
+        # Cùng sự kiện mà realtime.publish_message gửi sau khi commit
+        sent_at = time.perf_counter()
+        await channel_layer.group_send(user_group(user_id), {'type': 'chat.message', 'message': {'id': i}})
+
+        async def receive(client):
+            await client.receive_json_from(timeout=10)
+            return time.perf_counter() - sent_at
+
+        latencies += await asyncio.gather(*(receive(client) for client in connected))
+    deliver_elapsed = time.perf_counter() - started
+    await asyncio.gather(*(client.disconnect() for client in clients))
+    return len(connected), connect_elapsed, latencies, deliver_elapsed
+
+
+def bench_websocket(command, options):
+    # Chạy trong một tiến trình với channel layer đang cấu hình (InMemory hoặc Redis):
+    # đo thời gian mở N kết nối và độ trễ đẩy một tin nhắn tới cả N kết nối
+    connections, messages = options['connections'], options['messages']
+    user = User.objects.create(username='__benchmark__', email='__benchmark__@example.com', password_hash='-')
+    try:
+        connected, connect_elapsed, latencies, deliver_elapsed = asyncio.run(
+            _websocket_round(connections, messages, user.id, auth.issue_token(user))
+        )
+    finally:
+        user.delete()
+    command.stdout.write(f'connect : {connected}/{connections} kết nối trong {connect_elapsed:.2f}s')
+    if latencies:
+        command.stdout.write(
+            f'deliver : {len(latencies)} lượt đẩy, {len(latencies) / deliver_elapsed:,.0f} lượt/s, '
+            f'p50 {_percentile(latencies, 50) * 1000:.1f}ms, p99 {_percentile(latencies, 99) * 1000:.1f}ms'
+        )
+
+
+def _time_requests(requests, fetch):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fetch()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_charts(command, options):
+    songs, requests, plays = options['songs'], options['requests'], options['plays']
+    artist, song_ids = _make_catalog(songs)
+    today = timezone.localdate()
+    try:
+        # Lượt nghe giả lập phân bố đều, không theo thứ tự id
+        Song.objects.filter(artist=artist).update(play_count=F('id') * 7919 % 10007)
+        SongPlayCount.objects.bulk_create([
+            SongPlayCount(song_id=song_id, period=charts.DAY, period_start=today, plays=song_id * 104729 % 1009)
+            for song_id in song_ids
+        ], batch_size=1000)
+        started = time.perf_counter()
+        charts.rebuild()
+        command.stdout.write(f'{"rebuild":<15}: {time.perf_counter() - started:.2f}s')
+
+        limit = settings.CHARTS_TOP_N
+        scenarios = {
+            'all / order_by': lambda: list(Song.objects.for_listing().order_by('-play_count', 'id')[:limit]),
+            'all / chart': lambda: list(charts.get_chart(charts.ALL)),
+            'day / order_by': lambda: list(
+                SongPlayCount.objects.filter(period=charts.DAY, period_start=today)
+                .select_related('song__artist', 'song__album').order_by('-plays', 'song_id')[:limit]
+            ),
+            'day / chart': lambda: list(charts.get_chart(charts.DAY)),
+        }
+        for name, fetch in scenarios.items():
+            timings = _time_requests(requests, fetch)
+            command.stdout.write(
+                f'{name:<15}: p50 {_percentile(timings, 50) * 1000:.2f}ms, p99 {_percentile(timings, 99) * 1000:.2f}ms'
+            )
+
+        # Cập nhật tăng dần: một lần flush với --plays lượt nghe rải trên --threshold bài hát
+        aggregator = PlayCountAggregator(flush_interval=3600, flush_threshold=10 ** 9, log_path='', on_flush=[charts.record_plays])
+        hot = song_ids[:max(1, min(options['threshold'], len(song_ids)))]
+        for i in range(plays):
+            aggregator.record(hot[i % len(hot)])
+        started = time.perf_counter()
+        aggregator.flush()
+        command.stdout.write(
+            f'{"incremental":<15}: {plays} lượt / {len(hot)} bài cập nhật bảng xếp hạng trong {time.perf_counter() - started:.2f}s'
+        )
+    finally:
+        artist.delete()
+        charts.rebuild()
+
+
+def bench_radio(command, options):
+    # Thời gian sinh một trang radio (pipeline trong app/radio.py, không tính serialize) khi catalog lớn dần;
+    # mỗi lượt đo là trang kế tiếp của cùng một phiên nên càng về sau càng nhiều bài bị bỏ vì đã phát
+    requests = options['requests']
+    for size in (options['songs'], options['songs'] * 10, options['songs'] * 100):
+        artist, song_ids = _make_catalog(size)
+        try:
+            # Một phần ba catalog là bài premium, một phần mười đã ẩn
+            Song.objects.filter(artist=artist, id__in=song_ids[::3]).update(premium=1)
+            Song.objects.filter(artist=artist, id__in=song_ids[::10]).update(status=0)
+            session = radio.new_session(radio.SEED_SONG, song_ids[0])
+            timed_out = 0
+            timings = []
+            songs = 0
+            for _ in range(requests):
+                started = time.perf_counter()
+                page, late = radio.next_page(session, settings.RADIO_PAGE_SIZE, False)
+                timings.append(time.perf_counter() - started)
+                timed_out += late
+                songs += len(page)
+            p99 = _percentile(timings, 99) * 1000
+            command.stdout.write(
+                f'{size:>9} bài: p50 {_percentile(timings, 50) * 1000:.2f}ms, p99 {p99:.2f}ms, '
+                f'{songs / requests:.1f} bài/trang, {timed_out}/{requests} trang hết giờ '
+                f'(budget {settings.RADIO_PAGE_BUDGET_MS}ms)'
+            )
+            if p99 > settings.RADIO_PAGE_BUDGET_MS:
+                raise CommandError(f'Radio p99 {p99:.2f}ms vượt budget {settings.RADIO_PAGE_BUDGET_MS}ms')
+        finally:
+            artist.delete()
+
+
+def bench_login(command, options):
+    # Đăng nhập (kiểm tra mật khẩu băm, cố ý chậm) và xác thực token có / không có cache LRU
+    requests, threads = options['requests'], options['threads']
+    password = 'benchmark-password'
+    User.objects.bulk_create([
+        User(username=f'__benchmark_{i}__', email=f'__benchmark_{i}__@example.com', password_hash=auth.hash_password(password))
+        for i in range(min(threads, 100))
+    ])
+    users = list(User.objects.filter(email__startswith='__benchmark_'))
+    try:
+        timings = [[] for _ in range(threads)]
+
+        def login(worker):
+            user = users[worker % len(users)]
+            for _ in range(max(requests // threads, 1)):
+                started = time.perf_counter()
+                if not auth.verify_password(user, password):
+                    raise CommandError('Sai mật khẩu khi benchmark')
+                auth.issue_token(user)
+                timings[worker].append(time.perf_counter() - started)
+            connection.close()
+
+        elapsed = _run_threads(threads, login)
+        flat = [value for worker in timings for value in worker]
+        command.stdout.write(
+            f'{"login":<15}: {len(flat) / elapsed:.1f} lần/s ({threads} luồng, {users[0].password_hash.split("$")[0]}), '
+            f'p50 {_percentile(flat, 50) * 1000:.2f}ms, p99 {_percentile(flat, 99) * 1000:.2f}ms'
+        )
+
+        tokens = [auth.issue_token(user) for user in users]
+        cache = auth.get_token_cache()
+        for name, before in (('token / no cache', cache.clear), ('token / cache', lambda: None)):
+            timings = []
+            for i in range(requests * 10):
+                before()
+                started = time.perf_counter()
+                try:
+                    auth.authenticate_token(tokens[i % len(tokens)])
+                except exceptions.AuthenticationFailed:
+                    raise CommandError('Token không hợp lệ khi benchmark')
+                timings.append(time.perf_counter() - started)
+            command.stdout.write(
+                f'{name:<15}: p50 {_percentile(timings, 50) * 1000:.3f}ms, p99 {_percentile(timings, 99) * 1000:.3f}ms'
+            )
+    finally:
+        User.objects.filter(email__startswith='__benchmark_').delete()
+        auth.get_token_cache().clear()
+
+
+def bench_ratelimit(command, options):
+    # Chi phí một lần kiểm tra giới hạn; --plays lần rải trên --threshold khóa, chia cho --threads luồng
+    checks, threads, keys = options['plays'], options['threads'], max(options['threshold'], 1)
+    stores = {'memory': ratelimit.MemoryStore(max_keys=keys)}
+    if settings.RATELIMIT_STORE is not None:
+        stores[f'cache:{settings.RATELIMIT_STORE}'] = ratelimit.CacheStore(settings.RATELIMIT_STORE)
+    for name, store in stores.items():
+        limited = [0] * threads
+
+        def check(worker):
+            for i in range(worker, checks, threads):
+                limited[worker] += not store.hit(f'benchmark:{i % keys}', 30, 60)[0]
+
+        elapsed = _run_threads(threads, check)
+        command.stdout.write(
+            f'{name:<15}: {elapsed / checks * 1e6:.2f}µs/lần ({checks / elapsed:.0f} lần/s, {threads} luồng), '
+            f'{sum(limited)} lần bị chặn'
+        )
+        store.clear()
+
+
+def bench_uploads(command, options):
+    # Độ trễ đọc catalog khi rảnh và khi --threads client cùng upload chia nhỏ file --upload-mb MB
+    # (chunk UPLOAD_CHUNK_SIZE, finalize có băm sha256); file ghi vào một MEDIA_ROOT tạm
+    threads, requests = options['threads'], options['requests']
+    size = options['upload_mb'] * 1024 * 1024
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    payload = os.urandom(min(size, chunk_size))
+    artist, song_ids = _make_catalog(options['songs'])
+    sessions = [[] for _ in range(threads)]
+
+    def read_catalog():
+        list(Song.objects.for_listing().filter(artist=artist).order_by('id')[:50])
+
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            idle = _time_requests(requests, read_catalog)
+            done = threading.Event()
+
+            def upload(worker):
+                try:
+                    while not done.is_set():
+                        session = uploads.start(size, f'benchmark{worker}.mp3')
+                        sessions[worker].append(session)
+                        offset = 0
+                        while offset < size:
+                            data = payload[:min(chunk_size, size - offset)]
+                            if offset == 0:
+                                # 8 byte đầu khác nhau giữa các file để finalize không gặp file trùng nội dung
+                                data = (worker * 10 ** 6 + len(sessions[worker])).to_bytes(8, 'big') + data[8:]
+                            offset = uploads.write_chunk(session, offset, io.BytesIO(data), len(data))
+                        uploads.finalize(session)
+                finally:
+                    connection.close()
+
+            workers = [threading.Thread(target=upload, args=(i,)) for i in range(threads)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            loaded = _time_requests(requests, read_catalog)
+            done.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+        finished = sum(1 for worker in sessions for session in worker if session.file_name)
+        for name, timings in (('read / idle', idle), ('read / uploads', loaded)):
+            command.stdout.write(
+                f'{name:<15}: p50 {_percentile(timings, 50) * 1000:.2f}ms, p99 {_percentile(timings, 99) * 1000:.2f}ms'
+            )
+        command.stdout.write(
+            f'{"uploads":<15}: {finished} file x {options["upload_mb"]}MB trong {elapsed:.2f}s '
+            f'({finished * size / elapsed / 1024 / 1024:.1f}MB/s, {threads} luồng)'
+        )
+    finally:
+        artist.delete()
+        started_sessions = [session for worker in sessions for session in worker]
+        UploadSession.objects.filter(id__in=[session.id for session in started_sessions]).delete()
+        StoredFile.objects.filter(store='audio', name__in=[session.file_name for session in started_sessions if session.file_name]).delete()
+
+
+# --- HTTP: WSGI so với ASGI ---------------------------------------------------------------
+# Mỗi chế độ chạy server thật trong một tiến trình con (lệnh này với --serve), cùng nền Twisted:
+#   wsgi      - twisted.web WSGIResource, --threads luồng, view sync (như gunicorn --threads)
+#   asgi-sync - daphne, view sync (CATALOG_ASYNC_VIEWS = False)
+#   asgi      - daphne, view async của app/async_views.py
+# rồi --connections kết nối keep-alive cùng gửi --requests request mỗi kết nối, xoay vòng qua các
+# API đọc catalog. Cache catalog tắt trong server để đo đường đi qua ORM.
+HTTP_MODES = ('wsgi', 'asgi-sync', 'asgi')
+
+
+def _serve(mode, port, threads):
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    with override_settings(DEBUG=False, CATALOG_CACHE_ENABLED=False, CATALOG_ASYNC_VIEWS=mode == 'asgi'):
+        if mode == 'wsgi':
+            from twisted.internet import reactor
+            from twisted.web import server, wsgi
+            reactor.suggestThreadPoolSize(threads)
+            resource = wsgi.WSGIResource(reactor, reactor.getThreadPool(), get_wsgi_application())
+            reactor.listenTCP(port, server.Site(resource), backlog=1024, interface='127.0.0.1')
+            reactor.run()
+        else:
+            from daphne.server import Server
+            Server(get_asgi_application(), endpoints=[f'tcp:port={port}:interface=127.0.0.1:backlog=1024']).run()
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in lines[1:] if ': ' in line)
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return int(lines[0].split(' ', 2)[1]), headers.get('connection') == 'close'
+
+
+async def _http_load(port, paths, connections, requests):
+    latencies = []
+    errors = [0]
+
+    async def client(worker):
+        reader = writer = None
+        for i in range(requests):
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            path = paths[(worker + i) % len(paths)]
+            started = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+            try:
+                code, closed = await _read_response(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                code, closed = None, True
+            latencies.append(time.perf_counter() - started)
+            errors[0] += code != 200
+            if closed:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(worker) for worker in range(connections)))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'Server benchmark thoát với mã {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError('Server benchmark không mở cổng kịp')
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def bench_http(command, options):
+    if options['serve']:
+        return _serve(options['serve'], options['port'], options['threads'])
+    connections, requests = options['connections'], options['requests']
+    artist, song_ids = _make_catalog(options['songs'])
+    user = User.objects.create(username='__benchmark__', email='__benchmark__@example.com', password_hash='-')
+    try:
+        album_id = Album.objects.filter(artist=artist).values_list('id', flat=True).first()
+        playlist = Playlist.objects.create(name='__benchmark__', user=user)
+        PlaylistSong.objects.bulk_create([
+            PlaylistSong(playlist=playlist, song_id=song_id, position=i * PlaylistSong.POSITION_GAP)
+            for i, song_id in enumerate(song_ids[:50])
+        ])
+        paths = [
+            '/api/songs/?limit=50',
+            f'/api/songs/{song_ids[len(song_ids) // 2]}/',
+            f'/api/albums/{album_id}/',
+            '/api/artists/',
+            f'/api/playlists/{playlist.id}/',
+            '/api/songs/?limit=20&order=play_count',
+        ]
+        for mode in HTTP_MODES:
+            port = _free_port()
+            process = subprocess.Popen([
+                sys.executable, sys.argv[0], 'benchmark', 'http', '--serve', mode, '--port', str(port),
+                '--threads', str(options['threads']),
+            ], stdout=subprocess.DEVNULL)
+            try:
+                _wait_for_port(port, process)
+                # Khởi động: nạp URLconf, mở kết nối DB
+                asyncio.run(_http_load(port, paths, min(connections, 10), 5))
+                latencies, errors, elapsed = asyncio.run(_http_load(port, paths, connections, requests))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            command.stdout.write(
+                f'{mode:<10}: {len(latencies) / elapsed:.0f} req/s, p50 {_percentile(latencies, 50) * 1000:.1f}ms, '
+                f'p99 {_percentile(latencies, 99) * 1000:.1f}ms, p99.9 {_percentile(latencies, 99.9) * 1000:.1f}ms, '
+                f'{errors} lỗi ({connections} kết nối x {requests} request)'
+            )
+    finally:
+        user.delete()
+        artist.delete()
+
+
+# --- Pool kết nối DB ---------------------------------------------------------------------
+# Mỗi "request" mở kết nối tới DB đang cấu hình, đọc một bài hát rồi đóng, như một request HTTP
+# với CONN_MAX_AGE = 0; so sánh backend không pool và có pool (app/db/pool.py).
+POOL_BACKENDS = {'mysql': 'app.db.mysql', 'sqlite': 'app.db.sqlite3'}
+
+
+def bench_dbpool(command, options):
+    threads, requests = options['threads'], options['requests']
+    if connection.vendor not in POOL_BACKENDS or (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+        raise CommandError(f'Không hỗ trợ DB {connection.vendor} (cần MySQL hoặc file SQLite)')
+    backend = load_backend(POOL_BACKENDS[connection.vendor])
+    artist, song_ids = _make_catalog(options['songs'])
+    query = f'SELECT name FROM {Song._meta.db_table} WHERE id = %s'
+    try:
+        for name, pool in (('không pool', False), ('pool', {'max_size': threads})):
+            database = {
+                **connection.settings_dict,
+                'ENGINE': POOL_BACKENDS[connection.vendor],
+                'OPTIONS': {**connection.settings_dict['OPTIONS'], 'pool': pool},
+            }
+            database = connections.configure_settings({'default': database})['default']
+            timings = [[] for _ in range(threads)]
+
+            def run(worker):
+                wrapper = backend.DatabaseWrapper(database, 'benchmark')
+                for i in range(requests):
+                    started = time.perf_counter()
+                    with wrapper.cursor() as cursor:
+                        cursor.execute(query, [song_ids[i % len(song_ids)]])
+                        cursor.fetchall()
+                    wrapper.close()
+                    timings[worker].append(time.perf_counter() - started)
+
+            elapsed = _run_threads(threads, run)
+            latencies = [value for worker in timings for value in worker]
+            command.stdout.write(
+                f'{name:<10}: {len(latencies) / elapsed:.0f} request/s, p50 {_percentile(latencies, 50) * 1000:.2f}ms, '
+                f'p99 {_percentile(latencies, 99) * 1000:.2f}ms ({threads} luồng)'
+            )
+        command.stdout.write(f'{"thống kê":<10}: {db_pool.stats().get("benchmark")}')
+    finally:
+        db_pool.close_pools('benchmark')
+        artist.delete()
+
+
+# --- Kiểm tra quyền nghe trên đường phát file ---------------------------------------------
+# Chi phí mỗi request /audio/ (kể cả từng request Range khi tua): kiểm tra link có chữ ký so với
+# cách làm thẳng là đọc bài hát (premium) và user (isPremium) từ DB.
+def bench_streamurls(command, options):
+    requests = options['requests']
+    artist, song_ids = _make_catalog(options['songs'])
+    user = User.objects.create(username='__benchmark__', email='__benchmark__@example.com', password_hash='-', isPremium=True)
+    try:
+        Song.objects.filter(id__in=song_ids[::2]).update(premium=1)
+        songs = list(Song.objects.filter(id__in=song_ids).values_list('id', 'song_url', 'premium'))
+        tokens = []
+        for song_id, song_url, premium in songs:
+            url = stream_urls.sign(song_url, song_id, premium)
+            tokens.append((url.split('/')[3], song_url))
+
+        def signed(i):
+            token, song_url = tokens[i % len(tokens)]
+            stream_urls.verify(token, song_url)
+
+        def database(i):
+            song_id, song_url, _ = songs[i % len(songs)]
+            premium = Song.objects.filter(song_url=song_url).values_list('premium', flat=True).first()
+            if premium and not User.objects.filter(id=user.id, status=1, isPremium=True).exists():
+                raise PermissionError(song_id)
+
+        for name, check in (('chữ ký', signed), ('query DB', database)):
+            timings = []
+            for i in range(requests):
+                started = time.perf_counter()
+                check(i)
+                timings.append(time.perf_counter() - started)
+            command.stdout.write(
+                f'{name:<9}: {sum(timings) / requests * 1e6:.1f}µs / request, p50 {_percentile(timings, 50) * 1e6:.1f}µs, '
+                f'p99 {_percentile(timings, 99) * 1e6:.1f}µs ({requests} request)'
+            )
+    finally:
+        user.delete()
+        artist.delete()
+
+
+SCENARIOS = {
+    'playcount': bench_playcount,
+    'websocket': bench_websocket,
+    'charts': bench_charts,
+    'radio': bench_radio,
+    'login': bench_login,
+    'ratelimit': bench_ratelimit,
+    'uploads': bench_uploads,
+    'http': bench_http,
+    'dbpool': bench_dbpool,
+    'streamurls': bench_streamurls,
+}
+
+
+class Command(BaseCommand):
+    help = 'Chạy benchmark hiệu năng: ' + ', '.join(SCENARIOS)
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--songs', type=int, default=100)
+        parser.add_argument('--plays', type=int, default=20000)
+        parser.add_argument('--naive-plays', type=int, default=2000)
+        parser.add_argument('--threshold', type=int, default=1000)
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--upload-mb', type=int, default=20)
+        parser.add_argument('--serve', choices=HTTP_MODES, help='Dùng nội bộ bởi kịch bản http: chạy server benchmark')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads phải lớn hơn 0')
+        SCENARIOS[options['scenario']](self, options)
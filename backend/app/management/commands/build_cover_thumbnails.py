@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection
+from app import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Tạo ảnh thu nhỏ cho ảnh bìa album / playlist (mặc định: bản ghi chưa có ảnh thu nhỏ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Kiểm tra lại mọi bản ghi có ảnh bìa (file đã có không tạo lại)')
+        parser.add_argument('--workers', type=int, default=4, help='Số luồng giải mã / mã hóa ảnh song song')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for kind, model in thumbnails.MODELS.items():
+            rows = model.objects.exclude(cover_image__isnull=True).exclude(cover_image='').order_by('id')
+            if not options['all']:
+                rows = rows.filter(cover_thumbnails={})
+            jobs += [(kind, object_id) for object_id in rows.values_list('id', flat=True)]
+
+        def run(job):
+            try:
+                return job, thumbnails.build(*job), None
+            except Exception as e:
+                return job, None, e
+
+        def run_in_thread(job):
+            try:
+                return run(job)
+            finally:
+                connection.close()
+
+        built = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            # Pillow nhả GIL khi thu nhỏ / mã hóa nên nhiều luồng chạy song song thật
+            results = executor.map(run_in_thread, jobs) if options['workers'] > 1 else map(run, jobs)
+            for (kind, object_id), variants, error in results:
+                if error is not None:
+                    self.stderr.write(f'{kind} {object_id}: lỗi {error}')
+                elif variants is None:
+                    self.stdout.write(f'{kind} {object_id}: bỏ qua (không thấy file ảnh)')
+                else:
+                    built += 1
+        self.stdout.write(self.style.SUCCESS(f'Đã tạo ảnh thu nhỏ cho {built}/{len(jobs)} ảnh bìa'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app import uploads
+
+
+class Command(BaseCommand):
+    help = 'Xóa phiên upload chia nhỏ bị bỏ dở / đã xong từ lâu cùng file tạm (chạy định kỳ, ví dụ cron mỗi giờ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None, help='Số giây không cập nhật (mặc định UPLOAD_SESSION_TIMEOUT)')
+
+    def handle(self, *args, **options):
+        removed = uploads.cleanup(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f'Đã xóa {removed} phiên upload'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app import audiometa
+from app.models import Song
+
+
+class Command(BaseCommand):
+    help = 'Đọc thời lượng, bitrate, sample rate và ảnh bìa từ file MP3 của các bài hát (chạy song song nhiều tiến trình)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('song_ids', nargs='*', type=int)
+        parser.add_argument('--missing', action='store_true', help='Chỉ các bài chưa có bitrate')
+        parser.add_argument('--workers', type=int, default=None, help='Mặc định: số core CPU')
+
+    def handle(self, *args, **options):
+        songs = Song.objects.order_by('id')
+        if options['song_ids']:
+            songs = songs.filter(id__in=options['song_ids'])
+        if options['missing']:
+            songs = songs.filter(bitrate__isnull=True)
+        done, failed = audiometa.extract_many(songs.values_list('id', 'song_url'), workers=options['workers'])
+        for song_id, error in failed:
+            self.stderr.write(f'Bài hát {song_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Đã cập nhật {done} bài hát, lỗi {len(failed)}'))
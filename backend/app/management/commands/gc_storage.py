@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app.storage import STORES
+
+
+class Command(BaseCommand):
+    help = 'Dọn file upload không còn bản ghi nào tham chiếu (audio, ảnh bìa album)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', choices=sorted(STORES), action='append', help='Mặc định: tất cả')
+        parser.add_argument('--recount', action='store_true', help='Đếm lại ref_count từ DB trước khi dọn')
+        parser.add_argument('--grace', type=int, default=None, help='Bỏ qua file mới hơn số giây này')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        for name in options['store'] or sorted(STORES):
+            store = STORES[name]
+            if options['recount']:
+                fixed = store.recount()
+                self.stdout.write(f'{name}: sửa ref_count của {fixed} file')
+            removed = store.collect_garbage(grace_seconds=options['grace'], dry_run=options['dry_run'])
+            for file_name in removed:
+                self.stdout.write(f'  {"sẽ xóa" if options["dry_run"] else "đã xóa"} {file_name}')
+            self.stdout.write(self.style.SUCCESS(f'{name}: {len(removed)} file'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from app import auth
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Băm các mật khẩu còn lưu dạng chữ thường trong users.password_hash'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Không cần chạy trước khi deploy: đăng nhập đúng cũng tự băm lại. Lệnh này để không còn
+        # mật khẩu chữ thường trong DB của các tài khoản lâu không đăng nhập
+        total = 0
+        after = 0
+        while True:
+            rows = list(
+                User.objects.filter(id__gt=after).order_by('id').values_list('id', 'password_hash')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            for user_id, password in rows:
+                if password and not auth.is_hashed(password):
+                    User.objects.filter(id=user_id, password_hash=password).update(password_hash=auth.hash_password(password))
+                    total += 1
+            after = rows[-1][0]
+        self.stdout.write(self.style.SUCCESS(f'Đã băm {total} mật khẩu'))
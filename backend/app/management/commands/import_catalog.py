@@ -0,0 +1,59 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from app import catalog_import
+from app.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Import hàng loạt bài hát từ manifest (.csv / .jsonl / .json) và thư mục file audio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', nargs='?')
+        parser.add_argument('--audio-dir', help='Thư mục chứa file audio, cột file trong manifest tính từ đây')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Chạy tiếp job bị lỗi từ sau lô cuối đã ghi')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None, help='Số luồng chép file audio')
+        parser.add_argument('--metadata', action='store_true', help='Đọc bitrate / thời lượng từ file sau mỗi lô')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ImportJob.objects.get(id=options['resume'])
+            except ImportJob.DoesNotExist:
+                raise CommandError(f'Không có job import {options["resume"]}')
+            if job.status == ImportJob.STATUS_DONE:
+                raise CommandError(f'Job import {job.id} đã hoàn tất')
+            self.stdout.write(f'Chạy tiếp job {job.id} từ dòng {job.rows_done + 1}')
+        else:
+            if not options['manifest'] or not options['audio_dir']:
+                raise CommandError('Cần manifest và --audio-dir (hoặc --resume JOB_ID)')
+            try:
+                catalog_import.read_manifest(options['manifest'])
+            except catalog_import.ManifestError as e:
+                raise CommandError(str(e))
+            job = ImportJob.objects.create(manifest=options['manifest'], audio_dir=options['audio_dir'])
+            self.stdout.write(f'Job import {job.id}')
+
+        started = time.perf_counter()
+        start_row = job.rows_done
+
+        def progress(job):
+            rate = (job.rows_done - start_row) / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(
+                f'{job.rows_done} dòng, {job.songs_created} bài hát, {job.error_count} lỗi ({rate:,.0f} dòng/s)'
+            )
+
+        importer = catalog_import.CatalogImporter(
+            job, batch_size=options['batch_size'], copy_workers=options['workers'],
+            extract_metadata=options['metadata'], progress=progress,
+        )
+        try:
+            importer.run()
+        except Exception as e:
+            raise CommandError(f'Import dừng ở dòng {job.rows_done + 1}: {e}. Chạy lại với --resume {job.id}')
+        for error in job.errors:
+            self.stderr.write(f'Dòng {error["row"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Xong: {job.songs_created} bài hát, {job.artists_created} nghệ sĩ, {job.albums_created} album mới, '
+            f'{job.error_count} dòng lỗi'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from app import charts
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng xếp hạng ngày / tuần / mọi thời gian từ số lượt nghe đã lưu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Xóa dữ liệu ngày / tuần cũ hơn CHARTS_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            removed = charts.prune()
+            self.stdout.write(f'Đã xóa {removed} dòng dữ liệu cũ')
+        total = charts.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Đã ghi {total} dòng bảng xếp hạng'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Tính lại toàn bộ chỉ mục bài hát tương tự từ playlist_songs'
+
+    def handle(self, *args, **options):
+        songs, pairs = recommendations.build()
+        self.stdout.write(self.style.SUCCESS(f'Đã ghi {pairs} cặp gợi ý cho {songs} bài hát'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app import search
+
+
+class Command(BaseCommand):
+    help = 'Xây lại toàn bộ chỉ mục tìm kiếm bài hát (song_search_tokens)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Đã lập chỉ mục {total} bài hát'))
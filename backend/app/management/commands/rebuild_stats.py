@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from app import stats
+
+
+class Command(BaseCommand):
+    help = 'Đếm lại bộ đếm thống kê (stat_counters) và số user mới theo ngày (daily_user_signups)'
+
+    def handle(self, *args, **options):
+        totals = stats.rebuild()
+        summary = ', '.join(f'{name}={value}' for name, value in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Đã đếm lại: {summary}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app import transcoding
+from app.models import Song, SongRendition
+
+
+class Command(BaseCommand):
+    help = 'Chuyển mã các bài hát thành nhiều mức bitrate (mặc định: bài chưa có bản chuyển mã nào sẵn sàng)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('song_ids', nargs='*', type=int)
+        parser.add_argument('--all', action='store_true', help='Chuyển mã lại toàn bộ bài hát')
+
+    def handle(self, *args, **options):
+        songs = Song.objects.order_by('id')
+        if options['song_ids']:
+            songs = songs.filter(id__in=options['song_ids'])
+        elif not options['all']:
+            songs = songs.exclude(renditions__status=SongRendition.STATUS_READY)
+        encoder = transcoding.get_encoder()
+        for song_id in songs.values_list('id', flat=True).iterator():
+            renditions = transcoding.transcode_song(song_id, encoder=encoder)
+            bitrates = ', '.join(f'{rendition.bitrate}k' for rendition in renditions) or 'không có'
+            self.stdout.write(f'Bài hát {song_id}: {bitrates}')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_song_lyrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongSearchToken',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.IntegerField(default=1)),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='app.song')),
+            ],
+            options={
+                'db_table': 'song_search_tokens',
+                'managed': True,
+                'indexes': [models.Index(fields=['token', 'song'], name='song_search_token_idx')],
+                'unique_together': {('song', 'token')},
+            },
+        ),
+    ]
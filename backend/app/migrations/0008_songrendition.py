@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 16:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_songsearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongRendition',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('bitrate', models.IntegerField()),
+                ('file_name', models.CharField(blank=True, max_length=500)),
+                ('playlist', models.CharField(blank=True, max_length=500, null=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='app.song')),
+            ],
+            options={
+                'db_table': 'song_renditions',
+                'managed': True,
+                'unique_together': {('song', 'bitrate')},
+            },
+        ),
+    ]
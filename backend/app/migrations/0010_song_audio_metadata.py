@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='artwork',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='bitrate',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='sample_rate',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
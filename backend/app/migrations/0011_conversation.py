@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-18 16:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    # Gom tin nhắn cũ theo cặp user; lịch sử trước đây coi như cả hai bên đã đọc
+    Conversation = apps.get_model('app', 'Conversation')
+    Message = apps.get_model('app', 'Message')
+    pairs = {}
+    for message_id, sender_id, receiver_id, timestamp in (
+        Message.objects.order_by('timestamp', 'id').values_list('id', 'sender_id', 'receiver_id', 'timestamp').iterator()
+    ):
+        pairs[tuple(sorted((sender_id, receiver_id)))] = (message_id, timestamp)
+    for (low, high), (last_id, last_at) in pairs.items():
+        conversation = Conversation.objects.create(
+            user_low_id=low, user_high_id=high, last_message_id=last_id, last_message_at=last_at,
+            low_last_read_id=last_id, high_last_read_id=last_id,
+        )
+        Message.objects.filter(
+            models.Q(sender_id=low, receiver_id=high) | models.Q(sender_id=high, receiver_id=low)
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_song_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('low_last_read_id', models.IntegerField(blank=True, null=True)),
+                ('high_last_read_id', models.IntegerField(blank=True, null=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.message')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.user')),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.user')),
+            ],
+            options={
+                'db_table': 'conversations',
+                'managed': True,
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='app.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'timestamp', 'id'], name='message_conversation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_low', 'last_message_at'], name='conversation_low_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_high', 'last_message_at'], name='conversation_high_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='conversation_unique_pair'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
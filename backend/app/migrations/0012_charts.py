@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 16:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('chart', models.CharField(max_length=64)),
+                ('rank', models.IntegerField()),
+                ('plays', models.IntegerField()),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.song')),
+            ],
+            options={
+                'db_table': 'chart_entries',
+                'managed': True,
+                'indexes': [models.Index(fields=['chart', 'rank'], name='chart_entry_rank_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SongPlayCount',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('period', models.CharField(choices=[('day', 'Ngày'), ('week', 'Tuần')], max_length=8)),
+                ('period_start', models.DateField()),
+                ('plays', models.IntegerField(default=0)),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_play_counts', to='app.song')),
+            ],
+            options={
+                'db_table': 'song_play_counts',
+                'managed': True,
+                'indexes': [models.Index(fields=['period', 'period_start', '-plays'], name='song_play_count_rank_idx')],
+                'unique_together': {('song', 'period', 'period_start')},
+            },
+        ),
+    ]
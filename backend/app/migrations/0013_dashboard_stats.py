@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+def seed_stats(apps, schema_editor):
+    # Khởi tạo bộ đếm từ dữ liệu hiện có (giống lệnh rebuild_stats)
+    from app import stats
+
+    stats.rebuild(
+        counter_model=apps.get_model('app', 'StatCounter'),
+        daily_model=apps.get_model('app', 'DailyUserSignups'),
+        models={name: apps.get_model('app', model) for name, model in stats.COUNTED_MODELS.items()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_charts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserSignups',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_user_signups',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'stat_counters',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('manifest', models.CharField(max_length=500)),
+                ('audio_dir', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Chờ chạy'), ('running', 'Đang chạy'), ('failed', 'Lỗi'), ('done', 'Hoàn tất')], default='pending', max_length=16)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('songs_created', models.IntegerField(default=0)),
+                ('artists_created', models.IntegerField(default=0)),
+                ('albums_created', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'import_jobs',
+                'managed': True,
+            },
+        ),
+    ]
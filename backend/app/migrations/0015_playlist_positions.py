@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+def number_playlist_songs(apps, schema_editor):
+    # Giữ thứ tự cũ (theo id), bỏ các dòng trùng (playlist, song) trước khi thêm ràng buộc unique
+    PlaylistSong = apps.get_model('app', 'PlaylistSong')
+    gap = 1 << 16
+    playlist_ids = PlaylistSong.objects.values_list('playlist_id', flat=True).distinct()
+    for playlist_id in list(playlist_ids):
+        rows = list(PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('id'))
+        seen, keep, duplicates = set(), [], []
+        for row in rows:
+            if row.song_id in seen:
+                duplicates.append(row.id)
+                continue
+            seen.add(row.song_id)
+            row.position = (len(keep) + 1) * gap
+            keep.append(row)
+        if duplicates:
+            PlaylistSong.objects.filter(id__in=duplicates).delete()
+        PlaylistSong.objects.bulk_update(keep, ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlistsong',
+            name='position',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(number_playlist_songs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'position'], name='playlist_song_position_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='playlistsong',
+            constraint=models.UniqueConstraint(fields=('playlist', 'song'), name='playlist_song_unique'),
+        ),
+    ]
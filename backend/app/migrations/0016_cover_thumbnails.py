@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_playlist_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='cover_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
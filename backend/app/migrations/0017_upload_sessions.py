@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_cover_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('store', models.CharField(max_length=32)),
+                ('file_ext', models.CharField(blank=True, max_length=16)),
+                ('size', models.BigIntegerField()),
+                ('received', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('file_name', models.CharField(blank=True, max_length=500, null=True)),
+                ('status', models.CharField(choices=[('open', 'Đang nhận'), ('complete', 'Đã kiểm tra'), ('used', 'Đã gắn vào bản ghi')], default='open', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'upload_sessions',
+                'managed': True,
+                'indexes': [models.Index(fields=['updated_at'], name='upload_session_updated_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 17:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_ranks(apps, schema_editor):
+    # Các lần flush chạy song song trước đây có thể ghi trùng (chart, rank): giữ dòng cũ nhất,
+    # lệnh rebuild_charts tính lại đúng sau khi migrate
+    ChartEntry = apps.get_model('app', 'ChartEntry')
+    duplicated = (
+        ChartEntry.objects.values('chart', 'rank').annotate(rows=Count('id'), first=Min('id')).filter(rows__gt=1)
+    )
+    for row in list(duplicated):
+        ChartEntry.objects.filter(chart=row['chart'], rank=row['rank']).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartLock',
+            fields=[
+                ('chart', models.CharField(max_length=64, primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'chart_locks',
+                'managed': True,
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='chartentry',
+            name='chart_entry_rank_idx',
+        ),
+        migrations.RunPython(drop_duplicate_ranks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chartentry',
+            constraint=models.UniqueConstraint(fields=('chart', 'rank'), name='chart_entry_rank_uniq'),
+        ),
+    ]
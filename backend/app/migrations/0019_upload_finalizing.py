@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_chart_locks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Đang nhận'), ('finalizing', 'Đang kiểm tra'), ('complete', 'Đã kiểm tra'), ('used', 'Đã gắn vào bản ghi')], default='open', max_length=16),
+        ),
+    ]
@@ -89,10 +89,73 @@
 #         db_table = 'playlist_songs'
 #         managed = Truez
 # backend/app/models.py
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce, RowNumber
+
+class ConversationQuerySet(models.QuerySet):
+    def between(self, user_id, other_id):
+        low, high = sorted((int(user_id), int(other_id)))
+        return self.filter(user_low_id=low, user_high_id=high)
+
+    def inbox(self, user_id):
+        # Một query: các cuộc trò chuyện của user kèm tin nhắn cuối (JOIN) và số tin chưa đọc
+        # (tin gửi tới user có id lớn hơn mốc đã đọc của user trong cuộc trò chuyện đó)
+        last_read = models.Case(
+            models.When(user_low_id=user_id, then=models.F('low_last_read_id')),
+            default=models.F('high_last_read_id'),
+        )
+        return (
+            self.filter(models.Q(user_low_id=user_id) | models.Q(user_high_id=user_id))
+            .exclude(last_message__isnull=True)
+            .select_related('user_low', 'user_high', 'last_message')
+            .annotate(unread=models.Count('messages', filter=models.Q(
+                messages__receiver_id=user_id, messages__id__gt=Coalesce(last_read, 0),
+            )))
+            .order_by('-last_message_at', '-id')
+        )
+
+
+class Conversation(models.Model):
+    # Mỗi cặp user một dòng, lưu theo thứ tự (id nhỏ, id lớn) để không phụ thuộc ai gửi trước
+    id = models.AutoField(primary_key=True)
+    user_low = models.ForeignKey("User", on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey("User", on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey("Message", on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Id tin nhắn cuối cùng mỗi bên đã đọc
+    low_last_read_id = models.IntegerField(null=True, blank=True)
+    high_last_read_id = models.IntegerField(null=True, blank=True)
+
+    objects = ConversationQuerySet.as_manager()
+
+    def other_user(self, user_id):
+        return self.user_high if self.user_low_id == int(user_id) else self.user_low
+
+    def mark_read(self, user_id, message_id):
+        # Chỉ tiến mốc đã đọc, không lùi lại khi client gửi id cũ
+        field = 'low_last_read_id' if self.user_low_id == int(user_id) else 'high_last_read_id'
+        Conversation.objects.filter(pk=self.pk).filter(
+            models.Q(**{f'{field}__isnull': True}) | models.Q(**{f'{field}__lt': message_id})
+        ).update(**{field: message_id})
+
+    class Meta:
+        db_table = 'conversations'
+        managed = True
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='conversation_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['user_low', 'last_message_at'], name='conversation_low_recent_idx'),
+            models.Index(fields=['user_high', 'last_message_at'], name='conversation_high_recent_idx'),
+        ]
+
 
 class Message(models.Model):
     id = models.AutoField(primary_key=True)
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='messages'
+    )
     sender = models.ForeignKey("User", on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey("User", on_delete=models.CASCADE, related_name='received_messages')
     content = models.CharField(max_length=1000)
@@ -104,6 +167,10 @@ class Message(models.Model):
     class Meta:
         db_table = 'messages'
         managed = True
+        indexes = [
+            # Lịch sử trò chuyện đọc ngược theo (timestamp, id) với cursor before=
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='message_conversation_idx'),
+        ]
 
 
 class User(models.Model):
@@ -139,6 +206,8 @@ class Album(models.Model):
     created_at = models.DateField()
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     cover_image = models.CharField(max_length=255, blank=True, null=True)
+    # Ảnh thu nhỏ của cover_image: {"64": {"webp": tên file, "jpeg": tên file}, ...} - xem app/thumbnails.py
+    cover_thumbnails = models.JSONField(default=dict, blank=True)
     status = models.IntegerField(default=1)
     
     def __str__(self):
@@ -148,6 +217,43 @@ class Album(models.Model):
         db_table = 'albums'
         managed = True
 
+class SongQuerySet(models.QuerySet):
+    # Trường của SongSerializer -> cột cần SELECT (artist_name / album_name / album_img đi qua FK)
+    LISTING_COLUMNS = {
+        'id': 'id',
+        'name': 'name',
+        'artist': 'artist',
+        'artist_name': 'artist__name',
+        'album': 'album',
+        'album_name': 'album__name',
+        'album_img': 'album__cover_image',
+        'album_thumbs': 'album__cover_thumbnails',
+        'duration': 'duration',
+        'song_url': 'song_url',
+        'status': 'status',
+        'premium': 'premium',
+        'play_count': 'play_count',
+        'lyrics': 'lyrics',
+        'bitrate': 'bitrate',
+        'sample_rate': 'sample_rate',
+        'artwork': 'artwork',
+    }
+
+    def for_listing(self, fields=None):
+        # JOIN artist/album trong cùng một câu query để tránh N+1 khi serialize,
+        # và chỉ SELECT các cột mà những trường được yêu cầu cần tới
+        columns = {'id'}
+        related = set()
+        for field in (fields or self.LISTING_COLUMNS):
+            column = self.LISTING_COLUMNS[field]
+            columns.add(column)
+            if '__' in column:
+                relation = column.split('__')[0]
+                related.add(relation)
+                columns.add(relation)
+        queryset = self.select_related(*sorted(related)) if related else self
+        return queryset.only(*columns)
+
 class Song(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
@@ -159,6 +265,12 @@ class Song(models.Model):
     premium = models.IntegerField(default=0)  # ← thêm dòng này
     play_count = models.IntegerField(default=0)
     lyrics = models.TextField(null=True, blank=True)
+    # Đọc từ file phía server sau khi upload (app/audiometa.py)
+    bitrate = models.IntegerField(null=True, blank=True)  # kbps
+    sample_rate = models.IntegerField(null=True, blank=True)  # Hz
+    artwork = models.CharField(max_length=255, blank=True, null=True)  # ảnh bìa nhúng trong ID3
+
+    objects = SongQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} - {self.artist.name}"
@@ -167,15 +279,228 @@ class Song(models.Model):
         db_table = 'songs'
         managed = True
 
+class StoredFile(models.Model):
+    # File upload lưu theo nội dung - xem app/storage.py
+    id = models.AutoField(primary_key=True)
+    store = models.CharField(max_length=32)  # 'audio' | 'album_covers'
+    name = models.CharField(max_length=255)  # <ab>/<cd>/<sha256><đuôi file>
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.store}:{self.name} ({self.ref_count})"
+
+    class Meta:
+        db_table = 'stored_files'
+        managed = True
+        unique_together = [('store', 'name')]
+
+class SongRendition(models.Model):
+    # Bản chuyển mã của một bài hát ở một mức bitrate - xem app/transcoding.py
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [(STATUS_PENDING, 'Pending'), (STATUS_READY, 'Ready'), (STATUS_FAILED, 'Failed')]
+
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='renditions')
+    bitrate = models.IntegerField()  # kbps
+    file_name = models.CharField(max_length=500, blank=True)  # đường dẫn tương đối trong MEDIA_ROOT
+    playlist = models.CharField(max_length=500, blank=True, null=True)  # index.m3u8 nếu có chia đoạn HLS
+    size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.song_id} @ {self.bitrate}kbps ({self.status})"
+
+    class Meta:
+        db_table = 'song_renditions'
+        managed = True
+        unique_together = [('song', 'bitrate')]
+
+class SongSearchToken(models.Model):
+    # Một dòng cho mỗi (bài hát, từ đã bỏ dấu) - xem app/search.py
+    id = models.BigAutoField(primary_key=True)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+    weight = models.IntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.token} -> {self.song_id}"
+
+    class Meta:
+        db_table = 'song_search_tokens'
+        managed = True
+        unique_together = [('song', 'token')]
+        indexes = [models.Index(fields=['token', 'song'], name='song_search_token_idx')]
+
+class SongPlayCount(models.Model):
+    # Lượt nghe theo cửa sổ thời gian (ngày / tuần) - xem app/charts.py; tổng mọi thời gian là Song.play_count
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIOD_CHOICES = [(PERIOD_DAY, 'Ngày'), (PERIOD_WEEK, 'Tuần')]
+
+    id = models.BigAutoField(primary_key=True)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='period_play_counts')
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    plays = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.song_id} {self.period} {self.period_start}: {self.plays}"
+
+    class Meta:
+        db_table = 'song_play_counts'
+        managed = True
+        unique_together = [('song', 'period', 'period_start')]
+        indexes = [models.Index(fields=['period', 'period_start', '-plays'], name='song_play_count_rank_idx')]
+
+class ChartEntry(models.Model):
+    # Bảng xếp hạng top-N đã tính sẵn; chart là khóa kiểu 'day:2025-01-31', 'week:2025-01-27:artist:5', 'all:album:7'
+    id = models.BigAutoField(primary_key=True)
+    chart = models.CharField(max_length=64)
+    rank = models.IntegerField()
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='+')
+    plays = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.chart} #{self.rank}: {self.song_id}"
+
+    class Meta:
+        db_table = 'chart_entries'
+        managed = True
+        constraints = [models.UniqueConstraint(fields=['chart', 'rank'], name='chart_entry_rank_uniq')]
+
+class ChartLock(models.Model):
+    # Mỗi bảng xếp hạng một dòng, chỉ để SELECT ... FOR UPDATE: các tiến trình flush / rebuild
+    # cập nhật cùng một bảng lần lượt (app/charts.py)
+    chart = models.CharField(max_length=64, primary_key=True)
+
+    def __str__(self):
+        return self.chart
+
+    class Meta:
+        db_table = 'chart_locks'
+        managed = True
+
+class StatCounter(models.Model):
+    # Tổng số bản ghi cho trang thống kê, cập nhật cùng transaction với thao tác ghi (app/stats.py)
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        db_table = 'stat_counters'
+        managed = True
+
+class DailyUserSignups(models.Model):
+    # Số user mới theo ngày tạo tài khoản (giờ địa phương theo TIME_ZONE)
+    date = models.DateField(primary_key=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.count}"
+
+    class Meta:
+        db_table = 'daily_user_signups'
+        managed = True
+
+class ImportJob(models.Model):
+    # Một lần import catalog hàng loạt (app/catalog_import.py). rows_done là số dòng manifest đã
+    # xử lý, ghi cùng transaction với mỗi lô nên chạy lại (resume) bắt đầu đúng sau lô cuối đã commit
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Chờ chạy'),
+        (STATUS_RUNNING, 'Đang chạy'),
+        (STATUS_FAILED, 'Lỗi'),
+        (STATUS_DONE, 'Hoàn tất'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    manifest = models.CharField(max_length=500)  # đường dẫn file .csv / .json / .jsonl trên server
+    audio_dir = models.CharField(max_length=500)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_done = models.IntegerField(default=0)
+    songs_created = models.IntegerField(default=0)
+    artists_created = models.IntegerField(default=0)
+    albums_created = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # vài lỗi đầu tiên: [{"row": n, "error": "..."}]
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.id} ({self.status}): {self.rows_done} dòng"
+
+    class Meta:
+        db_table = 'import_jobs'
+        managed = True
+
+class UploadSession(models.Model):
+    # Một lần upload file chia nhỏ, tiếp tục được sau khi mất kết nối (app/uploads.py).
+    # received là số byte liên tục từ đầu file đã ghi vào vùng tạm; chunk tiếp theo phải bắt đầu đúng ở đó
+    STATUS_OPEN = 'open'
+    STATUS_FINALIZING = 'finalizing'
+    STATUS_COMPLETE = 'complete'
+    STATUS_USED = 'used'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Đang nhận'),
+        (STATUS_FINALIZING, 'Đang kiểm tra'),
+        (STATUS_COMPLETE, 'Đã kiểm tra'),
+        (STATUS_USED, 'Đã gắn vào bản ghi'),
+    ]
+
+    id = models.CharField(primary_key=True, max_length=32)  # token ngẫu nhiên trả cho client
+    store = models.CharField(max_length=32)  # 'audio'
+    file_ext = models.CharField(max_length=16, blank=True)
+    size = models.BigIntegerField()  # tổng số byte client khai báo lúc bắt đầu
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # client khai báo (tùy chọn), kiểm tra khi finalize
+    file_name = models.CharField(max_length=500, blank=True, null=True)  # tên trong store sau finalize
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.status}): {self.received}/{self.size}"
+
+    class Meta:
+        db_table = 'upload_sessions'
+        managed = True
+        indexes = [
+            # Dọn phiên bỏ dở theo thời gian cập nhật cuối
+            models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ]
+
+class PlaylistQuerySet(models.QuerySet):
+    def with_summary(self):
+        # Số bài và tổng thời lượng tính bằng một câu GROUP BY thay vì đọc từng bài hát
+        return self.annotate(
+            song_count=models.Count('playlistsong'),
+            total_duration=Coalesce(models.Sum('playlistsong__song__duration'), 0),
+        )
+
 class Playlist(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     cover_image = models.CharField(max_length=255, blank=True, null=True)  # Thêm trường cover_image
+    cover_thumbnails = models.JSONField(default=dict, blank=True)  # như Album.cover_thumbnails
     description = models.TextField(blank=True, null=True)  # Thêm trường description
     status = models.IntegerField(default=1)
 
+    objects = PlaylistQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -183,14 +508,62 @@ class Playlist(models.Model):
         db_table = 'playlists'
         managed = True
 
+class PlaylistSongQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('song__artist', 'song__album').only(
+            'id', 'playlist', 'position',
+            *(f'song__{column}' for column in SongQuerySet.LISTING_COLUMNS.values()),
+        )
+
+    def cover_images(self, playlist_ids, per_playlist):
+        # Ảnh bìa album của per_playlist bài đầu tiên mỗi playlist, một query cho mọi playlist
+        return self._group_covers(playlist_ids, self._cover_rows(playlist_ids, per_playlist))
+
+    async def acover_images(self, playlist_ids, per_playlist):
+        rows = [row async for row in self._cover_rows(playlist_ids, per_playlist)]
+        return self._group_covers(playlist_ids, rows)
+
+    def _cover_rows(self, playlist_ids, per_playlist):
+        return (
+            self.filter(playlist_id__in=playlist_ids, song__album__cover_image__isnull=False)
+            .annotate(preview_rank=models.Window(
+                RowNumber(), partition_by=models.F('playlist_id'), order_by=[models.F('position').asc(), models.F('id').asc()]
+            ))
+            .filter(preview_rank__lte=per_playlist)
+            .order_by('playlist_id', 'preview_rank')
+            .values_list('playlist_id', 'song__album__cover_image', 'song__album__cover_thumbnails')
+        )
+
+    @staticmethod
+    def _group_covers(playlist_ids, rows):
+        from .thumbnails import pick
+
+        covers = {playlist_id: [] for playlist_id in playlist_ids}
+        seen = {playlist_id: set() for playlist_id in playlist_ids}
+        for playlist_id, cover_image, thumbnails in rows:
+            if cover_image not in seen[playlist_id]:
+                seen[playlist_id].add(cover_image)
+                # Ảnh xem trước nhỏ: dùng ảnh thu nhỏ nếu đã tạo, chưa có thì ảnh gốc
+                covers[playlist_id].append(pick(thumbnails, settings.PLAYLIST_COVER_PREVIEW_SIZE) or cover_image)
+        return covers
+
 class PlaylistSong(models.Model):
+    # Thứ tự trong playlist theo position, các bài cách nhau POSITION_GAP để chuyển chỗ một bài
+    # chỉ cần sửa position của chính nó (xem app/playlists.py)
+    POSITION_GAP = 1 << 16
+
     id = models.AutoField(primary_key=True)
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    position = models.BigIntegerField(default=0)
+
+    objects = PlaylistSongQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.playlist.name} - {self.song.name}"
 
     class Meta:
         db_table = 'playlist_songs'
-        managed = True
\ No newline at end of file
+        managed = True
+        constraints = [models.UniqueConstraint(fields=['playlist', 'song'], name='playlist_song_unique')]
+        indexes = [models.Index(fields=['playlist', 'position'], name='playlist_song_position_idx')]
\ No newline at end of file
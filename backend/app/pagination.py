@@ -0,0 +1,187 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+
+class SongCursorPagination:
+    # Phân trang keyset: WHERE theo vị trí của bản ghi cuối trang trước,
+    # không dùng OFFSET nên chi phí mỗi trang không tăng theo vị trí trang
+    # 'relevance' đi theo danh sách id đã xếp hạng của app/search.py (đã giới hạn độ dài),
+    # cursor khi đó là vị trí trong danh sách
+    ORDERINGS = {
+        'id': ('id',),
+        'play_count': ('-play_count', 'id'),
+        'relevance': None,
+    }
+
+    def __init__(self, request, ranking=None):
+        self.ranking = ranking
+        self.ordering = request.GET.get('order', 'id' if ranking is None else 'relevance')
+        if self.ordering not in self.ORDERINGS:
+            raise ValidationError({'order': f'Chỉ hỗ trợ: {", ".join(self.ORDERINGS)}'})
+        if self.ordering == 'relevance' and ranking is None:
+            raise ValidationError({'order': 'order=relevance chỉ dùng kèm search'})
+        self.limit = self._parse_limit(request.GET.get('limit'))
+        self.cursor = self._decode_cursor(request.GET.get('cursor'))
+        self.next_cursor = None
+
+    @staticmethod
+    def is_requested(request):
+        return 'limit' in request.GET or 'cursor' in request.GET
+
+    def _parse_limit(self, value):
+        max_limit = settings.SONGS_PAGE_MAX_LIMIT
+        if value in (None, ''):
+            return settings.SONGS_PAGE_DEFAULT_LIMIT
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ValidationError({'limit': 'limit phải là số nguyên'})
+        if limit < 1:
+            raise ValidationError({'limit': 'limit phải lớn hơn 0'})
+        return min(limit, max_limit)
+
+    def _decode_cursor(self, value):
+        if not value:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(value.encode()).decode()
+            return [int(part) for part in raw.split(':')]
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({'cursor': 'cursor không hợp lệ'})
+
+    def _encode_cursor(self, song):
+        if self.ordering == 'play_count':
+            raw = f'{song.play_count}:{song.id}'
+        else:
+            raw = str(song.id)
+        return self._encode(raw)
+
+    @staticmethod
+    def _encode(raw):
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _after_cursor(self):
+        if self.ordering == 'play_count':
+            if len(self.cursor) != 2:
+                raise ValidationError({'cursor': 'cursor không khớp với order'})
+            play_count, song_id = self.cursor
+            return Q(play_count__lt=play_count) | Q(play_count=play_count, id__gt=song_id)
+        if len(self.cursor) != 1:
+            raise ValidationError({'cursor': 'cursor không khớp với order'})
+        return Q(id__gt=self.cursor[0])
+
+    def _ranking_page(self):
+        if self.cursor is not None and len(self.cursor) != 1:
+            raise ValidationError({'cursor': 'cursor không khớp với order'})
+        position = self.cursor[0] if self.cursor else 0
+        ids = self.ranking[position:position + self.limit + 1]
+        if len(ids) > self.limit:
+            ids = ids[:self.limit]
+            self.next_cursor = self._encode(str(position + self.limit))
+        return ids
+
+    def _page_queryset(self, queryset):
+        queryset = queryset.order_by(*self.ORDERINGS[self.ordering])
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after_cursor())
+        # Lấy dư một bản ghi để biết còn trang sau hay không
+        return queryset[:self.limit + 1]
+
+    def _trim(self, page):
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = self._encode_cursor(page[-1])
+        return page
+
+    def paginate_queryset(self, queryset):
+        if self.ordering == 'relevance':
+            ids = self._ranking_page()
+            songs = queryset.in_bulk(ids)
+            return [songs[song_id] for song_id in ids if song_id in songs]
+        return self._trim(list(self._page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset):
+        # Như paginate_queryset, dùng ORM async (app/async_views.py)
+        if self.ordering == 'relevance':
+            ids = self._ranking_page()
+            songs = await queryset.ain_bulk(ids)
+            return [songs[song_id] for song_id in ids if song_id in songs]
+        return self._trim([row async for row in self._page_queryset(queryset)])
+
+    def get_paginated_data(self, data):
+        return {'results': data, 'next_cursor': self.next_cursor, 'limit': self.limit}
+
+
+class PlaylistSongCursorPagination(SongCursorPagination):
+    # Bài hát trong playlist theo thứ tự của playlist (PlaylistSong.position, index (playlist, position));
+    # order=id vẫn nhận để tương thích, cũng đi theo position
+    ORDERINGS = {
+        'id': ('position', 'id'),
+    }
+
+    def _encode_cursor(self, playlist_song):
+        return self._encode(f'{playlist_song.position}:{playlist_song.id}')
+
+    def _after_cursor(self):
+        if len(self.cursor) != 2:
+            raise ValidationError({'cursor': 'cursor không khớp với order'})
+        position, row_id = self.cursor
+        return Q(position__gt=position) | Q(position=position, id__gt=row_id)
+
+
+class MessageHistoryPagination:
+    # Lịch sử trò chuyện đọc ngược từ tin mới nhất theo index (conversation, timestamp, id).
+    # before= là cursor (timestamp, id) của tin cũ nhất trang trước; mỗi trang trả về theo
+    # thứ tự thời gian tăng dần để client nối thẳng lên đầu danh sách
+    EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def __init__(self, request):
+        self.limit = self._parse_limit(request.GET.get('limit'))
+        self.before = self._decode_cursor(request.GET.get('before'))
+        self.next_cursor = None
+
+    @staticmethod
+    def is_requested(request):
+        return 'limit' in request.GET or 'before' in request.GET
+
+    def _parse_limit(self, value):
+        if value in (None, ''):
+            return settings.MESSAGES_PAGE_DEFAULT_LIMIT
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ValidationError({'limit': 'limit phải là số nguyên'})
+        if limit < 1:
+            raise ValidationError({'limit': 'limit phải lớn hơn 0'})
+        return min(limit, settings.MESSAGES_PAGE_MAX_LIMIT)
+
+    def _decode_cursor(self, value):
+        if not value:
+            return None
+        try:
+            micros, message_id = (int(part) for part in base64.urlsafe_b64decode(value.encode()).decode().split(':'))
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError({'before': 'cursor không hợp lệ'})
+        return self.EPOCH + timedelta(microseconds=micros), message_id
+
+    def _encode_cursor(self, message):
+        micros = (message.timestamp - self.EPOCH) // timedelta(microseconds=1)
+        return base64.urlsafe_b64encode(f'{micros}:{message.id}'.encode()).decode()
+
+    def paginate_queryset(self, queryset):
+        queryset = queryset.order_by('-timestamp', '-id')
+        if self.before is not None:
+            timestamp, message_id = self.before
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+        page = list(queryset[:self.limit + 1])
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = self._encode_cursor(page[-1])
+        page.reverse()
+        return page
+
+    def get_paginated_data(self, data):
+        return {'results': data, 'next_cursor': self.next_cursor, 'limit': self.limit}
@@ -0,0 +1,145 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from .models import Song
+
+logger = logging.getLogger(__name__)
+
+# Gom lượt nghe trong bộ nhớ rồi ghi xuống DB theo lô:
+# - record() chỉ cộng vào một dict, không chạm DB
+# - flush() ghi mọi bài hát đang chờ bằng MỘT câu UPDATE play_count = play_count + CASE ...
+#   nên không đọc-sửa-ghi, không mất lượt nghe khi nhiều worker / tiến trình chạy song song
+# Mỗi tiến trình có một bộ gom riêng; luồng nền flush định kỳ (PLAY_COUNT_FLUSH_INTERVAL).
+# on_flush: các hàm nhận {song_id: số lượt} sau mỗi lần ghi thành công (ví dụ app/charts.py).
+
+
+class PlayCountAggregator:
+    def __init__(self, flush_interval=None, flush_threshold=None, log_path=None, on_flush=()):
+        self.flush_interval = settings.PLAY_COUNT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.flush_threshold = settings.PLAY_COUNT_FLUSH_THRESHOLD if flush_threshold is None else flush_threshold
+        self.log_path = settings.PLAY_LOG_PATH if log_path is None else log_path
+        self.on_flush = list(on_flush)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._events = []
+        self._pending_total = 0
+        self._thread = None
+        self._stopped = threading.Event()
+        # Thống kê cho benchmark / giám sát
+        self.recorded = 0
+        self.flushes = 0
+        self.db_writes = 0
+
+    def record(self, song_id, user_id=None):
+        with self._lock:
+            self._pending[song_id] = self._pending.get(song_id, 0) + 1
+            self._pending_total += 1
+            self.recorded += 1
+            if self.log_path:
+                self._events.append((time.time(), song_id, user_id))
+            should_flush = self.flush_interval <= 0 or self._pending_total >= self.flush_threshold
+        if should_flush:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def pending(self, song_id):
+        with self._lock:
+            return self._pending.get(song_id, 0)
+
+    def flush(self):
+        # Tách dict đang chờ ra khỏi lock rồi mới ghi DB, record() không phải chờ câu UPDATE
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                events, self._events = self._events, []
+                self._pending_total = 0
+            if pending:
+                try:
+                    self._write_counts(pending)
+                except Exception:
+                    # Ghi lỗi thì trả lại số đếm để lần flush sau thử lại
+                    with self._lock:
+                        for song_id, count in pending.items():
+                            self._pending[song_id] = self._pending.get(song_id, 0) + count
+                            self._pending_total += count
+                    raise
+                for listener in self.on_flush:
+                    try:
+                        listener(pending)
+                    except Exception:
+                        # Lượt nghe đã ghi xong; lỗi ở bước phụ không được làm mất hay cộng lại lượt nghe
+                        logger.exception('Lỗi khi xử lý lượt nghe sau flush (%s)', getattr(listener, '__name__', listener))
+            if events:
+                self._append_log(events)
+        return sum(pending.values())
+
+    def _write_counts(self, pending):
+        increment = Case(
+            *[When(id=song_id, then=Value(count)) for song_id, count in pending.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Song.objects.filter(id__in=list(pending)).update(play_count=F('play_count') + increment)
+        self.flushes += 1
+        self.db_writes += 1
+
+    def _append_log(self, events):
+        # Nhật ký chỉ ghi nối (JSON lines) phục vụ thống kê, không bao giờ sửa dòng cũ
+        with open(self.log_path, 'a', encoding='utf-8') as log_file:
+            for timestamp, song_id, user_id in events:
+                log_file.write(json.dumps({'ts': timestamp, 'song_id': song_id, 'user_id': user_id}) + '\n')
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='play-count-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Không ghi được lượt nghe xuống DB, sẽ thử lại')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                on_flush = []
+                if settings.CHARTS_ENABLED:
+                    from . import charts
+                    on_flush.append(charts.record_plays)
+                _aggregator = PlayCountAggregator(on_flush=on_flush)
+                atexit.register(_aggregator.stop)
+    return _aggregator
+
+
+def record_play(song_id, user_id=None):
+    get_aggregator().record(song_id, user_id)
+
+
+def pending_plays(song_id):
+    return get_aggregator().pending(song_id)
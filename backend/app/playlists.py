@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models import Max
+from .models import Playlist, PlaylistSong, Song
+
+# Thứ tự bài hát trong playlist: PlaylistSong.position tăng dần, bài mới cách bài cuối
+# POSITION_GAP. Chuyển một bài tới giữa hai bài khác lấy điểm giữa hai position nên chỉ
+# ghi đúng một dòng; khi hai bài liền nhau hết khoảng trống thì đánh số lại cả playlist (hiếm).
+# Trùng (playlist, song) do ràng buộc unique của DB chặn, không kiểm tra trước rồi mới chèn.
+
+GAP = PlaylistSong.POSITION_GAP
+
+
+class NotInPlaylist(Exception):
+    def __init__(self, song_id):
+        super().__init__(song_id)
+        self.song_id = song_id
+
+
+def _lock(playlist_id):
+    # Khóa dòng playlist: các thao tác ghi cùng playlist chạy lần lượt, không cấp trùng position
+    return Playlist.objects.select_for_update().filter(id=playlist_id).values_list('id', flat=True).first()
+
+
+def add_songs(playlist_id, song_ids):
+    # Thêm vào cuối theo đúng thứ tự truyền vào; trả về (id bài đã thêm, id bài đã có sẵn, id không tồn tại)
+    song_ids = list(dict.fromkeys(song_ids))
+    with transaction.atomic():
+        if _lock(playlist_id) is None:
+            raise Playlist.DoesNotExist
+        known = set(Song.objects.filter(id__in=song_ids).values_list('id', flat=True))
+        present = set(
+            PlaylistSong.objects.filter(playlist_id=playlist_id, song_id__in=song_ids).values_list('song_id', flat=True)
+        )
+        added = [song_id for song_id in song_ids if song_id in known and song_id not in present]
+        last = PlaylistSong.objects.filter(playlist_id=playlist_id).aggregate(last=Max('position'))['last'] or 0
+        PlaylistSong.objects.bulk_create(
+            [
+                PlaylistSong(playlist_id=playlist_id, song_id=song_id, position=last + GAP * index)
+                for index, song_id in enumerate(added, start=1)
+            ],
+            ignore_conflicts=True,
+        )
+    return (
+        added,
+        [song_id for song_id in song_ids if song_id in present],
+        [song_id for song_id in song_ids if song_id not in known],
+    )
+
+
+def remove_songs(playlist_id, song_ids):
+    # Xóa không làm lệch position của các bài còn lại; trả về id các bài đã xóa
+    with transaction.atomic():
+        rows = PlaylistSong.objects.filter(playlist_id=playlist_id, song_id__in=list(song_ids))
+        removed = list(rows.values_list('song_id', flat=True))
+        rows.delete()
+    return removed
+
+
+def move_songs(playlist_id, moves):
+    # moves: [(song_id, after_song_id | None)] áp dụng lần lượt; None = lên đầu playlist.
+    # Một câu SELECT thứ tự hiện tại, chỉ ghi các dòng đổi position (thường mỗi lần chuyển một dòng)
+    with transaction.atomic():
+        if _lock(playlist_id) is None:
+            raise Playlist.DoesNotExist
+        rows = list(
+            PlaylistSong.objects.filter(playlist_id=playlist_id).order_by('position', 'id')
+            .values_list('id', 'song_id', 'position')
+        )
+        row_ids = {song_id: row_id for row_id, song_id, _ in rows}
+        order = [song_id for _, song_id, _ in rows]
+        positions = {song_id: position for _, song_id, position in rows}
+        changed = set()
+        for song_id, after in moves:
+            for required in (song_id, after):
+                if required is not None and required not in positions:
+                    raise NotInPlaylist(required)
+            if song_id == after:
+                continue
+            order.remove(song_id)
+            index = 0 if after is None else order.index(after) + 1
+            order.insert(index, song_id)
+            before_position = positions[order[index - 1]] if index > 0 else 0
+            next_position = positions[order[index + 1]] if index + 1 < len(order) else None
+            if next_position is None:
+                positions[song_id] = before_position + GAP
+            elif next_position - before_position >= 2:
+                positions[song_id] = (before_position + next_position) // 2
+            else:
+                # Hết khoảng trống giữa hai bài: đánh số lại cả playlist
+                for rank, other in enumerate(order, start=1):
+                    if positions[other] != rank * GAP:
+                        positions[other] = rank * GAP
+                        changed.add(other)
+            changed.add(song_id)
+        if changed:
+            PlaylistSong.objects.bulk_update(
+                [PlaylistSong(id=row_ids[song_id], position=positions[song_id]) for song_id in changed], ['position'],
+            )
+    return order
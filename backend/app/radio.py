@@ -0,0 +1,220 @@
+import secrets
+import time
+from collections import deque
+from django.conf import settings
+from django.core.cache import caches
+from . import charts, recommendations
+from .models import PlaylistSong, Song
+
+# Radio: hàng đợi phát liên tục sinh ở server từ một bài hát, nghệ sĩ hoặc playlist.
+# Mỗi trang chạy qua một chuỗi generator, mỗi tầng chỉ kéo đủ phần tử tầng sau cần:
+#   lấy ứng viên (theo tầng) -> bỏ bài đã phát gần đây -> lấy thông tin bài theo lô
+#   -> lọc status / premium -> xếp lại để các bài cùng nghệ sĩ không liền nhau
+# Bỏ trùng làm trước khi đọc DB để bài đã phát không bao giờ tốn một dòng SELECT.
+# Hạn thời gian (RADIO_PAGE_BUDGET_MS): tầng lấy ứng viên ngừng sinh sớm hơn hạn
+# RADIO_HYDRATE_RESERVE_MS để còn thời gian cho câu SELECT lấy thông tin lô cuối; tầng lấy thông tin
+# không chạy thêm câu nào khi đã quá hạn nên trang luôn trả về đúng hạn (có thể thiếu bài).
+# Phiên radio (lịch sử gần đây, nghệ sĩ vừa phát, con trỏ quét catalog) lưu trong cache RADIO_CACHE_ALIAS.
+
+SEED_SONG = 'song'
+SEED_ARTIST = 'artist'
+SEED_PLAYLIST = 'playlist'
+SEED_TYPES = (SEED_SONG, SEED_ARTIST, SEED_PLAYLIST)
+
+ROW_FIELDS = ('id', 'artist_id', 'status', 'premium')
+
+
+class SeedNotFound(Exception):
+    pass
+
+
+def _cache():
+    return caches[settings.RADIO_CACHE_ALIAS]
+
+
+def new_session(seed_type, seed_id, user_id=None):
+    if seed_type == SEED_SONG:
+        seed_artist = Song.objects.filter(id=seed_id).values_list('artist_id', flat=True).first()
+        if seed_artist is None:
+            raise SeedNotFound(seed_type)
+    elif seed_type == SEED_ARTIST:
+        if not Song.objects.filter(artist_id=seed_id).exists():
+            raise SeedNotFound(seed_type)
+    elif not PlaylistSong.objects.filter(playlist_id=seed_id).exists():
+        raise SeedNotFound(seed_type)
+    return {
+        'token': secrets.token_urlsafe(16),
+        'seed_type': seed_type,
+        'seed_id': seed_id,
+        'user_id': user_id,
+        'history': [seed_id] if seed_type == SEED_SONG else [],
+        'recent_artists': [],
+        'scan_after': 0,
+    }
+
+
+def load_session(token):
+    return _cache().get(f'radio:{token}')
+
+
+def save_session(session):
+    session['history'] = session['history'][-settings.RADIO_HISTORY_SIZE:]
+    session['recent_artists'] = session['recent_artists'][-settings.RADIO_ARTIST_SPACING:]
+    _cache().set(f'radio:{session["token"]}', session, settings.RADIO_SESSION_TIMEOUT)
+
+
+# --- Tầng 1: lấy ứng viên --------------------------------------------------------------
+
+def _seed_songs(session):
+    seed_type, seed_id = session['seed_type'], session['seed_id']
+    limit = settings.RADIO_TIER_LIMIT
+    if seed_type == SEED_SONG:
+        return [seed_id]
+    if seed_type == SEED_ARTIST:
+        return list(
+            Song.objects.filter(artist_id=seed_id).order_by('-play_count', 'id').values_list('id', flat=True)[:limit]
+        )
+    return list(PlaylistSong.objects.filter(playlist_id=seed_id).order_by('id').values_list('song_id', flat=True)[:limit])
+
+
+def candidates(session):
+    # Các tầng theo thứ tự ưu tiên; tầng sau chỉ chạy khi tầng trước đã cạn
+    seeds = _seed_songs(session)
+    if session['seed_type'] != SEED_SONG:
+        yield from seeds
+    # Bài tương tự (chỉ mục đồng xuất hiện trong playlist), xen kẽ giữa các bài gốc
+    neighbor_lists = [recommendations.similar_songs(song_id) for song_id in seeds[:settings.RADIO_SEED_FANOUT]]
+    for rank in range(max(map(len, neighbor_lists), default=0)):
+        for neighbors in neighbor_lists:
+            if rank < len(neighbors):
+                yield neighbors[rank][0]
+    # Cùng nghệ sĩ với bài gốc
+    if session['seed_type'] == SEED_SONG:
+        artist_id = Song.objects.filter(id=session['seed_id']).values_list('artist_id', flat=True).first()
+        yield from Song.objects.filter(artist_id=artist_id).order_by('-play_count', 'id').values_list(
+            'id', flat=True
+        )[:settings.RADIO_TIER_LIMIT]
+    # Bảng xếp hạng mọi thời gian (đã tính sẵn)
+    yield from charts.get_chart(charts.ALL).values_list('song_id', flat=True)
+    # Cuối cùng quét catalog theo id (keyset), vòng lại từ đầu một lần khi hết
+    yield from _scan_catalog(session)
+
+
+def _scan_catalog(session):
+    batch = settings.RADIO_BATCH_SIZE
+    start = session['scan_after']
+    wrapped = False
+    after = start
+    while True:
+        rows = Song.objects.filter(id__gt=after)
+        if wrapped:
+            rows = rows.filter(id__lte=start)
+        ids = list(rows.order_by('id').values_list('id', flat=True)[:batch])
+        for song_id in ids:
+            # Vị trí của bài cuối đã rời nguồn; vài bài còn nằm trong bộ đệm khi trang đầy sẽ được
+            # gặp lại ở vòng quét sau
+            session['scan_after'] = song_id
+            yield song_id
+        if len(ids) == batch:
+            after = ids[-1]
+        elif wrapped or start == 0:
+            return
+        else:
+            wrapped, after = True, 0
+
+
+def until(deadline, ids, clock=time.perf_counter):
+    for song_id in ids:
+        if clock() >= deadline:
+            return
+        yield song_id
+
+
+# --- Tầng 2: bỏ bài đã phát / đã đưa vào trang ------------------------------------------
+
+def unseen(ids, history):
+    seen = set(history)
+    for song_id in ids:
+        if song_id not in seen:
+            seen.add(song_id)
+            yield song_id
+
+
+# --- Tầng 3: lấy thông tin theo lô -------------------------------------------------------
+
+def hydrate(ids, batch_size=None, deadline=None, clock=time.perf_counter):
+    # Mỗi RADIO_BATCH_SIZE id một câu SELECT chỉ lấy các cột cần để lọc và xếp lại; quá deadline
+    # thì bỏ lô đang chờ thay vì chạy thêm câu SELECT
+    batch_size = batch_size or settings.RADIO_BATCH_SIZE
+    batch = []
+    for song_id in ids:
+        batch.append(song_id)
+        if len(batch) >= batch_size:
+            if deadline is not None and clock() >= deadline:
+                return
+            yield from _fetch(batch)
+            batch = []
+    if batch and (deadline is None or clock() < deadline):
+        yield from _fetch(batch)
+
+
+def _fetch(ids):
+    rows = {row['id']: row for row in Song.objects.filter(id__in=ids).values(*ROW_FIELDS)}
+    for song_id in ids:
+        if song_id in rows:
+            yield rows[song_id]
+
+
+# --- Tầng 4: lọc bài không phát được ------------------------------------------------------
+
+def playable(rows, is_premium):
+    for row in rows:
+        if row['status'] == 1 and (is_premium or not row['premium']):
+            yield row
+
+
+# --- Tầng 5: đa dạng nghệ sĩ -------------------------------------------------------------
+
+def diversify(rows, recent_artists, spacing=None, window=None):
+    # Giữ một bộ đệm nhỏ; lấy bài đầu tiên có nghệ sĩ không nằm trong `spacing` bài vừa phát.
+    # Không có bài nào như vậy trong bộ đệm thì phát bài đầu tiên để hàng đợi không bị tắc.
+    spacing = settings.RADIO_ARTIST_SPACING if spacing is None else spacing
+    window = window or settings.RADIO_DIVERSITY_WINDOW
+    recent = deque(recent_artists[-spacing:] if spacing else [], maxlen=spacing or None)
+    buffer = []
+    rows = iter(rows)
+    exhausted = False
+    while True:
+        while not exhausted and len(buffer) < window:
+            row = next(rows, None)
+            if row is None:
+                exhausted = True
+            else:
+                buffer.append(row)
+        if not buffer:
+            return
+        index = next((i for i, row in enumerate(buffer) if row['artist_id'] not in recent), 0)
+        row = buffer.pop(index)
+        if spacing:
+            recent.append(row['artist_id'])
+        yield row
+
+
+def next_page(session, limit, is_premium, budget_ms=None, clock=time.perf_counter):
+    # Trả về (danh sách id theo thứ tự phát, đã hết giờ hay chưa); cập nhật session tại chỗ
+    budget_ms = settings.RADIO_PAGE_BUDGET_MS if budget_ms is None else budget_ms
+    started = clock()
+    deadline = started + budget_ms / 1000
+    # Dành phần cuối của budget (tối đa một nửa) cho câu SELECT lấy thông tin lô cuối
+    cutoff = deadline - min(settings.RADIO_HYDRATE_RESERVE_MS, budget_ms / 2) / 1000
+    source = until(cutoff, candidates(session), clock)
+    rows = hydrate(unseen(source, session['history']), deadline=deadline, clock=clock)
+    pipeline = diversify(playable(rows, is_premium), session['recent_artists'])
+    page = []
+    for row in pipeline:
+        page.append(row['id'])
+        session['history'].append(row['id'])
+        session['recent_artists'].append(row['artist_id'])
+        if len(page) >= limit:
+            break
+    return page, clock() >= cutoff
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+from . import auth
+
+# Giới hạn tần suất cho các API ghi / dễ bị lạm dụng (lượt nghe, tin nhắn, đăng nhập, thanh toán).
+# Mỗi scope có các luật trong RATELIMIT_RULES, theo từng loại khóa:
+#   'user'  - user của token; request không có token chỉ bị giới hạn theo 'ip' (user_id client tự gửi
+#             đổi được ở mỗi request nên không dùng làm khóa)
+#   'ip'    - địa chỉ client (DRF get_ident, tôn trọng NUM_PROXIES)
+#   'email' - email trong body (đăng nhập: chặn dò mật khẩu một tài khoản từ nhiều IP)
+# Luật 'N/period' là một token bucket sức chứa N, nạp lại N token mỗi period.
+# Nơi lưu (RATELIMIT_STORE):
+#   None  - bộ nhớ tiến trình, token bucket chính xác (dev / test, một tiến trình)
+#   alias - một cache Django (Redis khi chạy nhiều worker); không có thao tác đọc-sửa-ghi nguyên tử
+#           nên dùng bộ đếm cửa sổ trượt bằng incr(): cùng sức chứa N trong mỗi period như bucket
+# Vượt giới hạn thì DRF trả 429 kèm Retry-After.
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+class MemoryStore:
+    # key -> [token còn lại, lần nạp cuối]; quá max_keys thì bỏ bucket lâu không dùng (coi như đầy lại)
+    def __init__(self, max_keys=None, clock=time.monotonic):
+        self.max_keys = max_keys or settings.RATELIMIT_MEMORY_MAX_KEYS
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def hit(self, key, capacity, period):
+        # Trả về (được phép hay không, số giây phải chờ)
+        allowed, _, wait = self.hit_all([(key, capacity, period)])
+        return allowed, wait
+
+    def hit_all(self, limits):
+        # limits: [(key, sức chứa, period)]; chỉ trừ token khi mọi bucket đều còn, nếu không trả về
+        # (False, vị trí bucket đầu tiên hết token, số giây phải chờ) và không bucket nào bị trừ
+        with self._lock:
+            now = self.clock()
+            buckets = [self._bucket(key, capacity, period, now) for key, capacity, period in limits]
+            for index, (bucket, (_, capacity, period)) in enumerate(zip(buckets, limits)):
+                if bucket[0] < 1:
+                    return False, index, (1 - bucket[0]) * period / capacity
+            for bucket in buckets:
+                bucket[0] -= 1
+            return True, None, 0
+
+    def _bucket(self, key, capacity, period, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(capacity), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * capacity / period)
+            bucket[1] = now
+        return bucket
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore:
+    # Bộ đếm cửa sổ trượt: ước lượng = đếm cửa sổ trước * phần còn chồng lên + đếm cửa sổ hiện tại
+    def __init__(self, alias, clock=time.time):
+        self.cache = caches[alias]
+        self.clock = clock
+
+    def hit(self, key, capacity, period):
+        allowed, _, wait = self.hit_all([(key, capacity, period)])
+        return allowed, wait
+
+    def hit_all(self, limits):
+        # Như MemoryStore.hit_all: tăng lần lượt từng bộ đếm, gặp bộ đếm vượt giới hạn thì trả lại
+        # mọi lần tăng của request này (request bị chặn không chiếm chỗ ở khóa nào)
+        now = self.clock()
+        counted = []
+        for index, (key, capacity, period) in enumerate(limits):
+            window = int(now // period)
+            current = f'ratelimit:{key}:{window}'
+            self.cache.add(current, 0, period * 2)
+            count = self.cache.incr(current)
+            counted.append(current)
+            previous = self.cache.get(f'ratelimit:{key}:{window - 1}', 0)
+            elapsed = now - window * period
+            if previous * (1 - elapsed / period) + count > capacity:
+                for counter in counted:
+                    self.cache.decr(counter)
+                return False, index, period - elapsed
+        return True, None, 0
+
+    def clear(self):
+        # Xóa cả alias: RATELIMIT_STORE nên là một alias riêng, không dùng chung với cache khác
+        self.cache.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                alias = settings.RATELIMIT_STORE
+                _store = MemoryStore() if alias is None else CacheStore(alias)
+    return _store
+
+
+# --- Số liệu ------------------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(scope, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(scope, {})
+        counters[outcome] = counters.get(outcome, 0) + 1
+
+
+def stats():
+    # Theo scope: số request được cho qua ('allowed') và số bị chặn theo loại khóa ('limited_<kind>')
+    with _stats_lock:
+        return {scope: dict(counters) for scope, counters in _stats.items()}
+
+
+def reset():
+    get_store().clear()
+    with _stats_lock:
+        _stats.clear()
+
+
+# --- Throttle cho DRF ---------------------------------------------------------------------
+
+class RateLimit(BaseThrottle):
+    scope = None
+
+    def identify(self, request, kind):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'user':
+            user = auth.current_user(request)
+            return user.id if user is not None else None
+        if kind == 'email':
+            email = request.data.get('email') if hasattr(request.data, 'get') else None
+            return str(email).strip().lower() if email else None
+        raise ValueError(f'Loại khóa giới hạn không hỗ trợ: {kind}')
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if not settings.RATELIMIT_ENABLED:
+            return True
+        kinds, limits = [], []
+        for kind, rate in settings.RATELIMIT_RULES.get(self.scope, {}).items():
+            ident = self.identify(request, kind)
+            if ident is None:
+                continue
+            kinds.append(kind)
+            limits.append((f'{self.scope}:{kind}:{ident}', *parse_rate(rate)))
+        # Request bị một luật chặn không tốn lượt ở các luật khác
+        allowed, denied, wait = get_store().hit_all(limits)
+        if not allowed:
+            _count(self.scope, f'limited_{kinds[denied]}')
+            self.retry_after = wait
+            return False
+        _count(self.scope, 'allowed')
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class PlayRateLimit(RateLimit):
+    scope = 'play'
+
+
+class MessageRateLimit(RateLimit):
+    scope = 'message'
+
+
+class LoginRateLimit(RateLimit):
+    scope = 'login'
+
+
+class PaymentRateLimit(RateLimit):
+    scope = 'payment'
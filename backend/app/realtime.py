@@ -0,0 +1,41 @@
+import logging
+from django.db import transaction
+from .serializers import MessageSerializer
+
+logger = logging.getLogger(__name__)
+
+# Đẩy tin nhắn mới tới client đang mở WebSocket (app/consumers.py) thay vì để trang Chat
+# tải lại cả cuộc trò chuyện. Mỗi user có một group riêng; tin nhắn gửi vào group của cả
+# người gửi lẫn người nhận (người gửi có thể đang mở nhiều tab).
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+def _group_send(groups, event):
+    # Import muộn: channels chỉ cần khi chạy qua ASGI, view REST vẫn dùng được khi thiếu
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    send = async_to_sync(channel_layer.group_send)
+    for group in groups:
+        send(group, event)
+
+
+def publish_message(message):
+    # Chỉ đẩy sau khi transaction tạo tin nhắn đã commit, client không nhận tin bị rollback
+    data = MessageSerializer(message).data
+    groups = {user_group(message.sender_id), user_group(message.receiver_id)}
+
+    def send():
+        try:
+            _group_send(sorted(groups), {'type': 'chat.message', 'message': dict(data)})
+        except Exception:
+            # Lỗi channel layer (Redis mất kết nối...) không làm hỏng request gửi tin
+            logger.exception('Không đẩy được tin nhắn %s qua WebSocket', message.id)
+
+    transaction.on_commit(send)
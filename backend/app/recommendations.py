@@ -0,0 +1,252 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from .models import PlaylistSong
+
+logger = logging.getLogger(__name__)
+
+# Gợi ý "bài hát tương tự" từ việc các bài cùng nằm trong một playlist (item-to-item):
+#   score(a, b) = số playlist chứa cả a và b / sqrt(số playlist chứa a * số playlist chứa b)
+# chỉ giữ RECOMMENDATIONS_TOP_K hàng xóm tốt nhất mỗi bài.
+# Kết quả lưu dạng CSR theo id bài hát (indptr / neighbors / scores, file .npy) trong một thư mục
+# phiên bản dưới RECOMMENDATIONS_DIR; file CURRENT trỏ tới phiên bản đang dùng. Tiến trình đọc
+# mở bằng np.load(mmap_mode='r') nên tra cứu một bài chỉ là cắt một đoạn mảng, không query DB.
+# Thêm / bớt bài trong playlist chỉ tính lại các hàng bị ảnh hưởng rồi ghi phiên bản mới ở nền;
+# lệnh rebuild_recommendations tính lại toàn bộ.
+
+ARRAYS = ('indptr', 'neighbors', 'scores')
+CURRENT = 'CURRENT'
+
+
+def _pairs(queryset):
+    rows = np.array(list(queryset.values_list('playlist_id', 'song_id')), dtype=np.int64).reshape(-1, 2)
+    return rows[:, 0], rows[:, 1]
+
+
+def cooccurrence(playlist_ids, song_ids, rows=None, max_playlist_size=None):
+    # Đếm số playlist chung cho mọi cặp (a, b), a != b, không vòng lặp Python theo playlist.
+    # rows: chỉ sinh cặp có a thuộc tập này (tính lại một phần). Trả về (a, b, count).
+    max_playlist_size = max_playlist_size or settings.RECOMMENDATIONS_MAX_PLAYLIST_SIZE
+    empty = np.empty(0, dtype=np.int64)
+    if len(song_ids) == 0:
+        return empty, empty, empty
+    order = np.lexsort((song_ids, playlist_ids))
+    playlist_ids, song_ids = playlist_ids[order], song_ids[order]
+    starts = np.flatnonzero(np.r_[True, playlist_ids[1:] != playlist_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(playlist_ids)])
+    # Playlist quá dài sinh số cặp bậc hai mà ít mang thông tin: bỏ qua
+    keep = np.repeat(sizes <= max_playlist_size, sizes)
+    group_start = np.repeat(starts, sizes)[keep]
+    group_size = np.repeat(sizes, sizes)[keep]
+    position = np.flatnonzero(keep)
+    if rows is not None:
+        wanted = np.isin(song_ids[position], rows)
+        position, group_start, group_size = position[wanted], group_start[wanted], group_size[wanted]
+    if len(position) == 0:
+        return empty, empty, empty
+
+    # Mỗi phần tử ghép với mọi phần tử cùng playlist: left lặp group_size lần, right chạy trong nhóm
+    total = int(group_size.sum())
+    left = np.repeat(position, group_size)
+    offsets = np.arange(total) - np.repeat(np.cumsum(group_size) - group_size, group_size)
+    right = np.repeat(group_start, group_size) + offsets
+    distinct = left != right
+    a, b = song_ids[left[distinct]], song_ids[right[distinct]]
+    width = int(song_ids.max()) + 1
+    keys, counts = np.unique(a * width + b, return_counts=True)
+    return keys // width, keys % width, counts
+
+
+def _playlist_frequency(song_ids):
+    return dict(
+        PlaylistSong.objects.filter(song_id__in=[int(song_id) for song_id in song_ids])
+        .values_list('song_id').annotate(total=Count('playlist_id', distinct=True))
+    )
+
+
+def score_pairs(a, b, counts, frequency):
+    lookup = np.vectorize(lambda song_id: frequency.get(int(song_id), 1), otypes=[np.float64])
+    return counts / np.sqrt(lookup(a) * lookup(b)) if len(a) else np.empty(0)
+
+
+def top_k(a, b, scores, k=None):
+    # Sắp theo (a, -score, b) rồi giữ k phần tử đầu mỗi a
+    k = k or settings.RECOMMENDATIONS_TOP_K
+    if len(a) == 0:
+        return a, b, scores
+    order = np.lexsort((b, -scores, a))
+    a, b, scores = a[order], b[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    rank = np.arange(len(a)) - np.repeat(starts, np.diff(np.r_[starts, len(a)]))
+    keep = rank < k
+    return a[keep], b[keep], scores[keep]
+
+
+def to_csr(a, b, scores, size):
+    # a đã sắp tăng dần; indptr đánh theo id bài hát nên tra cứu không cần bảng băm
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.add.at(indptr, a + 1, 1)
+    return np.cumsum(indptr), b.astype(np.int32), scores.astype(np.float32)
+
+
+def _root():
+    return str(settings.RECOMMENDATIONS_DIR)
+
+
+def write_index(indptr, neighbors, scores):
+    # Ghi vào thư mục phiên bản mới rồi đổi CURRENT bằng os.replace (nguyên tử)
+    root = _root()
+    os.makedirs(root, exist_ok=True)
+    version = f'v{time.time_ns()}'
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    for name, array in zip(ARRAYS, (indptr, neighbors, scores)):
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+    pointer = os.path.join(root, f'{CURRENT}.tmp')
+    with open(pointer, 'w', encoding='utf-8') as pointer_file:
+        pointer_file.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT))
+    # Giữ lại phiên bản liền trước cho tiến trình còn đang mmap, xóa các bản cũ hơn
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v'))
+    for old in versions[:-2]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._arrays = None
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(_root(), CURRENT), encoding='utf-8') as pointer_file:
+                return pointer_file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def arrays(self):
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._arrays = None if version is None else tuple(
+                        np.load(os.path.join(_root(), version, f'{name}.npy'), mmap_mode='r') for name in ARRAYS
+                    )
+                    self._version = version
+        return self._arrays
+
+    def similar(self, song_id, limit=None):
+        arrays = self.arrays()
+        if arrays is None:
+            return []
+        indptr, neighbors, scores = arrays
+        if song_id < 0 or song_id + 1 >= len(indptr):
+            return []
+        start, end = int(indptr[song_id]), int(indptr[song_id + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return [(int(neighbor), float(score)) for neighbor, score in zip(neighbors[start:end], scores[start:end])]
+
+
+_index = SimilarityIndex()
+
+
+def similar_songs(song_id, limit=None):
+    return _index.similar(song_id, limit)
+
+
+def build():
+    # Tính lại toàn bộ từ playlist_songs; trả về (số bài có gợi ý, số cặp đã lưu)
+    playlist_ids, song_ids = _pairs(PlaylistSong.objects.all())
+    a, b, counts = cooccurrence(playlist_ids, song_ids)
+    frequency = _playlist_frequency(np.unique(song_ids)) if len(song_ids) else {}
+    a, b, scores = top_k(a, b, score_pairs(a, b, counts, frequency))
+    size = int(song_ids.max()) + 1 if len(song_ids) else 0
+    write_index(*to_csr(a, b, scores, size))
+    return len(np.unique(a)), len(a)
+
+
+def update_songs(song_ids):
+    # Tính lại hàng của các bài bị ảnh hưởng, chép nguyên các hàng còn lại từ phiên bản hiện tại
+    song_ids = np.array(sorted(set(song_ids)), dtype=np.int64)
+    arrays = _index.arrays()
+    if arrays is None:
+        return build()
+    indptr, neighbors, scores = (np.asarray(array) for array in arrays)
+    old_a = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    keep = ~np.isin(old_a, song_ids)
+
+    playlist_ids, members = _pairs(PlaylistSong.objects.filter(
+        playlist_id__in=PlaylistSong.objects.filter(song_id__in=song_ids.tolist()).values('playlist_id')
+    ))
+    a, b, counts = cooccurrence(playlist_ids, members, rows=song_ids)
+    frequency = _playlist_frequency(np.union1d(a, b)) if len(a) else {}
+    a, b, new_scores = top_k(a, b, score_pairs(a, b, counts, frequency))
+
+    merged_a = np.concatenate([old_a[keep], a])
+    merged_b = np.concatenate([neighbors[keep].astype(np.int64), b])
+    merged_scores = np.concatenate([scores[keep].astype(np.float64), new_scores])
+    order = np.lexsort((merged_b, -merged_scores, merged_a))
+    size = max(len(indptr) - 1, int(song_ids.max()) + 1, int(members.max()) + 1 if len(members) else 0)
+    write_index(*to_csr(merged_a[order], merged_b[order], merged_scores[order], size))
+    return len(song_ids)
+
+
+class _Updater:
+    # Gom các bài cần tính lại; một luồng nền xử lý lần lượt nên nhiều thay đổi liên tiếp
+    # chỉ tạo một vài phiên bản mới thay vì mỗi request một lần ghi
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._executor = None
+        self._scheduled = False
+
+    def add(self, song_ids):
+        with self._lock:
+            self._dirty.update(song_ids)
+            if self._scheduled:
+                return
+            self._scheduled = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recommendations')
+        self._executor.submit(self._run)
+
+    def _run(self):
+        try:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                self._scheduled = False
+            if dirty:
+                update_songs(dirty)
+        except Exception:
+            logger.exception('Cập nhật gợi ý bài hát thất bại')
+        finally:
+            connection.close()
+
+
+_updater = _Updater()
+
+
+def _affected_songs(playlist_id, song_ids):
+    # Các bài vừa thêm / bớt và mọi bài cùng playlist (số playlist chung với các bài đó đã đổi)
+    members = set(PlaylistSong.objects.filter(playlist_id=playlist_id).values_list('song_id', flat=True))
+    return members | {int(song_id) for song_id in song_ids}
+
+
+def enqueue_membership_change(playlist_id, song_ids):
+    if not settings.RECOMMENDATIONS_ENABLED or not song_ids:
+        return
+    song_ids = list(song_ids)
+    if not settings.RECOMMENDATIONS_ASYNC:
+        transaction.on_commit(lambda: update_songs(_affected_songs(playlist_id, song_ids)))
+    else:
+        transaction.on_commit(lambda: _updater.add(_affected_songs(playlist_id, song_ids)))
@@ -0,0 +1,144 @@
+import re
+import unicodedata
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from .models import Song, SongSearchToken
+from . import catalog_cache
+
+# Chỉ mục đảo ngược cho tìm kiếm bài hát: mỗi (bài hát, từ) là một dòng trong bảng
+# song_search_tokens, có index theo token nên tra cứu chính xác / theo tiền tố
+# không phải quét toàn bảng như LIKE '%...%'. Chạy được trên MySQL lẫn SQLite.
+
+# Trọng số theo trường nguồn; một từ xuất hiện ở nhiều trường được cộng dồn
+FIELD_WEIGHTS = {
+    'name': 8,
+    'artist': 4,
+    'album': 2,
+    'lyrics': 1,
+}
+# Từ khớp chính xác được điểm cao hơn từ chỉ khớp tiền tố (đang gõ dở)
+EXACT_MATCH_BONUS = 2
+MAX_TOKEN_LENGTH = 64
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    # Bỏ dấu tiếng Việt: "Đừng Làm Trái Tim Anh Đau" -> "dung lam trai tim anh dau"
+    text = (text or '').lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in _TOKEN_RE.findall(normalize(text))]
+
+
+def matches(query, text):
+    # So khớp không dấu trong bộ nhớ, từ cuối của query được so theo tiền tố
+    terms = tokenize(query)
+    if not terms:
+        return False
+    words = set(tokenize(text))
+    *exact, prefix = terms
+    return all(term in words for term in exact) and any(word.startswith(prefix) for word in words)
+
+
+def _song_tokens(song):
+    weights = {}
+    sources = {
+        'name': song.name,
+        'artist': song.artist.name if song.artist_id else '',
+        'album': song.album.name if song.album_id else '',
+        'lyrics': song.lyrics,
+    }
+    for field, text in sources.items():
+        for token in set(tokenize(text)):
+            weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field]
+    return weights
+
+
+def index_songs(songs):
+    songs = list(songs)
+    if not songs:
+        return
+    rows = [
+        SongSearchToken(song_id=song.id, token=token, weight=weight)
+        for song in songs
+        for token, weight in _song_tokens(song).items()
+    ]
+    with transaction.atomic():
+        SongSearchToken.objects.filter(song_id__in=[song.id for song in songs]).delete()
+        SongSearchToken.objects.bulk_create(rows, batch_size=1000)
+        # Kết quả tìm kiếm đã cache (get_songs?search=) đọc từ chỉ mục này
+        catalog_cache.invalidate_on_commit('songs')
+
+
+def index_song(song):
+    index_songs([song])
+
+
+def reindex_artist(artist):
+    # Đổi tên nghệ sĩ ảnh hưởng tới mọi bài hát của nghệ sĩ đó
+    index_songs(Song.objects.select_related('artist', 'album').filter(artist=artist))
+
+
+def reindex_album(album):
+    index_songs(Song.objects.select_related('artist', 'album').filter(album=album))
+
+
+def rebuild(batch_size=1000):
+    # Không xóa cả bảng trước: index_songs thay các dòng của từng lô trong một transaction nên
+    # tìm kiếm vẫn đầy đủ trong lúc rebuild, lỗi giữa chừng chỉ để lại các lô chưa làm mới
+    songs = Song.objects.select_related('artist', 'album').order_by('id')
+    last_id = 0
+    total = 0
+    while True:
+        batch = list(songs.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return total
+        index_songs(batch)
+        total += len(batch)
+        last_id = batch[-1].id
+
+
+def _ranked_ids(query, limit):
+    # Query id bài hát theo thứ tự liên quan giảm dần (chưa chạy); None nếu query không có từ nào.
+    # Mọi từ trong query đều phải khớp, riêng từ cuối được khớp theo tiền tố để hỗ trợ gợi ý khi đang gõ
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    *exact_terms, prefix = terms
+
+    conditions = [Q(token=term) for term in exact_terms] + [Q(token__startswith=prefix)]
+    matched = {
+        f'term_{i}': Max(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, condition in enumerate(conditions)
+    }
+    score = Sum(F('weight') * Case(
+        When(token__in=terms, then=Value(EXACT_MATCH_BONUS)),
+        default=Value(1),
+        output_field=IntegerField(),
+    ))
+    return (
+        SongSearchToken.objects
+        .filter(Q(token__in=exact_terms) | Q(token__startswith=prefix))
+        .values('song_id')
+        .annotate(score=score, **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by('-score', 'song_id')
+        .values_list('song_id', flat=True)[:limit]
+    )
+
+
+def search_song_ids(query, limit=None):
+    rows = _ranked_ids(query, limit)
+    return [] if rows is None else list(rows)
+
+
+async def asearch_song_ids(query, limit=None):
+    # Bản async cho app/async_views.py
+    rows = _ranked_ids(query, limit)
+    return [] if rows is None else [song_id async for song_id in rows]
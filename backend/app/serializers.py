@@ -1,41 +1,99 @@
 from rest_framework import serializers
-from .models import User, Song, Playlist, PlaylistSong, Album, Artist, Message
+from django.conf import settings
+from . import auth
+from .models import User, Song, Playlist, PlaylistSong, Album, Artist, Message, SongRendition, Conversation, ImportJob, UploadSession
 
 class UserSerializer(serializers.ModelSerializer):
+    # Client gửi mật khẩu gốc trong password_hash; chỉ lưu bản băm và không bao giờ trả ra ngoài
     class Meta:
         model = User
         fields = '__all__'
+        extra_kwargs = {'password_hash': {'write_only': True}}
+
+    def validate_password_hash(self, value):
+        return auth.hash_password(value)
 
 class SongSerializer(serializers.ModelSerializer):
     artist_name = serializers.CharField(source='artist.name', read_only=True)
     album_name = serializers.CharField(source='album.name', read_only=True, allow_null=True)
     album_img = serializers.CharField(source='album.cover_image', read_only=True, allow_null=True)
+    # Ảnh thu nhỏ của album_img theo cỡ / định dạng (app/thumbnails.py); {} khi chưa tạo xong
+    album_thumbs = serializers.JSONField(source='album.cover_thumbnails', read_only=True, allow_null=True)
+    # Các cột nặng bị bỏ khỏi danh sách phân trang nếu client không yêu cầu qua fields=
+    HEAVY_FIELDS = ('lyrics',)
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     class Meta:
         model = Song
-        fields = ['id', 'name', 'artist', 'artist_name', 'album', 'album_name', 'album_img', 'duration', 'song_url', 'status', 'premium', 'play_count', 'lyrics']
+        fields = ['id', 'name', 'artist', 'artist_name', 'album', 'album_name', 'album_img', 'album_thumbs', 'duration', 'song_url', 'status', 'premium', 'play_count', 'lyrics', 'bitrate', 'sample_rate', 'artwork']
+
+class SongRenditionSerializer(serializers.ModelSerializer):
+    # context['media_url']: hàm file_name -> URL phát (link có chữ ký, app/stream_urls.py)
+    url = serializers.SerializerMethodField()
+    playlist_url = serializers.SerializerMethodField()
+    def _media_url(self, file_name):
+        media_url = self.context.get('media_url')
+        return media_url(file_name) if media_url else f"{settings.MEDIA_URL}{file_name}"
+    def get_url(self, obj):
+        return self._media_url(obj.file_name)
+    def get_playlist_url(self, obj):
+        return self._media_url(obj.playlist) if obj.playlist else None
+    class Meta:
+        model = SongRendition
+        fields = ['bitrate', 'url', 'playlist_url', 'size', 'status']
 
 class PlaylistSongSerializer(serializers.ModelSerializer):
     song = SongSerializer(read_only=True)
     class Meta:
         model = PlaylistSong
-        fields = ['id', 'playlist', 'song']
+        fields = ['id', 'playlist', 'song', 'position']
 
 class PlaylistSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user', write_only=True)
+    # Dạng tóm tắt: không nhúng User (lộ password_hash) và danh sách bài hát;
+    # song_count / total_duration lấy từ Playlist.objects.with_summary(),
+    # cover_images truyền qua context (PlaylistSong.objects.cover_images) để không query theo từng playlist
+    user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user')
+    song_count = serializers.SerializerMethodField()
+    total_duration = serializers.SerializerMethodField()
+    cover_images = serializers.SerializerMethodField()
+    def get_song_count(self, obj):
+        return getattr(obj, 'song_count', 0)
+    def get_total_duration(self, obj):
+        return getattr(obj, 'total_duration', 0)
+    def get_cover_images(self, obj):
+        covers = self.context.get('cover_images')
+        if covers is None:
+            covers = PlaylistSong.objects.cover_images([obj.id], settings.PLAYLIST_COVER_PREVIEW)
+        return covers.get(obj.id, [])
+    class Meta:
+        model = Playlist
+        fields = ['id', 'name', 'user_id', 'created_at', 'cover_image', 'cover_thumbnails', 'description', 'status',
+                  'song_count', 'total_duration', 'cover_images']
+        read_only_fields = ['cover_thumbnails']
+
+class PlaylistDetailSerializer(PlaylistSerializer):
+    # Trang chi tiết playlist; danh sách dài nên đọc theo trang qua /api/playlist/<id>/songs/?limit=
     songs = serializers.SerializerMethodField()
     def get_songs(self, obj):
-        playlist_songs = PlaylistSong.objects.filter(playlist=obj)
+        # context['playlist_songs']: danh sách đã đọc sẵn (view async không query trong serializer)
+        playlist_songs = self.context.get('playlist_songs')
+        if playlist_songs is None:
+            playlist_songs = PlaylistSong.objects.for_listing().filter(playlist=obj).order_by('position', 'id')
         return PlaylistSongSerializer(playlist_songs, many=True).data
-    class Meta:
-        model = Playlist
-        fields = ['id', 'name', 'user', 'user_id', 'created_at', 'cover_image', 'description', 'status', 'songs']
+    class Meta(PlaylistSerializer.Meta):
+        fields = PlaylistSerializer.Meta.fields + ['songs']
 
 class AlbumsSerializer(serializers.ModelSerializer):
     artist_name = serializers.CharField(source='artist.name', read_only=True)
     class Meta:
         model = Album
         fields = '__all__'
+        read_only_fields = ['cover_thumbnails']
 
 class ArtistSerializer(serializers.ModelSerializer):
     class Meta:
@@ -45,4 +103,36 @@ class ArtistSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class ConversationSerializer(serializers.ModelSerializer):
+    # Một dòng của hộp thư; context['user_id'] là chủ hộp thư, unread từ ConversationQuerySet.inbox()
+    user = serializers.SerializerMethodField()
+    last_message = MessageSerializer(read_only=True)
+    unread = serializers.IntegerField(read_only=True)
+    def get_user(self, obj):
+        other = obj.other_user(self.context['user_id'])
+        return {'id': other.id, 'username': other.username, 'email': other.email}
+    class Meta:
+        model = Conversation
+        fields = ['id', 'user', 'last_message', 'last_message_at', 'unread']
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'manifest', 'audio_dir', 'status', 'rows_done', 'songs_created', 'artists_created',
+            'albums_created', 'error_count', 'errors', 'created_at', 'updated_at', 'finished_at',
+        ]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    # chunk_size: cỡ chunk gợi ý; client gửi chunk tiếp theo từ offset = received
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'size', 'received', 'status', 'file_name', 'chunk_size', 'created_at', 'updated_at']
+
+    def get_chunk_size(self, obj):
+        return settings.UPLOAD_CHUNK_SIZE
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyUserSignups, StatCounter
+
+# Số liệu cho trang Dashboard: bộ đếm tổng và số user mới theo ngày được cộng / trừ ngay
+# trong các view ghi (add_user, delete_user, add_song, add_artist) nên /api/stats/ chỉ đọc
+# vài dòng, không COUNT(*) hay GROUP BY trên bảng lớn. Thay đổi ngoài các view đó (trang
+# admin, SQL tay...) được sửa bằng lệnh rebuild_stats.
+
+SONGS = 'songs'
+USERS = 'users'
+ARTISTS = 'artists'
+COUNTED_MODELS = {SONGS: 'Song', USERS: 'User', ARTISTS: 'Artist'}
+
+
+def _add(model, lookup, field, delta):
+    # UPDATE ... SET x = x + delta; tạo dòng nếu chưa có rồi cộng lại (an toàn khi chạy song song)
+    if model.objects.filter(**lookup).update(**{field: F(field) + delta}):
+        return
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(**{field: F(field) + delta})
+
+
+def increment(name, delta=1):
+    _add(StatCounter, {'name': name}, 'value', delta)
+
+
+def user_created(user):
+    increment(USERS)
+    _add(DailyUserSignups, {'date': timezone.localdate(user.created_at)}, 'count', 1)
+
+
+def user_deleted(user):
+    increment(USERS, -1)
+    _add(DailyUserSignups, {'date': timezone.localdate(user.created_at)}, 'count', -1)
+
+
+def totals():
+    values = dict(StatCounter.objects.filter(name__in=list(COUNTED_MODELS)).values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in COUNTED_MODELS}
+
+
+def users_by_date(since=None):
+    rows = DailyUserSignups.objects.filter(count__gt=0).order_by('date')
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+    return [{'date': day.isoformat(), 'count': count} for day, count in rows.values_list('date', 'count')]
+
+
+def rebuild(counter_model=StatCounter, daily_model=DailyUserSignups, models=None):
+    # Đếm lại từ đầu; models cho phép migration truyền model lịch sử
+    if models is None:
+        from django.apps import apps
+        models = {name: apps.get_model('app', model) for name, model in COUNTED_MODELS.items()}
+    with transaction.atomic():
+        for name, model in models.items():
+            counter_model.objects.update_or_create(name=name, defaults={'value': model.objects.count()})
+        daily_model.objects.all().delete()
+        signups = (
+            models[USERS].objects.annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+            .values('day').annotate(total=Count('id')).order_by('day')
+        )
+        daily_model.objects.bulk_create([daily_model(date=row['day'], count=row['total']) for row in signups])
+    return {name: counter_model.objects.get(name=name).value for name in models}
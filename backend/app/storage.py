@@ -0,0 +1,183 @@
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+from django.conf import settings
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from .models import Album, Song, StoredFile
+
+# Lưu file upload theo nội dung (SHA-256): <ab>/<cd>/<sha256><đuôi file>
+# - băm trong lúc ghi từng chunk vào file tạm, xong thì os.replace() sang tên cuối (nguyên tử)
+# - hai lần upload cùng nội dung dùng chung một file, không còn trùng tên / ghi đè lẫn nhau
+# - StoredFile.ref_count đếm số bản ghi đang dùng file; file hết tham chiếu chỉ bị xóa bởi
+#   lệnh gc_storage, không xóa ngay trong request
+
+
+class ContentStore:
+    TMP_DIR = '.tmp'
+
+    def __init__(self, name, root_setting, references):
+        self.name = name
+        self.root_setting = root_setting
+        # Mọi (model, cột) lưu tên file của store này, dùng khi đếm lại tham chiếu
+        self.references = references
+
+    @property
+    def root(self):
+        return str(getattr(settings, self.root_setting))
+
+    def path(self, file_name):
+        return os.path.join(self.root, *file_name.split('/'))
+
+    def save(self, uploaded_file):
+        file_name, sha256, size = self._write(uploaded_file.chunks(), os.path.splitext(uploaded_file.name)[1])
+        StoredFile.objects.get_or_create(
+            store=self.name, name=file_name, defaults={'sha256': sha256, 'size': size, 'ref_count': 0}
+        )
+        return file_name
+
+    def copy_file(self, source_path, chunk_size=1024 * 1024):
+        # Chép một file có sẵn trên server (import hàng loạt), không chạm DB nên gọi được từ
+        # nhiều luồng; bên gọi tự ghi StoredFile bằng register()
+        with open(source_path, 'rb') as source:
+            chunks = iter(lambda: source.read(chunk_size), b'')
+            return self._write(chunks, os.path.splitext(source_path)[1])
+
+    def register(self, files):
+        # files: {tên file: (sha256, size)}; một câu INSERT cho cả lô, bỏ qua file đã có
+        StoredFile.objects.bulk_create(
+            [
+                StoredFile(store=self.name, name=file_name, sha256=sha256, size=size, ref_count=0)
+                for file_name, (sha256, size) in files.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    def acquire_many(self, counts):
+        # counts: {tên file: số bản ghi mới dùng file}; một câu UPDATE cho cả lô
+        if counts:
+            increment = Case(
+                *[When(name=file_name, then=Value(count)) for file_name, count in counts.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            StoredFile.objects.filter(store=self.name, name__in=list(counts)).update(
+                ref_count=F('ref_count') + increment
+            )
+
+    def _write(self, chunks, ext):
+        ext = ext.lower()
+        tmp_dir = os.path.join(self.root, self.TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as destination:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    destination.write(chunk)
+            sha256 = digest.hexdigest()
+            file_name = self._place(tmp_path, sha256, ext)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return file_name, sha256, size
+
+    def adopt(self, path, sha256, size, ext):
+        # Đưa một file đã ghi xong (vùng tạm của upload chia nhỏ) vào store: cùng ổ đĩa thì chỉ đổi
+        # tên, không chép lại nội dung; sha256 do bên gọi đã kiểm tra
+        os.makedirs(self.root, exist_ok=True)
+        if os.stat(path).st_dev == os.stat(self.root).st_dev:
+            file_name = self._place(path, sha256, ext.lower())
+        else:
+            # Khác ổ đĩa: chép qua file tạm của store rồi mới đổi tên để không lộ file dở dang
+            with open(path, 'rb') as source:
+                file_name, _, _ = self._write(iter(lambda: source.read(1024 * 1024), b''), ext)
+            os.remove(path)
+        StoredFile.objects.get_or_create(
+            store=self.name, name=file_name, defaults={'sha256': sha256, 'size': size, 'ref_count': 0}
+        )
+        return file_name
+
+    def _place(self, tmp_path, sha256, ext):
+        file_name = f'{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}'
+        final_path = self.path(file_name)
+        if os.path.exists(final_path):
+            # Đã có file cùng nội dung: bỏ file tạm, làm mới mtime để gc_storage không xóa
+            # file đó trước khi bản ghi mới kịp tăng ref_count
+            os.remove(tmp_path)
+            os.utime(final_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return file_name
+
+    def acquire(self, file_name):
+        if file_name:
+            StoredFile.objects.filter(store=self.name, name=file_name).update(ref_count=F('ref_count') + 1)
+
+    def release(self, file_name):
+        # File cũ đặt tên theo kiểu trước đây không có trong StoredFile nên không bị đụng tới
+        if file_name:
+            StoredFile.objects.filter(store=self.name, name=file_name, ref_count__gt=0).update(
+                ref_count=F('ref_count') - 1
+            )
+
+    def recount(self):
+        counts = Counter()
+        for model, field in self.references:
+            counts.update(dict(
+                model.objects.exclude(**{f'{field}__isnull': True})
+                .values_list(field).annotate(total=Count('id')).order_by()
+            ))
+        fixed = 0
+        for stored in StoredFile.objects.filter(store=self.name):
+            total = counts.get(stored.name, 0)
+            if stored.ref_count != total:
+                StoredFile.objects.filter(pk=stored.pk).update(ref_count=total)
+                fixed += 1
+        return fixed
+
+    def collect_garbage(self, grace_seconds=None, dry_run=False):
+        # Xóa file không còn tham chiếu, file lạ trong thư mục shard và file tạm bị bỏ dở
+        grace_seconds = settings.STORAGE_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = time.time() - grace_seconds
+        removed = []
+        for stored in StoredFile.objects.filter(store=self.name, ref_count__lte=0):
+            path = self.path(stored.name)
+            if os.path.exists(path) and os.path.getmtime(path) > cutoff:
+                continue
+            removed.append(stored.name)
+            if not dry_run:
+                if os.path.exists(path):
+                    os.remove(path)
+                stored.delete()
+
+        known = set(StoredFile.objects.filter(store=self.name).values_list('name', flat=True))
+        for directory, _, files in os.walk(self.root):
+            relative_dir = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            parts = relative_dir.split('/')
+            is_tmp = relative_dir == self.TMP_DIR
+            is_shard = len(parts) == 2 and all(len(part) == 2 for part in parts)
+            if not (is_tmp or is_shard):
+                continue
+            for file_name in files:
+                name = f'{relative_dir}/{file_name}'
+                path = os.path.join(directory, file_name)
+                if name in known or os.path.getmtime(path) > cutoff:
+                    continue
+                removed.append(name)
+                if not dry_run:
+                    os.remove(path)
+        return removed
+
+
+audio_store = ContentStore('audio', 'MEDIA_ROOT', [(Song, 'song_url')])
+# Ảnh bìa album và ảnh nhúng trong file audio (app/audiometa.py) dùng chung store
+album_cover_store = ContentStore('album_covers', 'ALBUM_COVER_ROOT', [(Album, 'cover_image'), (Song, 'artwork')])
+
+STORES = {store.name: store for store in (audio_store, album_cover_store)}
@@ -0,0 +1,137 @@
+import base64
+import functools
+import hashlib
+import hmac
+import time
+from django.conf import settings
+from . import auth
+
+# Link phát có chữ ký: API bài hát trả stream_url dạng /audio/_signed/<token>/<file>, token gồm
+# "<song id>.<tier>.<hết hạn>.<HMAC>" (tier 1: bài Premium, chỉ cấp cho tài khoản Premium).
+# View phát file kiểm tra bằng một phép HMAC-SHA256, không query bài hát / user ở mỗi request,
+# kể cả từng request Range khi tua. Token nằm trong đường dẫn (không phải query string) để các
+# segment HLS mà index.m3u8 trỏ tới bằng đường dẫn tương đối vẫn mang theo token; link tới
+# một .m3u8 ký cho cả thư mục của nó.
+# Hết hạn làm tròn lên theo AUDIO_STREAM_URL_ROUND nên trong khoảng đó link không đổi, trình duyệt /
+# CDN vẫn cache được file. Cấp quyền xong thì link dùng được tới khi hết hạn (mất Premium giữa chừng
+# chỉ có hiệu lực với link cấp sau). Đổi SECRET_KEY làm mọi link cũ mất hiệu lực.
+# AUDIO_SIGNED_URLS_REQUIRED (mặc định True): chỉ link có chữ ký được phát, /audio/<file> trả 403;
+# False cho client cũ còn ghép /audio/<song_url> (khi đó bài Premium không được bảo vệ).
+
+SIGNED_PREFIX = '_signed'
+KEY_SALT = 'app.stream_urls'
+
+
+class StreamUrlError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=4)
+def _key(secret):
+    # Khóa riêng cho link phát, suy ra một lần từ SECRET_KEY
+    return hashlib.sha256(f'{KEY_SALT}:{secret}'.encode()).digest()
+
+
+def _signature(song_id, tier, expires, scope):
+    message = f'{song_id}.{tier}.{expires}.{scope}'.encode()
+    digest = hmac.new(_key(settings.SECRET_KEY), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b'=').decode()
+
+
+def _scope(file_name):
+    # Playlist HLS: ký cho cả thư mục để dùng được cho các segment cùng thư mục
+    if file_name.endswith('.m3u8') and '/' in file_name:
+        return file_name.rsplit('/', 1)[0] + '/'
+    return file_name
+
+
+def _expiry(now=None):
+    now = time.time() if now is None else now
+    step = max(settings.AUDIO_STREAM_URL_ROUND, 1)
+    return int(-(-(now + settings.AUDIO_STREAM_URL_TTL) // step) * step)
+
+
+def sign(file_name, song_id, tier, now=None):
+    expires = _expiry(now)
+    token = f'{song_id}.{tier}.{expires}.{_signature(song_id, tier, expires, _scope(file_name))}'
+    return f'{settings.MEDIA_URL}{SIGNED_PREFIX}/{token}/{file_name}'
+
+
+def url_for(file_name, song_id, premium, caller_premium):
+    # URL phát file_name của bài song_id cho người gọi; None khi bài Premium mà người gọi không phải Premium
+    tier = 1 if premium else 0
+    if tier and not caller_premium:
+        return None
+    if not settings.AUDIO_SIGNED_URLS:
+        return f'{settings.MEDIA_URL}{file_name}'
+    return sign(file_name, song_id, tier)
+
+
+def verify(token, file_name, now=None):
+    # Trả về (song id, tier) hoặc ném StreamUrlError
+    parts = token.split('.')
+    if len(parts) != 4:
+        raise StreamUrlError('Link phát không hợp lệ')
+    song_id, tier, expires, signature = parts
+    scopes = [file_name]
+    if '/' in file_name:
+        scopes.append(file_name.rsplit('/', 1)[0] + '/')
+    if not any(hmac.compare_digest(_signature(song_id, tier, expires, scope), signature) for scope in scopes):
+        raise StreamUrlError('Link phát không hợp lệ')
+    if int(expires) < (time.time() if now is None else now):
+        raise StreamUrlError('Link phát đã hết hạn')
+    return int(song_id), int(tier)
+
+
+def attach(data, caller_premium):
+    # Thêm stream_url vào mọi bài hát đã serialize (SongSerializer) trong data: danh sách, trang
+    # kết quả, bài trong playlist... Bài thiếu song_url / premium (lọc bằng fields=) thì bỏ qua
+    if isinstance(data, list):
+        for item in data:
+            attach(item, caller_premium)
+    elif isinstance(data, dict):
+        if 'song_url' in data and 'premium' in data and 'id' in data:
+            data['stream_url'] = url_for(data['song_url'], data['id'], data['premium'], caller_premium) if data['song_url'] else None
+            return
+        for value in data.values():
+            if isinstance(value, (list, dict)):
+                attach(value, caller_premium)
+
+
+def _caller_premium(user):
+    return bool(user is not None and user.isPremium)
+
+
+def _etag_suffix(caller_premium):
+    # Link trong response đổi theo gói người gọi và mốc hết hạn: cả hai vào ETag của cache catalog
+    # để client không nhận 304 rồi giữ link cũ / link của gói khác
+    tier = 1 if caller_premium else 0
+    return f'-{tier}.{_expiry()}' if settings.AUDIO_SIGNED_URLS else f'-{tier}'
+
+
+def with_stream_urls(view):
+    # Đặt ngay dưới @api_view, trên @cached_response: dữ liệu trong cache catalog dùng chung cho mọi
+    # người, link theo gói của người gọi được thêm sau khi lấy ra
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        caller_premium = _caller_premium(auth.current_user(request))
+        request.catalog_etag_suffix = _etag_suffix(caller_premium)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and response.data is not None:
+            attach(response.data, caller_premium)
+        return response
+    return wrapper
+
+
+def async_with_stream_urls(view):
+    # Như with_stream_urls cho view async (app/async_views.py), tự xác thực token vì các view này
+    # không qua DRF
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        caller_premium = _caller_premium(await auth.aauthenticate(request))
+        request.catalog_etag_suffix = _etag_suffix(caller_premium)
+        response = await view(request, *args, **kwargs)
+        if response.status_code == 200 and response.data is not None:
+            attach(response.data, caller_premium)
+        return response
+    return wrapper
@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+# Phát file âm thanh trong MEDIA_ROOT với hỗ trợ Range (206), ETag / Last-Modified (304)
+# và tùy chọn giao cho web server gửi file (X-Accel-Redirect của nginx, X-Sendfile của Apache).
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def resolve_media_path(file_name):
+    # Chặn ../ thoát ra ngoài MEDIA_ROOT
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, file_name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise Http404('Không tìm thấy file âm thanh')
+    return path
+
+
+def make_etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    # Trả về (start, end) bao gồm cả end, None nếu không có / không dùng được header,
+    # hoặc ValueError nếu khoảng nằm ngoài file (416). Chỉ hỗ trợ một khoảng.
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: 500 byte cuối
+        length = int(last)
+        if length == 0:
+            raise ValueError('Range rỗng')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range ngoài kích thước file')
+    return start, min(end, size - 1)
+
+
+def is_not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def range_is_current(request, etag, mtime):
+    # If-Range: chỉ trả một phần nếu file chưa đổi kể từ lần client tải trước
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def iter_file_range(path, start, length, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as audio_file:
+        audio_file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = audio_file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload_response(file_name, path, content_type):
+    backend = settings.AUDIO_SENDFILE_BACKEND
+    response = HttpResponse(content_type=content_type)
+    if backend == 'x-accel-redirect':
+        # nginx tự xử lý Range / sendfile() từ location internal
+        response['X-Accel-Redirect'] = settings.AUDIO_ACCEL_REDIRECT_PREFIX + file_name.replace(os.sep, '/')
+    elif backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        return None
+    return response
+
+
+def serve_audio(request, file_name):
+    path = resolve_media_path(file_name)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    offloaded = _offload_response(file_name, path, content_type)
+    if offloaded is not None:
+        return offloaded
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = make_etag(stat)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': settings.AUDIO_CACHE_CONTROL,
+    }
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        response = HttpResponse(status=304)
+    else:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None and range_is_current(request, etag, stat.st_mtime):
+            start, end = byte_range
+            length = end - start + 1
+            body = [] if request.method == 'HEAD' else iter_file_range(path, start, length)
+            response = StreamingHttpResponse(body, status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            # Cả file: FileResponse dùng wsgi.file_wrapper (sendfile() nếu server hỗ trợ)
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -1,3 +1,1646 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from importlib.util import find_spec
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connections, transaction
+from django.db.utils import load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.utils import timezone
+from . import async_views, audiometa, auth, catalog_cache, catalog_import, charts, playcounts, playlists, radio, ratelimit, recommendations, search, stats, stream_urls, thumbnails, uploads, views
+from .models import User, Song, Playlist, PlaylistSong, Album, Artist, SongRendition, StoredFile, Conversation, ChartEntry, ChartLock, ImportJob, UploadSession
+from .storage import album_cover_store, audio_store
+from .db import pool as db_pool, router as db_router
+
+
+class CatalogFixtureMixin:
+    # Tạo dữ liệu mẫu: mỗi bài hát có artist và album riêng để lộ N+1 nếu có
+    def make_songs(self, count, playlist=None):
+        songs = []
+        for i in range(count):
+            artist = Artist.objects.create(name=f'Artist {i}')
+            album = Album.objects.create(
+                name=f'Album {i}', created_at=date(2025, 1, 1), artist=artist, cover_image=f'cover{i}.jpg'
+            )
+            song = Song.objects.create(
+                name=f'Song {i}', artist=artist, album=album, duration=180, song_url=f'song{i}.mp3'
+            )
+            if playlist is not None:
+                PlaylistSong.objects.create(playlist=playlist, song=song)
+            songs.append(song)
+        return songs
+
+
+def bearer(user):
+    # Header xác thực cho request trong test: mặc định không nhận user_id do client tự gửi
+    return {'HTTP_AUTHORIZATION': f'Bearer {auth.issue_token(user)}'}
+
+
+class SongListingQueryCountTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='listener', email='listener@example.com', password_hash='secret')
+        self.playlist = Playlist.objects.create(name='Mix', user=self.user)
+
+    def assertConstantQueries(self, url, num):
+        # Số query phải giữ nguyên dù số bài hát tăng
+        for batch in (1, 10):
+            self.make_songs(batch, playlist=self.playlist)
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_get_songs(self):
+        self.assertConstantQueries('/api/songs/', 1)
+
+    def test_get_songs_search(self):
+        self.assertConstantQueries('/api/songs/?search=Song', 1)
+
+    def test_get_songs_by_album(self):
+        song = self.make_songs(1)[0]
+        for _ in range(5):
+            Song.objects.create(name='Extra', artist=song.artist, album=song.album, duration=1, song_url='x.mp3')
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/songs/album/{song.album_id}/')
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]['album_img'], song.album.cover_image)
+
+    def test_get_playlist_songs(self):
+        self.assertConstantQueries(f'/api/playlist/{self.playlist.id}/songs/', 1)
+
+    def test_listing_payload(self):
+        song = self.make_songs(1)[0]
+        response = self.client.get(f'/api/songs/{song.id}/')
+        self.assertEqual(response.data['artist_name'], song.artist.name)
+        self.assertEqual(response.data['album_name'], song.album.name)
+
+
+class PlaylistSummaryTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='owner', email='owner@example.com', password_hash='secret')
+        auth.get_token_cache().clear()
+
+    def test_playlist_list_queries_are_constant(self):
+        headers = bearer(self.user)
+        # Token đã kiểm tra một lần thì các request sau không query user
+        auth.authenticate_token(headers['HTTP_AUTHORIZATION'].split()[1])
+        for batch in (1, 5):
+            for _ in range(batch):
+                self.make_songs(3, playlist=Playlist.objects.create(name='Mix', user=self.user))
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/playlists/', **headers)
+            self.assertEqual(response.status_code, 200)
+        playlist = response.data[0]
+        self.assertEqual(playlist['song_count'], 3)
+        self.assertEqual(playlist['total_duration'], 540)
+        self.assertEqual(len(playlist['cover_images']), 3)
+        self.assertEqual(playlist['user_id'], self.user.id)
+        self.assertNotIn('user', playlist)
+        self.assertNotIn('songs', playlist)
+
+    def test_cover_preview_is_limited(self):
+        playlist = Playlist.objects.create(name='Long', user=self.user)
+        self.make_songs(settings.PLAYLIST_COVER_PREVIEW + 2, playlist=playlist)
+        response = self.client.get(f'/api/playlists/{playlist.id}/', {'summary': 1})
+        self.assertEqual(response.data['cover_images'], [f'cover{i}.jpg' for i in range(settings.PLAYLIST_COVER_PREVIEW)])
+        self.assertEqual(response.data['song_count'], settings.PLAYLIST_COVER_PREVIEW + 2)
+
+    def test_playlist_songs_are_paginated(self):
+        playlist = Playlist.objects.create(name='Paged', user=self.user)
+        songs = self.make_songs(5, playlist=playlist)
+        first = self.client.get(f'/api/playlist/{playlist.id}/songs/', {'limit': 3}).data
+        second = self.client.get(f'/api/playlist/{playlist.id}/songs/', {'limit': 3, 'cursor': first['next_cursor']}).data
+        ids = [item['song']['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, [song.id for song in songs])
+        self.assertIsNone(second['next_cursor'])
+
+
+class SongPaginationTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.songs = self.make_songs(5)
+        for plays, song in zip([3, 7, 7, 0, 1], self.songs):
+            Song.objects.filter(pk=song.pk).update(play_count=plays, lyrics='la la la')
+
+    def collect(self, url):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(url + (f'&cursor={cursor}' if cursor else ''))
+            self.assertEqual(response.status_code, 200)
+            ids.extend(song['id'] for song in response.data['results'])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return ids, response
+
+    def test_unpaginated_response_is_unchanged(self):
+        response = self.client.get('/api/songs/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(response.data[0]['lyrics'], 'la la la')
+
+    def test_id_cursor_walks_every_song_once(self):
+        ids, response = self.collect('/api/songs/?limit=2')
+        self.assertEqual(ids, [song.id for song in self.songs])
+        self.assertNotIn('lyrics', response.data['results'][0])
+
+    def test_play_count_cursor_breaks_ties_by_id(self):
+        ids, _ = self.collect('/api/songs/?limit=2&order=play_count')
+        s = self.songs
+        self.assertEqual(ids, [s[1].id, s[2].id, s[0].id, s[4].id, s[3].id])
+
+    def test_fields_projection(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/songs/?limit=10&fields=id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        self.assertEqual(self.client.get('/api/songs/?fields=id,secret').status_code, 400)
+
+    def test_limit_is_capped(self):
+        with self.settings(SONGS_PAGE_MAX_LIMIT=3):
+            response = self.client.get('/api/songs/?limit=1000')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(self.client.get('/api/songs/?cursor=@@').status_code, 400)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.artist = Artist.objects.create(name='Sơn Tùng M-TP')
+        self.album = Album.objects.create(name='Sky Tour', created_at=date(2025, 1, 1), artist=self.artist)
+        self.song = Song.objects.create(
+            name='Đừng Làm Trái Tim Anh Đau', artist=self.artist, album=self.album,
+            duration=300, song_url='dltta.mp3', lyrics='em oi',
+        )
+        other = Artist.objects.create(name='Anh Tú')
+        self.other = Song.objects.create(name='Trái Tim Em', artist=other, duration=200, song_url='tte.mp3')
+        search.index_songs([self.song, self.other])
+
+    def test_tokenize_strips_vietnamese_accents(self):
+        self.assertEqual(search.tokenize('Đừng Làm Trái Tim Anh Đau'), ['dung', 'lam', 'trai', 'tim', 'anh', 'dau'])
+
+    def test_accent_insensitive_and_prefix(self):
+        self.assertEqual(search.search_song_ids('dung lam'), [self.song.id])
+        self.assertEqual(search.search_song_ids('son tu'), [self.song.id])
+        self.assertEqual(search.search_song_ids('sky'), [self.song.id])
+
+    def test_name_match_outranks_artist_match(self):
+        self.assertEqual(search.search_song_ids('anh'), [self.song.id, self.other.id])
+        self.assertEqual(search.search_song_ids('trai tim em'), [self.other.id, self.song.id])
+
+    def test_rename_artist_reindexes_songs(self):
+        response = self.client.put(f'/api/artists/{self.artist.id}/', {'name': 'MTP'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.search_song_ids('son tung'), [])
+        self.assertEqual(search.search_song_ids('mtp'), [self.song.id])
+
+    def test_get_songs_uses_index(self):
+        response = self.client.get('/api/songs/', {'search': 'trai tim'})
+        self.assertEqual([song['id'] for song in response.data], [self.song.id, self.other.id])
+        response = self.client.get('/api/songs/', {'search': 'trai tim', 'limit': 1})
+        self.assertEqual([song['id'] for song in response.data['results']], [self.song.id])
+        response = self.client.get('/api/songs/', {'search': 'trai tim', 'limit': 1, 'cursor': response.data['next_cursor']})
+        self.assertEqual([song['id'] for song in response.data['results']], [self.other.id])
+
+    def test_rebuild_keeps_index_searchable_until_replaced(self):
+        index_songs = search.index_songs
+        seen = []
+
+        def failing(songs):
+            # Giữa hai lô, bài của lô sau vẫn tìm được bằng chỉ mục cũ
+            seen.append(search.search_song_ids('trai tim em'))
+            if len(seen) > 1:
+                raise RuntimeError('boom')
+            index_songs(songs)
+
+        search.index_songs = failing
+        try:
+            with self.assertRaises(RuntimeError):
+                search.rebuild(batch_size=1)
+        finally:
+            search.index_songs = index_songs
+        self.assertEqual(seen, [[self.other.id, self.song.id]] * 2)
+        self.assertEqual(search.search_song_ids('trai tim'), [self.song.id, self.other.id])
+        self.assertEqual(search.rebuild(batch_size=1), 2)
+        self.assertEqual(search.search_song_ids('sky'), [self.song.id])
+
+    def test_get_playlists_accent_insensitive(self):
+        user = User.objects.create(username='u', email='u@example.com', password_hash='x')
+        Playlist.objects.create(name='Nhạc Buồn', user=user)
+        Playlist.objects.create(name='Chill', user=user)
+        auth.get_token_cache().clear()
+        response = self.client.get('/api/playlists/', {'search': 'nhac bu'}, **bearer(user))
+        self.assertEqual([playlist['name'] for playlist in response.data], ['Nhạc Buồn'])
+
+
+class CatalogCacheTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        catalog_cache.get_cache().clear()
+        self.song = self.make_songs(1)[0]
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get('/api/songs/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/songs/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/albums/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/albums/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_invalidates_dependent_endpoints(self):
+        songs_etag = self.client.get('/api/songs/')['ETag']
+        self.client.get('/api/artists/')
+        response = self.client.put(f'/api/artists/{self.song.artist_id}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        artists = self.client.get('/api/artists/')
+        self.assertEqual(artists['X-Cache'], 'MISS')
+        self.assertEqual(artists.data[0]['name'], 'Renamed')
+        songs = self.client.get('/api/songs/', HTTP_IF_NONE_MATCH=songs_etag)
+        self.assertEqual(songs.status_code, 200)
+        self.assertEqual(songs.data[0]['artist_name'], 'Renamed')
+        self.assertEqual(self.client.get('/api/songs/', {'search': 'renamed'}).data[0]['id'], self.song.id)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/albums/999999/').status_code, 404)
+        album = self.song.album
+        self.assertEqual(self.client.get(f'/api/albums/{album.id}/').status_code, 200)
+        self.assertNotIn('ETag', self.client.get('/api/albums/999999/'))
+
+    def test_stats(self):
+        before = catalog_cache.stats()
+        self.client.get('/api/artists/')
+        self.client.get('/api/artists/')
+        after = self.client.get('/api/catalog-cache/stats/').data
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+
+class PlayCountAggregatorTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.song, self.other = self.make_songs(2)
+
+    def tearDown(self):
+        playcounts._aggregator = None
+
+    def test_concurrent_records_coalesce_into_one_update(self):
+        aggregator = playcounts.PlayCountAggregator(flush_interval=3600, flush_threshold=10 ** 6, log_path='')
+
+        def play():
+            for _ in range(500):
+                aggregator.record(self.song.id)
+                aggregator.record(self.other.id)
+
+        workers = [threading.Thread(target=play) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        with self.assertNumQueries(1):
+            self.assertEqual(aggregator.flush(), 4000)
+        self.assertEqual(Song.objects.get(id=self.song.id).play_count, 2000)
+        self.assertEqual(Song.objects.get(id=self.other.id).play_count, 2000)
+        self.assertEqual(aggregator.db_writes, 1)
+
+    def test_play_log_is_append_only(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, 'plays.jsonl')
+            aggregator = playcounts.PlayCountAggregator(flush_interval=3600, flush_threshold=2, log_path=log_path)
+            for _ in range(3):
+                aggregator.record(self.song.id, user_id=7)
+            aggregator.flush()
+            with open(log_path, encoding='utf-8') as log_file:
+                events = [json.loads(line) for line in log_file]
+        self.assertEqual([event['song_id'] for event in events], [self.song.id] * 3)
+        self.assertEqual(events[0]['user_id'], 7)
+
+    def test_increment_endpoint_defers_write(self):
+        playcounts._aggregator = playcounts.PlayCountAggregator(flush_interval=3600, flush_threshold=10 ** 6, log_path='')
+        for expected in (1, 2):
+            with self.assertNumQueries(1):
+                response = self.client.post(f'/api/songs/{self.song.id}/increment_play_count/')
+            self.assertEqual(response.data['play_count'], expected)
+        self.assertEqual(Song.objects.get(id=self.song.id).play_count, 0)
+        playcounts._aggregator.flush()
+        self.assertEqual(Song.objects.get(id=self.song.id).play_count, 2)
+        self.assertEqual(self.client.post('/api/songs/999999/increment_play_count/').status_code, 404)
+
+
+class ChartsTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.songs = self.make_songs(3)
+        # Bài thứ tư cùng nghệ sĩ với bài đầu
+        self.songs.append(Song.objects.create(
+            name='Extra', artist=self.songs[0].artist, album=self.songs[0].album, duration=1, song_url='x.mp3'
+        ))
+        self.aggregator = playcounts.PlayCountAggregator(
+            flush_interval=3600, flush_threshold=10 ** 6, log_path='', on_flush=[charts.record_plays]
+        )
+
+    def play(self, plays):
+        for index, count in plays.items():
+            for _ in range(count):
+                self.aggregator.record(self.songs[index].id)
+        self.aggregator.flush()
+
+    def chart(self, period, **params):
+        response = self.client.get(f'/api/charts/{period}/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['song']['id'], row['plays']) for row in response.data['results']]
+
+    def test_charts_are_maintained_incrementally(self):
+        self.play({0: 3, 1: 5})
+        self.play({2: 4, 0: 3})
+        expected = [(self.songs[0].id, 6), (self.songs[1].id, 5), (self.songs[2].id, 4)]
+        for period in charts.PERIODS:
+            self.assertEqual(self.chart(period), expected)
+        self.play({3: 2})
+        self.assertEqual(
+            self.chart('week', artist=self.songs[0].artist_id), [(self.songs[0].id, 6), (self.songs[3].id, 2)]
+        )
+        self.assertEqual(self.chart('day', album=self.songs[1].album_id), [(self.songs[1].id, 5)])
+
+        # Tính lại từ đầu phải ra đúng các dòng đã cập nhật tăng dần
+        incremental = set(ChartEntry.objects.values_list('chart', 'rank', 'song_id', 'plays'))
+        charts.rebuild()
+        self.assertEqual(set(ChartEntry.objects.values_list('chart', 'rank', 'song_id', 'plays')), incremental)
+
+    def test_chart_rows_are_locked_and_unique_per_rank(self):
+        self.play({0: 2, 1: 1})
+        key = charts.chart_key(charts.ALL)
+        self.assertTrue(ChartLock.objects.filter(chart=key).exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ChartEntry.objects.create(chart=key, rank=1, song=self.songs[2], plays=9)
+
+    def test_chart_endpoint_reads_materialized_rows(self):
+        self.play({i: i + 1 for i in range(4)})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/charts/all/', {'limit': 2})
+        self.assertEqual([row['rank'] for row in response.data['results']], [1, 2])
+        self.assertEqual(response.data['results'][0]['song']['artist_name'], self.songs[3].artist.name)
+        self.assertEqual(self.client.get('/api/charts/month/').status_code, 404)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        stats.rebuild()
+
+    def test_write_paths_keep_counters_current(self):
+        for i in range(3):
+            response = self.client.post(
+                '/api/user/add/', {'username': f'u{i}', 'email': f'u{i}@example.com', 'password_hash': 'x'}, format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.client.delete(f'/api/delete-user/{response.data["id"]}/')
+        artist = self.client.post('/api/add-artist/', {'name': 'Singer'}, format='json').data
+        self.assertEqual(artist['name'], 'Singer')
+
+        with self.assertNumQueries(1):
+            totals = self.client.get('/api/stats/').data
+        self.assertEqual(totals, {'total_songs': 0, 'total_users': 2, 'total_artists': 1})
+        with self.assertNumQueries(1):
+            by_date = self.client.get('/api/stats/users-by-date/').data
+        self.assertEqual(by_date, [{'date': timezone.localdate().isoformat(), 'count': 2}])
+
+        # Đếm lại từ đầu phải khớp với bộ đếm cộng dồn
+        stats.rebuild()
+        self.assertEqual(self.client.get('/api/stats/').data, totals)
+        self.assertEqual(self.client.get('/api/stats/users-by-date/').data, by_date)
+
+
+class AudioStreamingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.payload = bytes(range(256)) * 1024
+        with open(os.path.join(self.media.name, 'track.mp3'), 'wb') as audio_file:
+            audio_file.write(self.payload)
+        # Kiểm tra phần gửi file qua /audio/<file>; chữ ký có SignedStreamUrlTests riêng
+        override = self.settings(MEDIA_ROOT=self.media.name, AUDIO_SENDFILE_BACKEND=None, AUDIO_SIGNED_URLS_REQUIRED=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_full_download(self):
+        response = self.client.get('/audio/track.mp3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get('/audio/track.mp3', HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[1000:2000])
+        response = self.client.get('/audio/track.mp3', HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-10:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get('/audio/track.mp3', HTTP_RANGE=f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.payload)}')
+
+    def test_conditional_requests(self):
+        etag = self.client.get('/audio/track.mp3')['ETag']
+        self.assertEqual(self.client.get('/audio/track.mp3', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get('/audio/track.mp3', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_path_traversal_and_offload(self):
+        self.assertEqual(self.client.get('/audio/..%2Fmanage.py').status_code, 404)
+        with self.settings(AUDIO_SENDFILE_BACKEND='x-accel-redirect'):
+            response = self.client.get('/audio/track.mp3')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-audio/track.mp3')
+
+
+class TranscodingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = self.settings(
+            MEDIA_ROOT=self.media.name, TRANSCODE_ENCODER='app.transcoding.StubEncoder',
+            TRANSCODE_WORKERS=0, TRANSCODE_BITRATES=[64, 128, 320], TRANSCODE_HLS_SEGMENT_SECONDS=10,
+            AUDIO_METADATA_ENABLED=False, AUDIO_SIGNED_URLS=False,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.artist = Artist.objects.create(name='Artist')
+        self.client = APIClient()
+
+    def upload(self):
+        audio = SimpleUploadedFile('track.mp3', b'\xff\xfb' * 200000, content_type='audio/mpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/songs/add/', {
+                'name': 'Track', 'artist': self.artist.id, 'duration': 100, 'song': audio, 'premium': 0,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_upload_produces_renditions_and_segments(self):
+        song_id = self.upload()
+        renditions = SongRendition.objects.filter(song_id=song_id).order_by('bitrate')
+        self.assertEqual([r.bitrate for r in renditions], [64, 128, 320])
+        self.assertTrue(all(r.status == SongRendition.STATUS_READY for r in renditions))
+        self.assertTrue(os.path.isfile(os.path.join(self.media.name, renditions[0].playlist)))
+        manifest = self.client.get(f'/api/songs/{song_id}/renditions/').data
+        self.assertEqual(manifest['renditions'][0]['url'], f'/audio/renditions/{song_id}/64k.mp3')
+
+    def test_stream_picks_rendition_by_tier_and_hint(self):
+        song_id = self.upload()
+        free = User.objects.create(username='free', email='free@example.com', password_hash='x')
+        premium = User.objects.create(username='vip', email='vip@example.com', password_hash='x', isPremium=True)
+        url = f'/api/songs/{song_id}/stream/'
+        auth.get_token_cache().clear()
+        self.assertEqual(self.client.get(url, **bearer(free))['Location'], f'/audio/renditions/{song_id}/128k.mp3')
+        self.assertEqual(self.client.get(url, **bearer(premium))['Location'], f'/audio/renditions/{song_id}/320k.mp3')
+        response = self.client.get(url, HTTP_SAVE_DATA='on', **bearer(premium))
+        self.assertEqual(response['Location'], f'/audio/renditions/{song_id}/64k.mp3')
+
+    def test_stream_falls_back_to_original(self):
+        song = Song.objects.create(name='Raw', artist=self.artist, duration=1, song_url='raw.mp3')
+        self.assertEqual(self.client.get(f'/api/songs/{song.id}/stream/')['Location'], '/audio/raw.mp3')
+
+
+class ContentStoreTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = self.settings(MEDIA_ROOT=self.media.name, TRANSCODE_ENABLED=False, AUDIO_METADATA_ENABLED=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.artist = Artist.objects.create(name='Artist')
+        self.client = APIClient()
+
+    def add_song(self, content):
+        audio = SimpleUploadedFile('same-name.mp3', content, content_type='audio/mpeg')
+        response = self.client.post('/api/songs/add/', {
+            'name': 'Track', 'artist': self.artist.id, 'duration': 100, 'song': audio, 'premium': 0,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Song.objects.get(id=response.data['id'])
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.add_song(b'abc' * 1000)
+        second = self.add_song(b'abc' * 1000)
+        third = self.add_song(b'xyz' * 1000)
+        self.assertEqual(first.song_url, second.song_url)
+        self.assertNotEqual(first.song_url, third.song_url)
+        self.assertRegex(first.song_url, r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.mp3$')
+        self.assertEqual(StoredFile.objects.get(name=first.song_url).ref_count, 2)
+
+    def test_update_keeps_shared_file_until_gc(self):
+        first = self.add_song(b'abc' * 1000)
+        second = self.add_song(b'abc' * 1000)
+        shared_path = audio_store.path(first.song_url)
+        replacement = SimpleUploadedFile('new.mp3', b'new' * 1000, content_type='audio/mpeg')
+        response = self.client.put(f'/api/songs/update/{second.id}/', {
+            'name': 'Track', 'artist': self.artist.id, 'duration': 100, 'premium': 0, 'song': replacement,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StoredFile.objects.get(name=first.song_url).ref_count, 1)
+        self.assertEqual(audio_store.collect_garbage(grace_seconds=0), [])
+        self.assertTrue(os.path.exists(shared_path))
+
+        first.delete()
+        audio_store.recount()
+        self.assertEqual(audio_store.collect_garbage(grace_seconds=0), [first.song_url])
+        self.assertFalse(os.path.exists(shared_path))
+
+
+class AudioMetadataTests(TestCase):
+    SAMPLE = os.path.join(settings.BASE_DIR, 'audio', 'GioThi.mp3')
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.covers = tempfile.TemporaryDirectory()
+        self.addCleanup(self.covers.cleanup)
+        override = self.settings(
+            MEDIA_ROOT=self.media.name, ALBUM_COVER_ROOT=self.covers.name,
+            TRANSCODE_ENABLED=False, AUDIO_METADATA_WORKERS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.artist = Artist.objects.create(name='Artist')
+
+    def test_extract_metadata_from_frames_and_id3(self):
+        metadata = audiometa.extract_metadata(self.SAMPLE)
+        self.assertAlmostEqual(metadata['duration'], 234.19, places=1)
+        self.assertEqual(metadata['bitrate'], 128)
+        self.assertEqual(metadata['sample_rate'], 48000)
+        mime, image = metadata['artwork']
+        self.assertEqual(mime, 'image/jpeg')
+        self.assertTrue(image.startswith(b'\xff\xd8'))
+
+    def test_upload_overrides_client_duration(self):
+        with open(self.SAMPLE, 'rb') as sample:
+            audio = SimpleUploadedFile('GioThi.mp3', sample.read(), content_type='audio/mpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/songs/add/', {
+                'name': 'Gió Thị', 'artist': self.artist.id, 'duration': 1, 'song': audio, 'premium': 0,
+            }, format='multipart')
+        song = Song.objects.get(id=response.data['id'])
+        self.assertEqual((song.duration, song.bitrate, song.sample_rate), (235, 128, 48000))
+        self.assertTrue(os.path.isfile(os.path.join(self.covers.name, song.artwork)))
+        self.assertEqual(StoredFile.objects.get(store='album_covers', name=song.artwork).ref_count, 1)
+        # Đếm lại tham chiếu tính cả Song.artwork, gc không xóa ảnh bài hát còn dùng
+        album_cover_store.recount()
+        self.assertEqual(StoredFile.objects.get(store='album_covers', name=song.artwork).ref_count, 1)
+        self.assertEqual(album_cover_store.collect_garbage(grace_seconds=0), [])
+        self.assertTrue(os.path.isfile(os.path.join(self.covers.name, song.artwork)))
+
+    def test_duration_is_unknown_until_extracted(self):
+        with open(self.SAMPLE, 'rb') as sample:
+            audio = SimpleUploadedFile('GioThi.mp3', sample.read(), content_type='audio/mpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = APIClient().post('/api/songs/add/', {
+                'name': 'Gió Thị', 'artist': self.artist.id, 'song': audio, 'premium': 0,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Song.objects.get(id=response.data['id']).duration, 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Song.objects.get(id=response.data['id']).duration, 235)
+
+    def test_rejects_non_mpeg_data(self):
+        path = os.path.join(self.media.name, 'noise.mp3')
+        with open(path, 'wb') as noise:
+            noise.write(b'not audio' * 100)
+        with self.assertRaises(ValueError):
+            audiometa.extract_metadata(path)
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create(username='alice', email='alice@example.com', password_hash='x')
+        self.bob = User.objects.create(username='bob', email='bob@example.com', password_hash='x')
+        self.carol = User.objects.create(username='carol', email='carol@example.com', password_hash='x')
+        auth.get_token_cache().clear()
+
+    def send(self, sender, receiver, content):
+        response = self.client.post(
+            '/api/send_message/', {'receiver_id': receiver.id, 'content': content}, format='json', **bearer(sender)
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_history_pages_backwards(self):
+        ids = [self.send(*((self.alice, self.bob) if i % 2 else (self.bob, self.alice)), f'm{i}') for i in range(7)]
+        params = {'sender_id': self.alice.id, 'receiver_id': self.bob.id, 'limit': 3}
+        pages = []
+        response = self.client.get('/api/messages/', params).data
+        pages.append(response['results'])
+        while response['next_cursor']:
+            response = self.client.get('/api/messages/', {**params, 'before': response['next_cursor']}).data
+            pages.append(response['results'])
+        self.assertEqual([[message['id'] for message in page] for page in pages], [ids[4:], ids[1:4], ids[:1]])
+        # Không phân trang: cả cuộc trò chuyện theo thời gian như trước
+        full = self.client.get('/api/messages/', {'sender_id': self.bob.id, 'receiver_id': self.alice.id}).data
+        self.assertEqual([message['id'] for message in full], ids)
+
+    def test_inbox_lists_last_message_and_unread_counts(self):
+        self.send(self.bob, self.alice, 'hi')
+        self.send(self.bob, self.alice, 'are you there?')
+        self.send(self.alice, self.carol, 'hello carol')
+        last = self.send(self.carol, self.alice, 'hey')
+        headers = bearer(self.alice)
+        with self.assertNumQueries(1):
+            inbox = self.client.get('/api/messages/inbox/', **headers).data
+        self.assertEqual([row['user']['username'] for row in inbox], ['carol', 'bob'])
+        self.assertEqual(inbox[0]['last_message']['id'], last)
+        self.assertEqual([row['unread'] for row in inbox], [1, 2])
+
+        response = self.client.post('/api/messages/read/', {'other_id': self.bob.id, 'message_id': 'x'}, format='json', **headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/messages/read/', {'other_id': self.bob.id}, format='json', **headers)
+        self.assertEqual(response.status_code, 200)
+        inbox = self.client.get('/api/messages/inbox/', **headers).data
+        self.assertEqual([row['unread'] for row in inbox], [1, 0])
+        bob_inbox = self.client.get('/api/messages/inbox/', **bearer(self.bob)).data
+        self.assertEqual(bob_inbox[0]['unread'], 0)
+        self.assertEqual(Conversation.objects.count(), 2)
+
+
+@skipUnless(find_spec('channels'), 'cần cài channels (requirements.txt)')
+class ChatWebSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice', email='alice@example.com', password_hash='x')
+        self.bob = User.objects.create(username='bob', email='bob@example.com', password_hash='x')
+        auth.get_token_cache().clear()
+
+    def _communicator(self, path, subprotocols=None):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .routing import websocket_urlpatterns
+
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), path, subprotocols=subprotocols)
+
+    def test_sent_message_is_pushed_to_both_participants(self):
+        async def scenario():
+            clients = [
+                self._communicator('/ws/chat/', ['bearer', auth.issue_token(self.alice)]),
+                self._communicator(f'/ws/chat/?token={auth.issue_token(self.bob)}'),
+            ]
+            results = [await client.connect() for client in clients]
+            self.assertEqual(results, [(True, 'bearer'), (True, None)])
+            response = await sync_to_async(APIClient().post)(
+                '/api/send_message/', {'receiver_id': self.bob.id, 'content': 'hi'}, format='json', **bearer(self.alice)
+            )
+            self.assertEqual(response.status_code, 201)
+            for client in clients:
+                event = await client.receive_json_from(timeout=5)
+                self.assertEqual(event['type'], 'message')
+                self.assertEqual(event['message']['id'], response.data['id'])
+                self.assertEqual(event['message']['content'], 'hi')
+                await client.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_socket_requires_valid_token(self):
+        async def scenario():
+            # user_id tự khai không còn được tin: phải có token hợp lệ
+            for client in (
+                self._communicator(f'/ws/chat/?user_id={self.alice.id}'),
+                self._communicator('/ws/chat/?token=forged'),
+                self._communicator('/ws/chat/', ['bearer', 'forged']),
+            ):
+                connected, code = await client.connect()
+                self.assertFalse(connected)
+                self.assertEqual(code, 4401)
+
+        async_to_sync(scenario)()
+
+
+class RecommendationTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_dir.cleanup)
+        override = self.settings(RECOMMENDATIONS_DIR=self.data_dir.name, RECOMMENDATIONS_ASYNC=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create(username='rec', password_hash='x', email='rec@example.com')
+        self.songs = self.make_songs(4)
+        a, b, c, d = self.songs
+        # a và b cùng nằm trong hai playlist, a và c chỉ một
+        for members in ([a, b, c], [a, b], [c, d]):
+            playlist = Playlist.objects.create(name='p', user=self.user)
+            for song in members:
+                PlaylistSong.objects.create(playlist=playlist, song=song)
+
+    def similar(self, song, **params):
+        response = self.client.get(f'/api/songs/{song.id}/similar/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['song']['id'], row['score']) for row in response.data['results']]
+
+    def test_scores_are_cosine_of_playlist_cooccurrence(self):
+        recommendations.build()
+        a, b, c, d = self.songs
+        self.assertEqual(self.similar(a), [(b.id, 1.0), (c.id, 0.5)])
+        self.assertEqual(self.similar(d), [(c.id, round(1 / 2 ** 0.5, 4))])
+        self.assertEqual(self.similar(a, limit=1), [(b.id, 1.0)])
+        self.assertEqual(self.client.get('/api/songs/999999/similar/').data['results'], [])
+
+    def test_lookup_reads_index_without_scanning_playlists(self):
+        recommendations.build()
+        # Chỉ một query lấy thông tin các bài gợi ý
+        with self.assertNumQueries(1):
+            self.similar(self.songs[0])
+
+    def test_membership_changes_update_index_incrementally(self):
+        recommendations.build()
+        a, b, c, d = self.songs
+        playlist = Playlist.objects.create(name='new', user=self.user)
+        PlaylistSong.objects.create(playlist=playlist, song=d)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/playlist_songs/', {'playlist_id': playlist.id, 'song_id': a.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(d.id, [song_id for song_id, _ in self.similar(a)])
+        self.assertIn(a.id, [song_id for song_id, _ in self.similar(d)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/playlist_songs/{playlist.id}/{a.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn(d.id, [song_id for song_id, _ in self.similar(a)])
+        self.assertNotIn(a.id, [song_id for song_id, _ in self.similar(d)])
+
+
+class RadioTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_dir.cleanup)
+        override = self.settings(RECOMMENDATIONS_DIR=self.data_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.songs = self.make_songs(6)
+        self.songs[4].premium = 1
+        self.songs[4].save()
+        self.songs[5].status = 0
+        self.songs[5].save()
+        self.free = User.objects.create(username='free', password_hash='x', email='free@example.com')
+        self.premium = User.objects.create(username='vip', password_hash='x', email='vip@example.com', isPremium=True)
+        auth.get_token_cache().clear()
+
+    def listen(self, user=None, **params):
+        response = self.client.get('/api/radio/', params, **(bearer(user) if user else {}))
+        self.assertEqual(response.status_code, 200)
+        return response.data['session'], [song['id'] for song in response.data['results']]
+
+    def test_pages_continue_session_without_repeats(self):
+        seed = self.songs[0]
+        session, first = self.listen(self.free, seed_type='song', seed_id=seed.id, limit=2)
+        self.assertEqual(len(first), 2)
+        _, rest = self.listen(session=session, limit=10)
+        played = first + rest
+        # Không phát lại bài gốc, không lặp, bỏ bài premium với user thường và bài đã ẩn
+        self.assertEqual(sorted(played), sorted(song.id for song in self.songs[1:4]))
+        self.assertEqual(self.listen(session=session)[1], [])
+
+        _, vip = self.listen(self.premium, seed_type='song', seed_id=seed.id, limit=10)
+        self.assertIn(self.songs[4].id, vip)
+        self.assertNotIn(self.songs[5].id, vip)
+
+    def test_similar_songs_come_first(self):
+        playlist = Playlist.objects.create(name='p', user=self.free)
+        for song in (self.songs[0], self.songs[3]):
+            PlaylistSong.objects.create(playlist=playlist, song=song)
+        recommendations.build()
+        _, songs = self.listen(seed_type='playlist', seed_id=playlist.id, limit=3)
+        self.assertEqual(songs[:2], [self.songs[0].id, self.songs[3].id])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/radio/', {'seed_type': 'genre', 'seed_id': 1}).status_code, 400)
+        self.assertEqual(self.client.get('/api/radio/', {'seed_type': 'song', 'seed_id': 999999}).status_code, 404)
+        self.assertEqual(self.client.get('/api/radio/', {'session': 'expired'}).status_code, 404)
+
+    def test_diversity_spaces_out_artists(self):
+        rows = [{'id': i, 'artist_id': artist} for i, artist in enumerate([1, 1, 1, 2, 3, 2])]
+        order = [row['artist_id'] for row in radio.diversify(rows, [], spacing=1, window=4)]
+        self.assertEqual(order, [1, 2, 1, 3, 1, 2])
+
+    def test_page_stops_at_latency_budget(self):
+        ticks = iter(range(0, 10 ** 6, 10))
+        clock = lambda: next(ticks) / 1000  # mỗi lần đọc đồng hồ trôi 10ms
+        session = radio.new_session(radio.SEED_SONG, self.songs[0].id)
+        page, timed_out = radio.next_page(session, 10, False, budget_ms=25, clock=clock)
+        self.assertTrue(timed_out)
+        self.assertLess(len(page), 3)
+
+    def test_hydrate_runs_no_query_after_deadline(self):
+        ids = [song.id for song in self.songs]
+        with self.assertNumQueries(0):
+            self.assertEqual(list(radio.hydrate(iter(ids), batch_size=2, deadline=1, clock=lambda: 2)), [])
+        with self.assertNumQueries(1):
+            rows = list(radio.hydrate(iter(ids[:2]), batch_size=2, deadline=1, clock=lambda: 0))
+        self.assertEqual([row['id'] for row in rows], ids[:2])
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.media = tempfile.TemporaryDirectory()
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.addCleanup(self.root.cleanup)
+        override = self.settings(
+            MEDIA_ROOT=self.media.name, CATALOG_IMPORT_ROOT=self.root.name, CATALOG_IMPORT_WORKERS=0,
+            CATALOG_IMPORT_BATCH_SIZE=2,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.audio_dir = os.path.join(self.root.name, 'audio')
+        os.makedirs(self.audio_dir)
+        for name, content in [('a.mp3', b'aaa'), ('b.mp3', b'bbb'), ('copy.mp3', b'aaa')]:
+            with open(os.path.join(self.audio_dir, name), 'wb') as audio_file:
+                audio_file.write(content)
+        self.existing = Artist.objects.create(name='Existing')
+        self.rows = [
+            {'name': 'One', 'artist': 'Existing', 'album': 'First', 'release_date': '2024-05-01', 'file': 'a.mp3'},
+            {'name': 'Two', 'artist': 'New Artist', 'album': 'First', 'file': 'b.mp3', 'duration': '200'},
+            {'name': 'Missing', 'artist': 'New Artist', 'file': 'nope.mp3'},
+            {'name': 'Escape', 'artist': 'New Artist', 'file': '../../etc/passwd'},
+            {'name': 'Bad', 'artist': 'New Artist', 'file': 'b.mp3', 'premium': '7'},
+            {'name': 'Three', 'artist': 'Existing', 'album': 'First', 'file': 'copy.mp3', 'premium': '1'},
+        ]
+
+    def write_manifest(self, name='manifest.jsonl'):
+        path = os.path.join(self.root.name, name)
+        with open(path, 'w', encoding='utf-8') as manifest:
+            if name.endswith('.json'):
+                json.dump(self.rows, manifest)
+            else:
+                manifest.writelines(json.dumps(row) + '\n' for row in self.rows)
+        return path
+
+    def assert_imported(self, job, error_rows=(3, 4, 5)):
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual((job.rows_done, job.songs_created, job.error_count), (6, 3, len(error_rows)))
+        self.assertEqual(sorted(error['row'] for error in job.errors), list(error_rows))
+        songs = {song.name: song for song in Song.objects.select_related('artist', 'album')}
+        self.assertEqual(sorted(songs), ['One', 'Three', 'Two'])
+        self.assertEqual(songs['One'].artist_id, self.existing.id)
+        self.assertEqual(songs['One'].album_id, songs['Three'].album_id)
+        self.assertEqual(songs['One'].album.created_at, date(2024, 5, 1))
+        # Album cùng tên của nghệ sĩ khác là album khác
+        self.assertNotEqual(songs['Two'].album_id, songs['One'].album_id)
+        self.assertEqual((songs['Two'].duration, songs['Three'].premium), (200, 1))
+        # a.mp3 và copy.mp3 cùng nội dung: một file, hai tham chiếu
+        self.assertEqual(songs['One'].song_url, songs['Three'].song_url)
+        self.assertEqual(StoredFile.objects.get(name=songs['One'].song_url).ref_count, 2)
+        self.assertTrue(os.path.exists(audio_store.path(songs['Two'].song_url)))
+        self.assertEqual(stats.totals()[stats.SONGS], 3)
+        self.assertEqual(Artist.objects.filter(name='New Artist').count(), 1)
+        response = self.client.get('/api/songs/', {'search': 'three'})
+        self.assertEqual([song['id'] for song in response.data], [songs['Three'].id])
+
+    def test_command_imports_manifest_in_batches(self):
+        call_command('import_catalog', self.write_manifest(), audio_dir=self.audio_dir, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assert_imported(ImportJob.objects.get())
+
+    def test_json_array_manifest_is_streamed(self):
+        path = self.write_manifest('manifest.json')
+        # Bộ đệm nhỏ để object nằm vắt qua nhiều lần đọc
+        self.assertEqual(list(catalog_import._read_json_array(path, chunk_size=7)), self.rows)
+
+    def test_resume_continues_after_last_committed_batch(self):
+        job = ImportJob.objects.create(manifest=self.write_manifest(), audio_dir=self.audio_dir)
+
+        def crash(job):
+            raise RuntimeError('mất kết nối')
+
+        with self.assertRaises(RuntimeError):
+            catalog_import.CatalogImporter(job, progress=crash).run()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done, job.songs_created), (ImportJob.STATUS_FAILED, 2, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/catalog/imports/{job.id}/resume/')
+        self.assertEqual(response.status_code, 202)
+        job.refresh_from_db()
+        # Lần dừng giữa chừng được ghi như một lỗi ở dòng đầu tiên chưa import
+        self.assert_imported(job, error_rows=(3, 3, 4, 5))
+
+    def test_api_starts_job_inside_import_root(self):
+        self.write_manifest()
+        response = self.client.post('/api/catalog/imports/', {'manifest': '../x.jsonl', 'audio_dir': 'audio'})
+        self.assertEqual(response.status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/catalog/imports/', {'manifest': 'manifest.jsonl', 'audio_dir': 'audio'})
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(f'/api/catalog/imports/{response.data["id"]}/')
+        self.assertEqual((response.data['status'], response.data['songs_created']), (ImportJob.STATUS_DONE, 3))
+
+
+class PlaylistOrderTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='order', password_hash='x', email='order@example.com')
+        self.playlist = Playlist.objects.create(name='p', user=self.user)
+        self.songs = [song.id for song in self.make_songs(5)]
+
+    def order(self):
+        return [row['song']['id'] for row in self.client.get(f'/api/playlist/{self.playlist.id}/songs/').data]
+
+    def positions(self):
+        return dict(PlaylistSong.objects.filter(playlist=self.playlist).values_list('song_id', 'position'))
+
+    def test_bulk_add_appends_in_order_and_reports_skipped(self):
+        a, b, c, d, e = self.songs
+        response = self.client.post(
+            f'/api/playlists/{self.playlist.id}/songs/add/', {'song_ids': [c, a, b]}, format='json'
+        )
+        self.assertEqual(response.data, {'added': [c, a, b], 'existing': [], 'missing': []})
+        response = self.client.post(
+            f'/api/playlists/{self.playlist.id}/songs/add/', {'song_ids': [a, e, 999999]}, format='json'
+        )
+        self.assertEqual(response.data, {'added': [e], 'existing': [a], 'missing': [999999]})
+        self.assertEqual(self.order(), [c, a, b, e])
+
+        response = self.client.post('/api/playlist_songs/', {'playlist_id': self.playlist.id, 'song_id': a})
+        self.assertEqual(response.status_code, 400)
+        # Ràng buộc unique của DB chặn cả khi chèn thẳng
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PlaylistSong.objects.create(playlist=self.playlist, song_id=a, position=0)
+
+        response = self.client.post(
+            f'/api/playlists/{self.playlist.id}/songs/remove/', {'song_ids': [c, d]}, format='json'
+        )
+        self.assertEqual(response.data, {'removed': [c]})
+        self.assertEqual(self.order(), [a, b, e])
+
+    def test_move_writes_only_the_moved_row(self):
+        playlists.add_songs(self.playlist.id, self.songs)
+        a, b, c, d, e = self.songs
+        before = self.positions()
+        response = self.client.post(
+            f'/api/playlists/{self.playlist.id}/songs/reorder/',
+            {'moves': [{'song_id': e, 'after': None}, {'song_id': a, 'after': c}]}, format='json',
+        )
+        self.assertEqual(response.data['song_ids'], [e, b, c, a, d])
+        self.assertEqual(self.order(), [e, b, c, a, d])
+        after = self.positions()
+        self.assertEqual({song_id for song_id in self.songs if after[song_id] != before[song_id]}, {a, e})
+
+        response = self.client.post(
+            f'/api/playlists/{self.playlist.id}/songs/reorder/', {'moves': [{'song_id': a, 'after': 999999}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_renumbers_when_gap_is_exhausted(self):
+        playlists.add_songs(self.playlist.id, self.songs[:3])
+        a, b, c = self.songs[:3]
+        PlaylistSong.objects.filter(song_id=a).update(position=10)
+        PlaylistSong.objects.filter(song_id=b).update(position=11)
+        self.assertEqual(playlists.move_songs(self.playlist.id, [(c, a)]), [a, c, b])
+        self.assertEqual(self.order(), [a, c, b])
+        positions = self.positions()
+        self.assertLess(positions[a] + 1, positions[c])
+
+    def test_pages_follow_playlist_order(self):
+        playlists.add_songs(self.playlist.id, list(reversed(self.songs)))
+        playlists.move_songs(self.playlist.id, [(self.songs[0], None)])
+        expected = [self.songs[0]] + list(reversed(self.songs[1:]))
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(f'/api/playlist/{self.playlist.id}/songs/', params).data
+            seen += [row['song']['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+
+class AuthTests(TestCase):
+    def setUp(self):
+        auth.get_token_cache().clear()
+        ratelimit.reset()
+        self.client = APIClient()
+        self.user = User.objects.create(username='auth', email='auth@example.com', password_hash='legacy-secret')
+
+    def login(self, password):
+        return self.client.post('/api/users/login/', {'email': 'auth@example.com', 'password': password}, format='json')
+
+    def bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_plaintext_password_is_rehashed_on_login(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        response = self.login('legacy-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['token'])
+        self.user.refresh_from_db()
+        self.assertTrue(auth.is_hashed(self.user.password_hash))
+        self.assertNotIn('legacy-secret', self.user.password_hash)
+        self.assertEqual(self.login('legacy-secret').status_code, 200)
+
+    def test_cached_token_resolves_user_without_queries(self):
+        self.bearer(self.login('legacy-secret').data['token'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/users/me/').data['id'], self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/me/').data['email'], 'auth@example.com')
+        self.bearer('not-a-token')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_password_change_revokes_old_tokens(self):
+        token = self.login('legacy-secret').data['token']
+        self.bearer(token)
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/change-password/{self.user.id}/', {'current_password': 'legacy-secret', 'new_password': 'new-secret'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+        self.bearer(response.data['token'])
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.client.credentials()
+        self.assertEqual(self.login('new-secret').status_code, 200)
+
+    def test_blocking_user_evicts_cached_token(self):
+        self.bearer(self.login('legacy-secret').data['token'])
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/users/{self.user.id}/toggle-status/')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_token_overrides_claimed_user_id(self):
+        other = User.objects.create(username='other', email='other@example.com', password_hash='x')
+        Playlist.objects.create(name='Mine', user=self.user)
+        self.bearer(self.login('legacy-secret').data['token'])
+        self.assertEqual(len(self.client.get('/api/playlists/').data), 1)
+        self.assertEqual(self.client.get('/api/playlists/', {'user_id': other.id}).status_code, 403)
+
+    def test_payment_is_created_for_token_user_only(self):
+        other = User.objects.create(username='other', email='other@example.com', password_hash='x')
+        url = '/api/vnpay/create/'
+        self.assertEqual(self.client.post(url, {'user_id': self.user.id}, format='json').status_code, 401)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 401)
+        self.bearer(self.login('legacy-secret').data['token'])
+        self.assertEqual(self.client.post(url, {'user_id': other.id}, format='json').status_code, 403)
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'vnp_TxnRef={self.user.id}_', response.data['payment_url'])
+
+    def test_created_user_password_is_hashed_and_hidden(self):
+        response = self.client.post(
+            '/api/user/add/', {'username': 'new', 'email': 'new@example.com', 'password_hash': 'pw123456'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('password_hash', response.data)
+        self.assertTrue(auth.is_hashed(User.objects.get(email='new@example.com').password_hash))
+
+    def test_hash_passwords_command(self):
+        call_command('hash_passwords', stdout=io.StringIO())
+        self.user.refresh_from_db()
+        self.assertTrue(auth.is_hashed(self.user.password_hash))
+        self.assertEqual(self.login('legacy-secret').status_code, 200)
+
+    def test_token_cache_evicts_least_recently_used(self):
+        cache = auth.TokenCache(max_size=2, ttl=60)
+        users = [auth.AuthUser(id=i, username=f'u{i}', email='', isPremium=False, status=1) for i in range(3)]
+        cache.set('a', users[0])
+        cache.set('b', users[1])
+        cache.get('a')
+        cache.set('c', users[2])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), users[0])
+        cache.invalidate_user(0)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), users[2])
+
+
+class RateLimitTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        auth.get_token_cache().clear()
+        self.client = APIClient()
+        self.song = self.make_songs(1)[0]
+        # Lượt nghe của test nằm trong bộ gom riêng, không còn chờ ghi khi tiến trình test thoát
+        playcounts._aggregator = playcounts.PlayCountAggregator(flush_interval=3600, flush_threshold=10 ** 6, log_path='')
+
+    def tearDown(self):
+        playcounts._aggregator = None
+
+    def test_token_bucket_refills_over_time(self):
+        now = [0.0]
+        store = ratelimit.MemoryStore(max_keys=10, clock=lambda: now[0])
+        self.assertEqual([store.hit('k', 2, 60)[0] for _ in range(3)], [True, True, False])
+        self.assertAlmostEqual(store.hit('k', 2, 60)[1], 30)
+        now[0] = 30
+        self.assertEqual([store.hit('k', 2, 60)[0] for _ in range(2)], [True, False])
+
+    def test_cache_store_sliding_window(self):
+        now = [600.0]
+        store = ratelimit.CacheStore('default', clock=lambda: now[0])
+        store.cache.clear()
+        self.assertEqual([store.hit('k', 2, 60)[0] for _ in range(3)], [True, True, False])
+        # Nửa cửa sổ sau: 2 lần được phép của cửa sổ trước còn tính một nửa
+        now[0] = 690.0
+        self.assertEqual([store.hit('k', 2, 60)[0] for _ in range(2)], [True, False])
+        now[0] = 720.0
+        self.assertEqual([store.hit('k', 2, 60)[0] for _ in range(2)], [True, False])
+
+    def test_denied_request_consumes_no_bucket(self):
+        now = [600.0]
+        stores = (ratelimit.MemoryStore(max_keys=10, clock=lambda: now[0]), ratelimit.CacheStore('default', clock=lambda: now[0]))
+        stores[1].cache.clear()
+        for store in stores:
+            self.assertEqual(store.hit_all([('ip', 1, 60)])[0], True)
+            # Luật IP chặn: bucket của user không bị trừ
+            self.assertEqual(store.hit_all([('user', 1, 60), ('ip', 1, 60)])[:2], (False, 1))
+            self.assertEqual(store.hit_all([('user', 1, 60)])[0], True)
+
+    def test_play_count_is_limited_per_user(self):
+        url = f'/api/songs/{self.song.id}/increment_play_count/'
+        alice = User.objects.create(username='alice', email='alice@example.com', password_hash='x')
+        bob = User.objects.create(username='bob', email='bob@example.com', password_hash='x')
+        limit, _ = ratelimit.parse_rate(settings.RATELIMIT_RULES['play']['user'])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth.issue_token(alice)}')
+        for _ in range(limit):
+            self.assertEqual(self.client.post(url, format='json').status_code, 200)
+        response = self.client.post(url, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth.issue_token(bob)}')
+        self.assertEqual(self.client.post(url, format='json').status_code, 200)
+        self.assertEqual(self.client.get('/api/ratelimit/stats/').data['play'], {'allowed': limit + 1, 'limited_user': 1})
+
+    def test_anonymous_user_id_is_not_a_limit_key(self):
+        # Đổi user_id mỗi request không thoát được giới hạn: request không token tính theo IP
+        url = f'/api/songs/{self.song.id}/increment_play_count/'
+        with self.settings(RATELIMIT_RULES={'play': {'user': '1/min', 'ip': '3/min'}}, AUTH_REQUIRE_TOKEN=False):
+            for user_id in range(3):
+                self.assertEqual(self.client.post(url, {'user_id': user_id}, format='json').status_code, 200)
+            self.assertEqual(self.client.post(url, {'user_id': 99}, format='json').status_code, 429)
+        self.assertEqual(ratelimit.stats()['play'], {'allowed': 3, 'limited_ip': 1})
+
+    def test_login_is_limited_per_email(self):
+        limit, _ = ratelimit.parse_rate(settings.RATELIMIT_RULES['login']['email'])
+        for _ in range(limit):
+            response = self.client.post('/api/users/login/', {'email': 'x@example.com', 'password': 'guess'}, format='json')
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/users/login/', {'email': 'X@example.com ', 'password': 'guess'}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+
+@skipUnless(find_spec('PIL'), 'cần cài Pillow (requirements.txt)')
+class CoverThumbnailTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.covers = tempfile.TemporaryDirectory()
+        self.addCleanup(self.covers.cleanup)
+        override = self.settings(ALBUM_COVER_ROOT=self.covers.name, COVER_THUMBNAIL_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.artist = Artist.objects.create(name='Artist')
+        self.client = APIClient()
+
+    def image(self, name='cover.png', size=(1200, 800), color=(200, 30, 30)):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def add_album(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/albums/add/', {
+                'name': 'Album', 'created_at': '2025-01-01', 'artist': self.artist.id, 'cover_image': image,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Album.objects.get(id=response.data['id'])
+
+    def test_upload_builds_resized_variants(self):
+        from PIL import Image
+
+        album = self.add_album(self.image())
+        self.assertEqual(set(album.cover_thumbnails), {str(size) for size in settings.COVER_THUMBNAIL_SIZES})
+        digest = album.cover_image.split('/')[-1].split('.')[0]
+        for size, formats in album.cover_thumbnails.items():
+            self.assertEqual(set(formats), set(settings.COVER_THUMBNAIL_FORMATS))
+            self.assertIn(digest, formats['webp'])
+            with Image.open(os.path.join(self.covers.name, formats['webp'])) as thumb:
+                self.assertEqual(thumb.format, 'WEBP')
+                self.assertEqual(max(thumb.size), int(size))
+                self.assertAlmostEqual(thumb.size[1], thumb.size[0] * 2 / 3, delta=1)
+
+    def test_song_and_playlist_listings_use_thumbnails(self):
+        album = self.add_album(self.image())
+        song = Song.objects.create(name='Track', artist=self.artist, album=album, duration=100, song_url='a.mp3')
+        user = User.objects.create(username='thumbs', email='thumbs@example.com', password_hash='x')
+        playlist = Playlist.objects.create(name='P', user=user)
+        PlaylistSong.objects.create(playlist=playlist, song=song)
+        data = self.client.get(f'/api/songs/{song.id}/').data
+        self.assertEqual(data['album_img'], album.cover_image)
+        self.assertEqual(data['album_thumbs'], album.cover_thumbnails)
+        auth.get_token_cache().clear()
+        previews = self.client.get('/api/playlists/', **bearer(user)).data[0]['cover_images']
+        self.assertEqual(previews, [thumbnails.pick(album.cover_thumbnails, settings.PLAYLIST_COVER_PREVIEW_SIZE)])
+
+    def test_replacing_cover_rebuilds_and_same_content_is_reused(self):
+        album = self.add_album(self.image())
+        other = self.add_album(self.image(name='copy.png'))
+        self.assertEqual(other.cover_thumbnails, album.cover_thumbnails)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/albums/update/{album.id}/', {
+                'cover_image': self.image(name='blue.png', color=(0, 0, 255)),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        album.refresh_from_db()
+        self.assertNotEqual(album.cover_thumbnails, other.cover_thumbnails)
+        self.assertTrue(os.path.isfile(os.path.join(self.covers.name, album.cover_thumbnails['64']['jpeg'])))
+
+    def test_backfill_command_handles_legacy_covers(self):
+        with open(os.path.join(self.covers.name, 'legacy.png'), 'wb') as legacy:
+            legacy.write(self.image().read())
+        album = Album.objects.create(name='Old', created_at=date(2020, 1, 1), artist=self.artist, cover_image='legacy.png')
+        missing = Album.objects.create(name='Gone', created_at=date(2020, 1, 1), artist=self.artist, cover_image='gone.png')
+        user = User.objects.create(username='pl', email='pl@example.com', password_hash='x')
+        playlist = Playlist.objects.create(name='P', user=user, cover_image='legacy.png')
+        out = io.StringIO()
+        call_command('build_cover_thumbnails', '--workers', '1', stdout=out)
+        album.refresh_from_db()
+        playlist.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertEqual(album.cover_thumbnails, playlist.cover_thumbnails)
+        self.assertTrue(album.cover_thumbnails)
+        self.assertEqual(missing.cover_thumbnails, {})
+        self.assertIn('2/3', out.getvalue())
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.staging = tempfile.TemporaryDirectory()
+        self.addCleanup(self.staging.cleanup)
+        override = self.settings(
+            MEDIA_ROOT=self.media.name, UPLOAD_STAGING_DIR=self.staging.name, TRANSCODE_ENABLED=False,
+            AUDIO_METADATA_ENABLED=False, UPLOAD_MAX_CHUNK_SIZE=1000,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.artist = Artist.objects.create(name='Artist')
+        self.client = APIClient()
+        self.content = bytes(range(256)) * 10
+
+    def start(self, **extra):
+        response = self.client.post('/api/uploads/', {'size': len(self.content), 'file_name': 'Track.MP3', **extra}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunk/?offset={offset}', data, content_type='application/octet-stream'
+        )
+
+    def upload(self, **extra):
+        upload_id = self.start(**extra)
+        for offset in range(0, len(self.content), 1000):
+            self.assertEqual(self.put_chunk(upload_id, offset, self.content[offset:offset + 1000]).status_code, 200)
+        return upload_id
+
+    def test_resume_after_lost_chunk_and_finalize_into_store(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        upload_id = self.start(sha256=sha256)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:1000]).data['received'], 1000)
+        # Chunk thứ hai bị mất; client gửi tiếp sai offset thì được báo vị trí server đang chờ
+        response = self.put_chunk(upload_id, 2000, self.content[2000:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received'], 1000)
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/finalize/').status_code, 409)
+        self.assertEqual(self.put_chunk(upload_id, 1000, self.content[1000:2000]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 2000, self.content[2000:]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'x' * 1001).status_code, 409)
+
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['file_name'], f'{sha256[:2]}/{sha256[2:4]}/{sha256}.mp3')
+        with open(audio_store.path(response.data['file_name']), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(os.listdir(self.staging.name), [])
+        self.assertEqual(StoredFile.objects.get(name=response.data['file_name']).ref_count, 0)
+
+    def test_overlapping_finalize_returns_the_same_file(self):
+        upload_id = self.upload()
+        # Request thứ hai đọc phiên trước khi request đầu finalize xong
+        late = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(os.listdir(self.media.name), [])
+        UploadSession.objects.filter(id=upload_id).update(status=UploadSession.STATUS_FINALIZING)
+        with self.settings(UPLOAD_FINALIZE_WAIT=0), self.assertRaisesMessage(uploads.UploadError, 'đang được finalize'):
+            uploads.finalize(UploadSession.objects.get(id=upload_id))
+        UploadSession.objects.filter(id=upload_id).update(status=UploadSession.STATUS_OPEN)
+
+        file_name = self.client.post(f'/api/uploads/{upload_id}/finalize/').data['file_name']
+        self.assertEqual(uploads.finalize(late), file_name)
+        self.assertEqual(late.status, UploadSession.STATUS_COMPLETE)
+
+    def test_checksum_mismatch_discards_upload(self):
+        upload_id = self.upload(sha256='0' * 64)
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual(self.put_chunk(upload_id, 0, b'abc').status_code, 404)
+
+    def test_add_and_update_song_use_finalized_upload_once(self):
+        upload_id = self.upload()
+        song_data = {'name': 'Track', 'artist': self.artist.id, 'duration': 100, 'premium': 0, 'upload_id': upload_id}
+        # Chưa finalize thì chưa dùng được
+        self.assertEqual(self.client.post('/api/songs/add/', song_data, format='multipart').status_code, 400)
+        self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        response = self.client.post('/api/songs/add/', song_data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        song = Song.objects.get(id=response.data['id'])
+        self.assertEqual(StoredFile.objects.get(name=song.song_url).ref_count, 1)
+        self.assertEqual(self.client.post('/api/songs/add/', song_data, format='multipart').status_code, 400)
+        self.assertEqual(Song.objects.count(), 1)
+
+        self.content = b'new' * 500
+        replacement = self.upload()
+        self.client.post(f'/api/uploads/{replacement}/finalize/')
+        response = self.client.put(f'/api/songs/update/{song.id}/', {**song_data, 'upload_id': replacement}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        old_name, song = song.song_url, Song.objects.get(id=song.id)
+        self.assertNotEqual(song.song_url, old_name)
+        self.assertEqual(StoredFile.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(StoredFile.objects.get(name=song.song_url).ref_count, 1)
+
+    def test_cleanup_removes_stale_sessions_and_staging_files(self):
+        stale = self.start()
+        self.put_chunk(stale, 0, self.content[:1000])
+        fresh = self.start()
+        UploadSession.objects.filter(id=stale).update(updated_at=timezone.now() - timedelta(days=2))
+        staging = self.staging.name
+        orphan = os.path.join(staging, 'orphan.part')
+        open(orphan, 'wb').close()
+        os.utime(orphan, (0, 0))
+        out = io.StringIO()
+        call_command('clean_uploads', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list('id', flat=True)), [fresh])
+        self.assertEqual(os.listdir(staging), [f'{fresh}.part'])
+
+
+class AsyncCatalogViewTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        override = self.settings(CATALOG_CACHE_ENABLED=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = RequestFactory()
+        user = User.objects.create(username='listener', email='listener@example.com', password_hash='secret')
+        self.playlist = Playlist.objects.create(name='Mix', user=user)
+        self.songs = self.make_songs(3, playlist=self.playlist)
+        Song.objects.filter(id=self.songs[1].id).update(play_count=9)
+        search.index_song(self.songs[0])
+
+    def assertSameResponse(self, name, path, **kwargs):
+        request = self.factory.get(path)
+        expected = getattr(views, name)(request, **kwargs).render()
+        actual = async_to_sync(getattr(async_views, name))(self.factory.get(path), **kwargs).render()
+        self.assertEqual((actual.status_code, actual.content), (expected.status_code, expected.content), path)
+        return actual
+
+    def test_async_views_match_sync_views(self):
+        song, album = self.songs[0], self.songs[0].album
+        first_page = json.loads(self.assertSameResponse('get_songs', '/api/songs/?limit=2&order=play_count').content)
+        self.assertEqual(first_page['results'][0]['id'], self.songs[1].id)
+        for path in (
+            '/api/songs/', '/api/songs/?search=song 0', '/api/songs/?fields=id,name',
+            f'/api/songs/?limit=2&order=play_count&cursor={first_page["next_cursor"]}',
+            '/api/songs/?fields=password', '/api/songs/?limit=0', '/api/songs/?search=song&limit=1',
+        ):
+            self.assertSameResponse('get_songs', path)
+        self.assertSameResponse('get_song_by_id', f'/api/songs/{song.id}/', song_id=song.id)
+        self.assertEqual(self.assertSameResponse('get_song_by_id', '/api/songs/0/', song_id=0).status_code, 404)
+        self.assertSameResponse('get_albums', '/api/albums/')
+        self.assertSameResponse('get_album_details', f'/api/albums/{album.id}/', pk=album.id)
+        self.assertSameResponse('get_album_details', '/api/albums/0/', pk=0)
+        self.assertSameResponse('get_artists', '/api/artists/')
+        for path in (f'/api/playlists/{self.playlist.id}/', f'/api/playlists/{self.playlist.id}/?summary=1'):
+            self.assertSameResponse('get_playlist', path, pk=self.playlist.id)
+        self.assertSameResponse('get_playlist', '/api/playlists/0/', pk=0)
+
+    def test_served_through_asgi_handler(self):
+        async def fetch():
+            playlist = await self.async_client.get(f'/api/playlists/{self.playlist.id}/')
+            rejected = await self.async_client.post('/api/artists/')
+            return playlist, rejected
+
+        playlist, rejected = async_to_sync(fetch)()
+        self.assertEqual(playlist.status_code, 200)
+        self.assertEqual([row['song']['id'] for row in playlist.json()['songs']], [song.id for song in self.songs])
+        self.assertEqual(rejected.status_code, 405)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def cursor(self):
+        if not self.alive:
+            raise OperationalError('server has gone away')
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+
+class DbPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        self.now = 0.0
+        self.opened = []
+
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+
+        return db_pool.ConnectionPool(connect, clock=lambda: self.now, **options)
+
+    def test_reuses_and_limits_connections(self):
+        pool = self.make_pool(max_size=2, timeout=0)
+        first, reused = pool.acquire()
+        self.assertFalse(reused)
+        pool.release(first)
+        self.assertEqual(pool.acquire(), (first, True))
+        pool.acquire()
+        with self.assertRaises(OperationalError):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        self.assertEqual(pool.stats()['in_use'], 2)
+
+    def test_waiting_thread_gets_released_connection(self):
+        pool = db_pool.ConnectionPool(FakeConnection, max_size=1, timeout=5)
+        held, _ = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [held])
+        timer.start()
+        self.assertEqual(pool.acquire(), (held, True))
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_recycles_old_and_broken_connections(self):
+        pool = self.make_pool(max_lifetime=100, check_after=10)
+        old, _ = pool.acquire()
+        self.now = 150
+        pool.release(old)
+        self.assertTrue(old.closed)
+        idle, _ = pool.acquire()
+        pool.release(idle)
+        # Rảnh quá check_after và server đã đóng kết nối: ping lỗi, mở kết nối mới
+        idle.alive = False
+        self.now = 170
+        fresh, reused = pool.acquire()
+        self.assertFalse(reused)
+        self.assertIsNot(fresh, idle)
+        pool.release(fresh, discard=True)
+        self.assertTrue(fresh.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['recycled'], stats['health_check_failures'], stats['discarded']), (1, 1, 1))
+        self.assertEqual((stats['size'], stats['idle']), (0, 0))
+
+    def test_backend_returns_connections_to_pool(self):
+        directory = tempfile.mkdtemp()
+        database = {
+            'ENGINE': 'app.db.sqlite3', 'NAME': os.path.join(directory, 'pool.sqlite3'),
+            'OPTIONS': {'pool': {'max_size': 2}},
+        }
+        databases = connections.configure_settings({'default': database, 'pooltest': database})
+        wrapper = load_backend('app.db.sqlite3').DatabaseWrapper(databases['pooltest'], 'pooltest')
+        self.addCleanup(db_pool.close_pools)
+        for _ in range(3):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            raw = wrapper.connection
+            wrapper.close()
+        self.addCleanup(raw.close)
+        pool = db_pool.get_pool(wrapper, None)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['reused'], 2)
+        self.assertEqual(db_pool.stats()['pooltest']['idle'], 1)
+        # Kết nối hỏng sau lỗi DB: ping không qua nên bị bỏ, lần sau mở kết nối mới
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        raw.close()
+        wrapper.errors_occurred = True
+        wrapper.close()
+        self.assertEqual((pool.stats()['discarded'], pool.stats()['size']), (1, 0))
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIsNot(wrapper.connection, raw)
+        wrapper.close()
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_router_reads_catalog_from_replica_until_write(self):
+        router = db_router.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Song), 'default')
+        token = db_router.request_state.set({'pinned': False})
+        try:
+            self.assertEqual(router.db_for_read(Song), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Song), 'default')
+            self.assertEqual(router.db_for_read(Song), 'default')
+        finally:
+            db_router.request_state.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'app'))
+        self.assertIsNone(router.allow_migrate('default', 'app'))
+
+
+class SignedStreamUrlTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        os.makedirs(os.path.join(self.media.name, 'hls'))
+        for name in ('song0.mp3', 'song1.mp3', 'hls/index.m3u8', 'hls/seg_00000.mp3'):
+            with open(os.path.join(self.media.name, name), 'wb') as audio_file:
+                audio_file.write(b'\xff\xfb' * 100)
+        override = self.settings(MEDIA_ROOT=self.media.name, AUDIO_SENDFILE_BACKEND=None, CATALOG_CACHE_ENABLED=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.free, self.premium = self.make_songs(2)
+        Song.objects.filter(id=self.premium.id).update(premium=1)
+        self.vip = User.objects.create(username='vip', email='vip@example.com', password_hash='x', isPremium=True)
+        auth.get_token_cache().clear()
+        self.client = APIClient()
+
+    def stream_urls(self, path, **headers):
+        return {song['id']: song['stream_url'] for song in self.client.get(path, **headers).json()}
+
+    def test_listing_issues_urls_by_caller_tier(self):
+        anonymous = self.stream_urls('/api/songs/')
+        self.assertIsNone(anonymous[self.premium.id])
+        # Cùng mục cache catalog nhưng link theo gói của người gọi
+        premium = self.stream_urls('/api/songs/', HTTP_AUTHORIZATION=f'Bearer {auth.issue_token(self.vip)}')
+        self.assertTrue(premium[self.premium.id].startswith(f'/audio/_signed/{self.premium.id}.1.'))
+        self.assertTrue(premium[self.free.id].startswith(f'/audio/_signed/{self.free.id}.0.'))
+        response = self.client.get(premium[self.premium.id], HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        song = self.client.get(f'/api/songs/{self.free.id}/').json()
+        self.assertEqual(song['stream_url'], anonymous[self.free.id])
+
+    def test_etag_follows_caller_tier_and_link_expiry(self):
+        premium = {'HTTP_AUTHORIZATION': f'Bearer {auth.issue_token(self.vip)}'}
+        anonymous_etag = self.client.get('/api/songs/')['ETag']
+        response = self.client.get('/api/songs/', HTTP_IF_NONE_MATCH=anonymous_etag, **premium)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()[1]['stream_url'])
+        premium_etag = response['ETag']
+        self.assertEqual(self.client.get('/api/songs/', HTTP_IF_NONE_MATCH=premium_etag, **premium).status_code, 304)
+        # Link được ký với mốc hết hạn mới thì client phải nhận lại danh sách
+        with self.settings(AUDIO_STREAM_URL_TTL=settings.AUDIO_STREAM_URL_TTL + settings.AUDIO_STREAM_URL_ROUND):
+            response = self.client.get('/api/songs/', HTTP_IF_NONE_MATCH=premium_etag, **premium)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_signed_url_is_bound_to_file_and_expiry(self):
+        url = stream_urls.sign('song0.mp3', self.free.id, 0)
+        token = url.split('/')[3]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(f'/audio/_signed/{token}/song1.mp3').status_code, 403)
+        self.assertEqual(self.client.get(url.replace(f'{self.free.id}.0.', f'{self.free.id}.1.')).status_code, 403)
+        expired = stream_urls.sign('song0.mp3', self.free.id, 0, now=0)
+        self.assertEqual(self.client.get(expired).status_code, 403)
+        # Link tới playlist HLS dùng được cho segment cùng thư mục
+        playlist = stream_urls.sign('hls/index.m3u8', self.free.id, 0)
+        self.assertEqual(self.client.get(playlist.replace('index.m3u8', 'seg_00000.mp3')).status_code, 200)
+        # Mặc định chỉ phát link có chữ ký
+        self.assertEqual(self.client.get('/audio/song0.mp3').status_code, 403)
+        with self.settings(AUDIO_SIGNED_URLS_REQUIRED=False):
+            self.assertEqual(self.client.get('/audio/song0.mp3').status_code, 200)
+
+    def test_stream_redirect_enforces_premium(self):
+        url = f'/api/songs/{self.premium.id}/stream/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, **bearer(self.vip))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(response['Location']).status_code, 200)
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from . import catalog_cache
+from .models import Album, Playlist
+
+logger = logging.getLogger(__name__)
+
+# Ảnh thu nhỏ cho ảnh bìa album / playlist, tạo ở nền sau khi commit thay cho việc mọi danh sách
+# tải ảnh gốc nhiều MB. Mỗi cỡ trong COVER_THUMBNAIL_SIZES (cạnh dài, px) được ghi ở mọi định dạng
+# trong COVER_THUMBNAIL_FORMATS vào ALBUM_COVER_ROOT/thumbs/<ab>/<cd>/<sha256 ảnh gốc>_<cỡ>.<đuôi>:
+# - tên theo nội dung ảnh gốc nên ảnh dùng chung giữa nhiều album chỉ tạo một lần, file đã có
+#   trên đĩa thì không giải mã lại; đổi ảnh là đổi tên nên client cache được lâu
+# - giải mã một lần ở cỡ lớn nhất (JPEG dùng draft() để giải mã thẳng ở độ phân giải thấp) rồi
+#   thu nhỏ dần cho các cỡ sau
+# Tên các file đã tạo lưu ở cover_thumbnails của bản ghi; serializer trả về cùng dạng tên
+# tương đối như cover_image (frontend ghép /uploads/albums/<tên>). Cần Pillow.
+
+THUMBNAIL_DIR = 'thumbs'
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+CONTENT_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+$')
+MODELS = {'album': Album, 'playlist': Playlist}
+
+
+def _root():
+    return str(settings.ALBUM_COVER_ROOT)
+
+
+def source_digest(cover_image, path):
+    # Ảnh lưu qua ContentStore đã mang sha256 trong tên; ảnh kiểu cũ thì băm nội dung
+    match = CONTENT_NAME.match(cover_image)
+    if match:
+        return match.group(1)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_name(digest, size, fmt):
+    return f'{THUMBNAIL_DIR}/{digest[:2]}/{digest[2:4]}/{digest}_{size}.{EXTENSIONS[fmt]}'
+
+
+def _save(image, name, fmt):
+    path = os.path.join(_root(), *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            if fmt == 'jpeg':
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                image.save(destination, 'JPEG', quality=settings.COVER_THUMBNAIL_QUALITY, optimize=True, progressive=True)
+            elif fmt == 'webp':
+                image.save(destination, 'WEBP', quality=settings.COVER_THUMBNAIL_QUALITY, method=4)
+            else:
+                image.save(destination, 'PNG', optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render(cover_image, sizes=None, formats=None):
+    # Trả về {"<cỡ>": {định dạng: tên file}}; chỉ giải mã ảnh gốc khi còn thiếu file
+    from PIL import Image, ImageOps
+
+    sizes = sorted(sizes or settings.COVER_THUMBNAIL_SIZES, reverse=True)
+    formats = formats or settings.COVER_THUMBNAIL_FORMATS
+    path = os.path.join(_root(), *cover_image.split('/'))
+    digest = source_digest(cover_image, path)
+    variants = {str(size): {fmt: variant_name(digest, size, fmt) for fmt in formats} for size in sizes}
+    missing = [
+        (size, fmt) for size in sizes for fmt in formats
+        if not os.path.exists(os.path.join(_root(), *variants[str(size)][fmt].split('/')))
+    ]
+    if not missing:
+        return variants
+
+    with Image.open(path) as source:
+        source.draft('RGB', (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        for size in sizes:
+            # thumbnail() giữ tỉ lệ và không phóng to ảnh nhỏ hơn cỡ yêu cầu
+            image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            for fmt in formats:
+                if (size, fmt) in missing:
+                    _save(image, variants[str(size)][fmt], fmt)
+    return variants
+
+
+def pick(thumbnails, size, fmt='webp'):
+    # Tên file nhỏ nhất không nhỏ hơn size (hoặc lớn nhất nếu mọi cỡ đều nhỏ hơn); None nếu chưa có
+    if not thumbnails:
+        return None
+    available = sorted(int(key) for key in thumbnails)
+    chosen = next((value for value in available if value >= size), available[-1])
+    return thumbnails[str(chosen)].get(fmt)
+
+
+def build(kind, object_id):
+    # Tạo ảnh thu nhỏ cho một album / playlist; trả về cover_thumbnails mới hoặc None nếu không có ảnh
+    model = MODELS[kind]
+    cover_image = model.objects.filter(id=object_id).values_list('cover_image', flat=True).first()
+    if not cover_image:
+        return None
+    if not os.path.isfile(os.path.join(_root(), *cover_image.split('/'))):
+        logger.warning('Bỏ qua ảnh thu nhỏ %s %s: không thấy file %s', kind, object_id, cover_image)
+        return None
+    variants = render(cover_image)
+    # update() theo cả cover_image: ảnh đã bị đổi trong lúc đang tạo thì không ghi đè
+    updated = model.objects.filter(id=object_id, cover_image=cover_image).update(cover_thumbnails=variants)
+    if updated and model is Album:
+        # update() không phát post_save; bài hát trong cache catalog mang theo album_thumbs
+        catalog_cache.invalidate_model('Album')
+    return variants
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.COVER_THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def _run(kind, object_id):
+    try:
+        build(kind, object_id)
+    except Exception:
+        logger.exception('Tạo ảnh thu nhỏ cho %s %s thất bại', kind, object_id)
+
+
+def _run_in_background(kind, object_id):
+    try:
+        _run(kind, object_id)
+    finally:
+        connection.close()
+
+
+def enqueue(kind, object_id):
+    # Gọi sau khi đổi cover_image (và đã xóa cover_thumbnails cũ); chạy khi transaction đã commit
+    if not settings.COVER_THUMBNAILS_ENABLED:
+        return
+    if settings.COVER_THUMBNAIL_WORKERS <= 0:
+        transaction.on_commit(lambda: _run(kind, object_id))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_background, kind, object_id))
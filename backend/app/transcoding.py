@@ -0,0 +1,179 @@
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from .models import Song, SongRendition
+
+logger = logging.getLogger(__name__)
+
+# Chuyển mã bài hát vừa upload thành nhiều mức bitrate (và tùy chọn các đoạn HLS) ở nền.
+# File được ghi vào MEDIA_ROOT/renditions/<song_id>/ nên vẫn phát qua stream_audio.
+# Bộ mã hóa cấu hình bằng TRANSCODE_ENCODER; StubEncoder không cần ffmpeg, dùng cho dev/test.
+
+RENDITION_DIR = 'renditions'
+
+
+class FFmpegEncoder:
+    def __init__(self, binary=None):
+        self.binary = binary or settings.TRANSCODE_FFMPEG_BINARY
+
+    def _run(self, args):
+        subprocess.run([self.binary, '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+
+    def encode(self, source, destination, bitrate):
+        self._run(['-i', source, '-vn', '-codec:a', 'libmp3lame', '-b:a', f'{bitrate}k', destination])
+
+    def segment(self, source, output_dir, segment_seconds):
+        playlist = os.path.join(output_dir, 'index.m3u8')
+        self._run([
+            '-i', source, '-codec', 'copy', '-f', 'hls', '-hls_time', str(segment_seconds),
+            '-hls_playlist_type', 'vod', '-hls_segment_filename', os.path.join(output_dir, 'seg_%05d.mp3'),
+            playlist,
+        ])
+        return playlist
+
+
+class StubEncoder:
+    # Không chuyển mã thật: chép file gốc và cắt thành các đoạn theo số byte
+    SEGMENT_BYTES = 256 * 1024
+
+    def encode(self, source, destination, bitrate):
+        shutil.copyfile(source, destination)
+
+    def segment(self, source, output_dir, segment_seconds):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{segment_seconds}', '#EXT-X-PLAYLIST-TYPE:VOD']
+        with open(source, 'rb') as source_file:
+            index = 0
+            while True:
+                chunk = source_file.read(self.SEGMENT_BYTES)
+                if not chunk:
+                    break
+                name = f'seg_{index:05d}.mp3'
+                with open(os.path.join(output_dir, name), 'wb') as segment_file:
+                    segment_file.write(chunk)
+                lines += [f'#EXTINF:{segment_seconds:.1f},', name]
+                index += 1
+        lines.append('#EXT-X-ENDLIST')
+        playlist = os.path.join(output_dir, 'index.m3u8')
+        with open(playlist, 'w', encoding='utf-8') as playlist_file:
+            playlist_file.write('\n'.join(lines) + '\n')
+        return playlist
+
+
+def get_encoder():
+    return import_string(settings.TRANSCODE_ENCODER)()
+
+
+def rendition_dir(song_id):
+    return os.path.join(settings.MEDIA_ROOT, RENDITION_DIR, str(song_id))
+
+
+def _relative(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def delete_renditions(song):
+    SongRendition.objects.filter(song=song).delete()
+    shutil.rmtree(rendition_dir(song.id), ignore_errors=True)
+
+
+def transcode_song(song_id, encoder=None):
+    # Tạo (lại) mọi rendition cho một bài hát; trả về danh sách SongRendition đã sẵn sàng
+    try:
+        song = Song.objects.only('id', 'song_url').get(id=song_id)
+    except Song.DoesNotExist:
+        return []
+    source = os.path.join(settings.MEDIA_ROOT, song.song_url)
+    if not os.path.isfile(source):
+        logger.warning('Bỏ qua chuyển mã bài hát %s: không thấy file %s', song_id, source)
+        return []
+
+    encoder = encoder or get_encoder()
+    output_dir = rendition_dir(song_id)
+    os.makedirs(output_dir, exist_ok=True)
+    segment_seconds = settings.TRANSCODE_HLS_SEGMENT_SECONDS
+    renditions = []
+    for bitrate in sorted(settings.TRANSCODE_BITRATES):
+        rendition, _ = SongRendition.objects.update_or_create(
+            song_id=song_id, bitrate=bitrate,
+            defaults={'status': SongRendition.STATUS_PENDING, 'file_name': '', 'playlist': None},
+        )
+        try:
+            destination = os.path.join(output_dir, f'{bitrate}k.mp3')
+            encoder.encode(source, destination, bitrate)
+            rendition.file_name = _relative(destination)
+            if segment_seconds:
+                segment_dir = os.path.join(output_dir, f'{bitrate}k')
+                os.makedirs(segment_dir, exist_ok=True)
+                rendition.playlist = _relative(encoder.segment(destination, segment_dir, segment_seconds))
+            rendition.size = os.path.getsize(destination)
+            rendition.status = SongRendition.STATUS_READY
+        except Exception:
+            logger.exception('Chuyển mã bài hát %s ở %skbps thất bại', song_id, bitrate)
+            rendition.status = SongRendition.STATUS_FAILED
+        rendition.save()
+        if rendition.status == SongRendition.STATUS_READY:
+            renditions.append(rendition)
+    return renditions
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.TRANSCODE_WORKERS, thread_name_prefix='transcode')
+    return _executor
+
+
+def _run_in_background(song_id):
+    try:
+        transcode_song(song_id)
+    except Exception:
+        logger.exception('Chuyển mã bài hát %s thất bại', song_id)
+    finally:
+        connection.close()
+
+
+def enqueue_song(song_id):
+    # Chỉ đưa vào hàng đợi sau khi transaction lưu bài hát đã commit
+    if not settings.TRANSCODE_ENABLED:
+        return
+    if settings.TRANSCODE_WORKERS <= 0:
+        transaction.on_commit(lambda: transcode_song(song_id))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_background, song_id))
+
+
+def pick_rendition(song, max_bitrate=None):
+    # Chọn rendition cao nhất không vượt quá max_bitrate; None nếu chưa có rendition nào sẵn sàng
+    ready = SongRendition.objects.filter(song=song, status=SongRendition.STATUS_READY)
+    if max_bitrate is not None:
+        ready = ready.filter(bitrate__lte=max_bitrate)
+    return ready.order_by('-bitrate').first()
+
+
+def max_bitrate_for(request, is_premium):
+    # Trần bitrate theo gói tài khoản, hạ tiếp nếu client báo tiết kiệm dữ liệu / mạng chậm
+    ceiling = settings.TRANSCODE_PREMIUM_MAX_BITRATE if is_premium else settings.TRANSCODE_FREE_MAX_BITRATE
+    quality = request.GET.get('quality')
+    if quality in settings.TRANSCODE_QUALITY_BITRATES:
+        ceiling = min(ceiling, settings.TRANSCODE_QUALITY_BITRATES[quality])
+    if request.headers.get('Save-Data', '').lower() == 'on':
+        ceiling = min(ceiling, settings.TRANSCODE_QUALITY_BITRATES['low'])
+    try:
+        # Client hint Downlink: băng thông ước lượng (Mbps)
+        downlink = float(request.headers.get('Downlink', ''))
+        ceiling = min(ceiling, max(int(downlink * 1000 * 0.8), min(settings.TRANSCODE_BITRATES)))
+    except ValueError:
+        pass
+    return ceiling
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import re
+import secrets
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import UploadSession
+from .storage import STORES
+
+# Upload chia nhỏ, tiếp tục được: thay cho việc một request multipart giữ worker suốt thời gian
+# client gửi cả file.
+#   1. POST   /api/uploads/                 {size, file_name, sha256?} -> id, chunk_size
+#   2. PUT    /api/uploads/<id>/chunk/?offset=N   thân request là các byte từ vị trí N
+#      (mất kết nối: GET /api/uploads/<id>/ lấy offset đã nhận rồi gửi tiếp từ đó)
+#   3. POST   /api/uploads/<id>/finalize/   {sha256?} -> kiểm tra đủ byte và checksum, chuyển
+#      file sang tên theo nội dung trong store (cùng ổ đĩa thì chỉ đổi tên, không chép lại)
+#   4. add_song / update_song nhận upload_id thay cho file multipart
+# Chunk ghi thẳng vào UPLOAD_STAGING_DIR/<id>.part (ngoài MEDIA_ROOT: file chưa kiểm tra không bao
+# giờ phát được qua /audio/), đọc thân request theo từng khối nhỏ nên bộ nhớ không phụ thuộc cỡ
+# chunk. Phiên bỏ dở được dọn bởi lệnh clean_uploads.
+
+READ_SIZE = 64 * 1024
+FINALIZE_POLL = 0.1  # giây giữa hai lần đọc lại phiên khi chờ request finalize khác
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    # Chunk không bắt đầu ở vị trí server đang chờ; client gửi lại từ offset
+    def __init__(self, offset):
+        super().__init__(f'Offset không khớp, server đang chờ byte {offset}')
+        self.offset = offset
+
+
+def staging_path(session):
+    return os.path.join(settings.UPLOAD_STAGING_DIR, f'{session.id}.part')
+
+
+def _touch():
+    return timezone.now()
+
+
+def start(size, file_name, sha256='', store='audio'):
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size phải là số nguyên dương')
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f'File vượt quá {settings.UPLOAD_MAX_SIZE} byte')
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256.match(sha256):
+        raise UploadError('sha256 phải là 64 ký tự hex')
+    ext = os.path.splitext(file_name or '')[1].lower()
+    if len(ext) > 16:
+        raise UploadError('Đuôi file không hợp lệ')
+    session = UploadSession(id=secrets.token_hex(16), store=store, file_ext=ext, size=size, sha256=sha256)
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    session.save(force_insert=True)
+    return session
+
+
+def write_chunk(session, offset, stream, length):
+    # Ghi đúng length byte từ stream vào vị trí offset; chỉ tăng received khi đã nhận đủ nên một
+    # chunk bị ngắt giữa chừng được gửi lại nguyên vẹn. Trả về offset mới.
+    if session.status != UploadSession.STATUS_OPEN:
+        raise UploadError('Phiên upload đã kết thúc')
+    if offset != session.received:
+        raise OffsetMismatch(session.received)
+    if length <= 0 or length > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunk phải từ 1 tới {settings.UPLOAD_MAX_CHUNK_SIZE} byte')
+    if offset + length > session.size:
+        raise UploadError('Chunk vượt quá size đã khai báo')
+    written = 0
+    with open(staging_path(session), 'r+b') as staging:
+        staging.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            staging.write(data)
+            written += len(data)
+    if written != length:
+        raise UploadError(f'Chunk không đủ: nhận {written}/{length} byte')
+    # Hai request cùng gửi một offset: chỉ request cập nhật trước được tính
+    advanced = UploadSession.objects.filter(
+        id=session.id, status=UploadSession.STATUS_OPEN, received=offset,
+    ).update(received=offset + length, updated_at=_touch())
+    if not advanced:
+        session.refresh_from_db(fields=['received'])
+        raise OffsetMismatch(session.received)
+    session.received = offset + length
+    return session.received
+
+
+def finalize(session, sha256=''):
+    # Kiểm tra đủ byte và checksum rồi đưa file vào store; trả về tên file trong store.
+    # Nhận phiên (open -> finalizing) trước khi đụng tới file tạm: trong các request finalize chạy
+    # cùng lúc chỉ một bên đọc / chuyển file, các bên còn lại chờ rồi trả cùng tên file
+    if session.file_name:
+        return session.file_name
+    if session.status == UploadSession.STATUS_OPEN and session.received != session.size:
+        raise OffsetMismatch(session.received)
+    claimed = UploadSession.objects.filter(
+        id=session.id, status=UploadSession.STATUS_OPEN, received=session.size,
+    ).update(status=UploadSession.STATUS_FINALIZING, updated_at=_touch())
+    if not claimed:
+        return _wait_for_finalize(session, sha256)
+    session.status = UploadSession.STATUS_FINALIZING
+    path = staging_path(session)
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'r+b') as staging:
+            # Bỏ phần thừa của một chunk bị ngắt ở cuối (nếu có)
+            staging.truncate(session.size)
+            for data in iter(lambda: staging.read(1024 * 1024), b''):
+                digest.update(data)
+        actual = digest.hexdigest()
+        for expected in {session.sha256, (sha256 or '').lower()} - {''}:
+            if expected != actual:
+                # Nội dung hỏng: bỏ phiên, client upload lại từ đầu
+                abort(session)
+                raise UploadError('Checksum không khớp, hãy upload lại')
+        file_name = STORES[session.store].adopt(path, actual, session.size, session.file_ext)
+    except UploadError:
+        raise
+    except BaseException:
+        # Lỗi giữa chừng: trả phiên về trạng thái nhận để finalize lại được
+        UploadSession.objects.filter(id=session.id, status=UploadSession.STATUS_FINALIZING).update(
+            status=UploadSession.STATUS_OPEN,
+        )
+        session.status = UploadSession.STATUS_OPEN
+        raise
+    # Trạng thái và tên file ghi cùng một câu UPDATE: ai thấy complete cũng thấy file_name
+    UploadSession.objects.filter(id=session.id).update(
+        status=UploadSession.STATUS_COMPLETE, file_name=file_name, updated_at=_touch(),
+    )
+    session.status, session.file_name = UploadSession.STATUS_COMPLETE, file_name
+    return file_name
+
+
+def _wait_for_finalize(session, sha256):
+    # Request khác đã nhận phiên: đọc lại tới khi có file_name (tối đa UPLOAD_FINALIZE_WAIT giây)
+    deadline = time.monotonic() + settings.UPLOAD_FINALIZE_WAIT
+    while True:
+        try:
+            session.refresh_from_db()
+        except UploadSession.DoesNotExist:
+            # Bên kia thấy checksum sai và đã bỏ phiên
+            raise UploadError('Phiên upload đã bị hủy, hãy upload lại')
+        if session.file_name:
+            return session.file_name
+        if session.status == UploadSession.STATUS_OPEN:
+            # Chưa nhận đủ byte, hoặc bên kia lỗi và đã trả phiên lại
+            return finalize(session, sha256)
+        if time.monotonic() >= deadline:
+            raise UploadError('Phiên upload đang được finalize, hãy thử lại sau')
+        time.sleep(FINALIZE_POLL)
+
+
+def consume(upload_id, store='audio'):
+    # Gắn file của một phiên đã finalize vào một bản ghi (mỗi phiên dùng một lần); gọi trong
+    # transaction tạo / sửa bản ghi để phiên chỉ bị đánh dấu khi bản ghi đã lưu
+    session = UploadSession.objects.filter(id=upload_id, store=store).first()
+    if session is None:
+        raise UploadError('Phiên upload không tồn tại')
+    if session.status != UploadSession.STATUS_COMPLETE or not session.file_name:
+        raise UploadError('Phiên upload chưa finalize hoặc đã được dùng')
+    claimed = UploadSession.objects.filter(id=upload_id, status=UploadSession.STATUS_COMPLETE).update(
+        status=UploadSession.STATUS_USED, updated_at=_touch(),
+    )
+    if not claimed:
+        raise UploadError('Phiên upload đã được dùng')
+    return session.file_name
+
+
+def abort(session):
+    path = staging_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+    UploadSession.objects.filter(id=session.id).delete()
+
+
+def cleanup(max_age=None):
+    # Xóa phiên không cập nhật trong max_age giây: phiên đang nhận bị bỏ dở (kèm file tạm), phiên
+    # đã finalize nhưng không gắn vào bài hát (file trong store còn ref_count 0, gc_storage dọn)
+    # và phiên đã dùng. Cũng xóa file .part lạ không thuộc phiên nào. Trả về số phiên đã xóa.
+    max_age = settings.UPLOAD_SESSION_TIMEOUT if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    removed = 0
+    for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+        abort(session)
+        removed += 1
+    known = set(UploadSession.objects.values_list('id', flat=True))
+    directory = settings.UPLOAD_STAGING_DIR
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.removesuffix('.part') not in known and os.path.getmtime(path) < time.time() - max_age:
+                os.remove(path)
+    return removed
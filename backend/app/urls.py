@@ -1,23 +1,20 @@
 # backend/app/urls.py
 from django.urls import path
 from django.conf import settings
-from django.conf.urls.static import static
+from .stream_urls import SIGNED_PREFIX
 from .views import (
     create_vnpay_payment,
-    get_songs,
+    suggest_songs,
     get_playlists,
-    get_playlist,
     add_playlist,
     update_playlist,
     delete_playlist,
     get_playlist_songs,
     add_song_to_playlist,
     remove_song_from_playlist,
-    get_albums,
     add_album,
     update_album,
     change_album_status,
-    get_artists,
     add_artist,
     update_artist,
     change_artist_status,
@@ -27,33 +24,74 @@ from .views import (
     delete_user,
     changestatus_user,
     login_user,
+    get_current_user,
     add_song,
     get_messages_between_users,
     send_message,
     update_song,
     increment_play_count,
-    get_album_details,
     get_songs_by_album,
-    get_song_by_id,
+    stream_audio,
+    stream_signed_audio,
+    get_song_renditions,
+    stream_song,
     vnpay_return,
-    change_password
+    change_password,
+    get_catalog_cache_stats,
+    get_ratelimit_stats,
+    get_db_pool_stats,
+    get_inbox,
+    mark_messages_read,
+    get_chart,
+    get_stats,
+    get_users_by_date,
+    get_similar_songs,
+    get_radio,
+    start_catalog_import,
+    get_catalog_import,
+    resume_catalog_import,
+    start_upload,
+    get_upload,
+    upload_chunk,
+    finalize_upload,
+    abort_upload,
+    add_songs_to_playlist,
+    remove_songs_from_playlist,
+    reorder_playlist_songs,
 )
+from . import async_views, views
+
+# Các API đọc catalog có bản async (app/async_views.py), cùng đường dẫn và response; chọn theo CATALOG_ASYNC_VIEWS
+catalog_views = async_views if settings.CATALOG_ASYNC_VIEWS else views
 
 urlpatterns = [
     # Songs
-    path('api/songs/', get_songs, name='get_songs'),
+    path('api/songs/', catalog_views.get_songs, name='get_songs'),
+    path('api/songs/suggest/', suggest_songs, name='suggest_songs'),
     path('api/songs/add/', add_song, name='add_song'),
     path('api/songs/update/<int:song_id>/', update_song, name='update_song'),
     path('api/songs/<int:song_id>/increment_play_count/', increment_play_count, name='increment_play_count'),
     path('api/songs/album/<int:album_id>/', get_songs_by_album, name='get_songs_by_album'),
-    path('api/songs/<int:song_id>/', get_song_by_id, name='get_song_by_id'),
+    path('api/songs/<int:song_id>/', catalog_views.get_song_by_id, name='get_song_by_id'),
+    path('api/songs/<int:song_id>/renditions/', get_song_renditions, name='get_song_renditions'),
+    path('api/songs/<int:song_id>/stream/', stream_song, name='stream_song'),
+    path('api/songs/<int:song_id>/similar/', get_similar_songs, name='get_similar_songs'),
+
+    # Radio
+    path('api/radio/', get_radio, name='get_radio'),
+
+    # Bảng xếp hạng
+    path('api/charts/<str:period>/', get_chart, name='get_chart'),
     
     # Playlists
     path('api/playlists/', get_playlists, name='get_playlists'),
-    path('api/playlists/<int:pk>/', get_playlist, name='get_playlist'),
+    path('api/playlists/<int:pk>/', catalog_views.get_playlist, name='get_playlist'),
     path('api/playlists/add/', add_playlist, name='add_playlist'),
     path('api/playlists/update/<int:pk>/', update_playlist, name='update_playlist'),
     path('api/playlists/delete/<int:pk>/', delete_playlist, name='delete_playlist'),
+    path('api/playlists/<int:pk>/songs/add/', add_songs_to_playlist, name='add_songs_to_playlist'),
+    path('api/playlists/<int:pk>/songs/remove/', remove_songs_from_playlist, name='remove_songs_from_playlist'),
+    path('api/playlists/<int:pk>/songs/reorder/', reorder_playlist_songs, name='reorder_playlist_songs'),
     
     # Playlist Songs
     path('api/playlist/<int:playlist_id>/songs/', get_playlist_songs, name='get_playlist_songs'),
@@ -61,33 +99,57 @@ urlpatterns = [
     path('api/playlist_songs/<int:playlist_id>/<int:song_id>/', remove_song_from_playlist, name='remove_song_from_playlist'),
     
     # Album
-    path('api/albums/', get_albums, name='get_albums'),
+    path('api/albums/', catalog_views.get_albums, name='get_albums'),
     path('api/albums/add/', add_album, name='add_album'),
     path('api/albums/update/<int:album_id>/', update_album, name='update_album'),
     path('api/albums/change/<int:pk>/', change_album_status, name='change_album_status'),
-    path('api/albums/<int:pk>/', get_album_details, name='get-album-details'),
+    path('api/albums/<int:pk>/', catalog_views.get_album_details, name='get-album-details'),
     
     # Nghệ sĩ
-    path('api/artists/', get_artists, name='get_artists'),
+    path('api/artists/', catalog_views.get_artists, name='get_artists'),
     path('api/add-artist/', add_artist, name='add-artist'),
     path('api/artists/<int:pk>/', update_artist, name='update-artist'),
     path('api/artists/change/<int:pk>/', change_artist_status, name='change_artist_status'),
+    path('api/catalog-cache/stats/', get_catalog_cache_stats, name='get_catalog_cache_stats'),
+    path('api/ratelimit/stats/', get_ratelimit_stats, name='get_ratelimit_stats'),
+    path('api/db-pool/stats/', get_db_pool_stats, name='get_db_pool_stats'),
     
     # User
     path('api/users/', get_users, name='get_users'),
     path('api/user/add/', add_user, name='add_user'),
     path('api/users/<int:pk>/', update_user, name='update_user'),
     path('api/users/login/', login_user, name='login_user'),
+    path('api/users/me/', get_current_user, name='get_current_user'),
     path('api/delete-user/<int:pk>/', delete_user, name='delete_user'),
     path('api/users/<int:pk>/toggle-status/', changestatus_user, name='changestatus_user'),
     path('api/change-password/<int:pk>/', change_password, name='change_password'),
 
+    # Thống kê (Dashboard)
+    path('api/stats/', get_stats, name='get_stats'),
+    path('api/stats/users-by-date/', get_users_by_date, name='get_users_by_date'),
+
+    # Import catalog hàng loạt
+    path('api/catalog/imports/', start_catalog_import, name='start_catalog_import'),
+    path('api/catalog/imports/<int:job_id>/', get_catalog_import, name='get_catalog_import'),
+    path('api/catalog/imports/<int:job_id>/resume/', resume_catalog_import, name='resume_catalog_import'),
+
+    # Upload file audio chia nhỏ
+    path('api/uploads/', start_upload, name='start_upload'),
+    path('api/uploads/<str:upload_id>/', get_upload, name='get_upload'),
+    path('api/uploads/<str:upload_id>/chunk/', upload_chunk, name='upload_chunk'),
+    path('api/uploads/<str:upload_id>/finalize/', finalize_upload, name='finalize_upload'),
+    path('api/uploads/<str:upload_id>/abort/', abort_upload, name='abort_upload'),
+
     #message
     path('api/messages/', get_messages_between_users, name='get_messages_between_users'),
     path('api/send_message/', send_message, name='send_message'),
+    path('api/messages/inbox/', get_inbox, name='get_inbox'),
+    path('api/messages/read/', mark_messages_read, name='mark_messages_read'),
 
     path('api/vnpay/create/', create_vnpay_payment, name='create_vnpay_payment'),
     path('api/vnpay/return/', vnpay_return, name='vnpay_return'),
-]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+
+    # Audio
+    path(f"{settings.MEDIA_URL.strip('/')}/{SIGNED_PREFIX}/<str:token>/<path:file_name>", stream_signed_audio, name='stream_signed_audio'),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:file_name>", stream_audio, name='stream_audio'),
+]
\ No newline at end of file
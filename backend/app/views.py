@@ -2,44 +2,114 @@ import os
 import time
 from django.conf import settings
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework import status
+from django.views.decorators.http import require_http_methods
 import hashlib
 import hmac
 import urllib.parse
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils import timezone
 import pytz
 from .models import User
 from .serializers import UserSerializer
-from .models import Song, Playlist, PlaylistSong, Album, Artist, User, Message
-from django.db.models import Q
+from .models import Song, Playlist, PlaylistSong, Album, Artist, User, Message, Conversation, ImportJob, UploadSession
+from django.db import transaction
+from .pagination import MessageHistoryPagination, PlaylistSongCursorPagination, SongCursorPagination
+from . import search
+from .playcounts import record_play, pending_plays
+from .streaming import serve_audio
+from .storage import audio_store, album_cover_store
+from . import audiometa, thumbnails, transcoding, uploads
+from .db import pool as db_pool
+from . import auth, catalog_cache, catalog_import, charts, playlists, radio, ratelimit, realtime, recommendations, stats, stream_urls
+from .catalog_cache import cached_response
+from .stream_urls import with_stream_urls
+from django.http import HttpResponseForbidden, HttpResponseRedirect
 from .serializers import (
     SongSerializer,
+    SongRenditionSerializer,
     PlaylistSerializer,
+    PlaylistDetailSerializer,
     PlaylistSongSerializer,
     AlbumsSerializer,
     ArtistSerializer,
     UserSerializer,
     MessageSerializer,
+    ConversationSerializer,
+    ImportJobSerializer,
+    UploadSessionSerializer,
 )
 
+def song_listing(request, ranking):
+    # Phần chung của get_songs (bản sync và bản async trong app/async_views.py): đọc fields= và tham
+    # số phân trang, dựng queryset. Trả về (response lỗi hoặc None, fields, queryset, paginator)
+    paginator = SongCursorPagination(request, ranking) if SongCursorPagination.is_requested(request) else None
+
+    fields = request.GET.get('fields')
+    if fields:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(fields) - set(SongSerializer.Meta.fields)
+        if unknown:
+            error = Response({'error': f'Trường không hợp lệ: {", ".join(sorted(unknown))}'}, status=status.HTTP_400_BAD_REQUEST)
+            return error, None, None, None
+    elif paginator:
+        fields = [field for field in SongSerializer.Meta.fields if field not in SongSerializer.HEAVY_FIELDS]
+    else:
+        fields = None
+
+    columns = fields
+    if paginator:
+        # Cột dùng làm cursor phải được SELECT dù client không yêu cầu
+        columns = set(fields) | {'play_count'}
+    songs = Song.objects.for_listing(columns)
+    if ranking is not None:
+        songs = songs.filter(id__in=ranking)
+    return None, fields, songs, paginator
+
+
+def in_ranking_order(by_id, ranking):
+    return [by_id[song_id] for song_id in ranking if song_id in by_id]
+
 # Lấy danh sách tất cả bài hát
+# Tham số tùy chọn: search= tìm qua chỉ mục (không dấu, xếp theo độ liên quan);
+# fields=id,name,... chỉ trả về (và chỉ SELECT) các trường này;
+# limit / cursor / order=id|play_count|relevance bật phân trang, trả về {results, next_cursor}
 @api_view(['GET'])
+@with_stream_urls
+@cached_response('songs')
 def get_songs(request):
     search_query = request.GET.get('search', '').strip()
-    songs = Song.objects.all()
-    if search_query:
-        songs = songs.filter(
-            Q(name__icontains=search_query) |
-            Q(artist__name__icontains=search_query)
-        )
-    serializer = SongSerializer(songs, many=True)
+    ranking = search.search_song_ids(search_query) if search_query else None
+    error, fields, songs, paginator = song_listing(request, ranking)
+    if error:
+        return error
+    if paginator:
+        page = paginator.paginate_queryset(songs)
+        serializer = SongSerializer(page, many=True, fields=fields)
+        return Response(paginator.get_paginated_data(serializer.data))
+    if ranking is not None:
+        songs = in_ranking_order(songs.in_bulk(ranking), ranking)
+    serializer = SongSerializer(songs, many=True, fields=fields)
     return Response(serializer.data)
 
+# Gợi ý bài hát khi đang gõ (từ cuối được khớp theo tiền tố)
 @api_view(['GET'])
+def suggest_songs(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response([])
+    ranking = search.search_song_ids(query, limit=settings.SEARCH_SUGGEST_LIMIT)
+    by_id = Song.objects.for_listing(['id', 'name', 'artist_name', 'album_img']).in_bulk(ranking)
+    songs = [by_id[song_id] for song_id in ranking if song_id in by_id]
+    serializer = SongSerializer(songs, many=True, fields=['id', 'name', 'artist_name', 'album_img'])
+    return Response(serializer.data)
+
+@api_view(['GET'])
+@with_stream_urls
 def get_songs_by_album(request, album_id):
     # Lọc các bài hát có album_id khớp với album_id truyền vào
-    songs = Song.objects.filter(album_id=album_id)
+    songs = Song.objects.for_listing().filter(album_id=album_id)
     
     if not songs.exists():
         return Response({'message': 'Không có bài hát nào thuộc album này'}, status=status.HTTP_404_NOT_FOUND)
@@ -55,57 +125,59 @@ def add_song(request):
     name = request.data.get('name')
     artist_id = request.data.get('artist')
     album_id = request.data.get('album')
-    duration = request.data.get('duration', 1)
+    # Thời lượng client gửi chỉ là giá trị tạm: audiometa đọc lại từ file rồi ghi đè sau khi lưu.
+    # Không gửi thì lưu 0 (chưa biết) tới lúc đó
+    duration = request.data.get('duration') or 0
     status_value = request.data.get('status', 1)
     song_url = request.FILES.get('song')
+    # Thay cho file multipart: id của một phiên upload chia nhỏ đã finalize (app/uploads.py)
+    upload_id = request.data.get('upload_id')
     premium = request.data.get('premium')
     lyrics = request.data.get('lyrics')
 
-    if not all([name, artist_id, duration, song_url]):
+    if not all([name, artist_id]) or not (song_url or upload_id):
         return Response({'error': 'Thiếu thông tin bắt buộc'}, status=status.HTTP_400_BAD_REQUEST)
-
-    file_name = song_url.name
-    song_dir = os.path.join(settings.BASE_DIR, 'audio')
-
     try:
-        os.makedirs(song_dir, exist_ok=True)
-    except Exception as e:
-        return Response({'error': f'Lỗi tạo thư mục audio: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    if not os.access(song_dir, os.W_OK):
-        return Response({'error': 'Không có quyền ghi vào thư mục audio'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    file_path = os.path.join(song_dir, file_name)
-    if os.path.exists(file_path):
-        base, ext = os.path.splitext(file_name)
-        file_name = f"{base}_{int(time.time())}{ext}"
-        file_path = os.path.join(song_dir, file_name)
+        duration = max(int(duration), 0)
+    except (TypeError, ValueError):
+        return Response({'error': 'duration phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        with open(file_path, 'wb+') as destination:
-            for chunk in song_url.chunks():
-                destination.write(chunk)
-    except Exception as e:
-        return Response({'error': f'Lỗi khi lưu file nhạc: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Lưu theo nội dung file (app/storage.py): upload trùng nội dung dùng chung một file
+    file_name = None
+    if song_url:
+        try:
+            file_name = audio_store.save(song_url)
+        except Exception as e:
+            return Response({'error': f'Lỗi khi lưu file nhạc: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     try:
         artist = Artist.objects.get(id=artist_id)
         album = Album.objects.get(id=album_id) if album_id else None
 
-        song = Song.objects.create(
-            name=name,
-            artist=artist,
-            album=album,
-            duration=duration,
-            song_url=file_name,
-            status=status_value,
-            premium=premium,
-            lyrics=lyrics
-        )
+        with transaction.atomic():
+            if not song_url:
+                file_name = uploads.consume(upload_id)
+            song = Song.objects.create(
+                name=name,
+                artist=artist,
+                album=album,
+                duration=duration,
+                song_url=file_name,
+                status=status_value,
+                premium=premium,
+                lyrics=lyrics
+            )
+            audio_store.acquire(file_name)
+            stats.increment(stats.SONGS)
+        search.index_song(song)
+        transcoding.enqueue_song(song.id)
+        audiometa.enqueue_song(song.id, song.song_url)
     except Artist.DoesNotExist:
         return Response({'error': 'Artist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
     except Album.DoesNotExist:
         return Response({'error': 'Album không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': f'Lỗi tạo bài hát: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -122,6 +194,7 @@ def update_song(request, song_id):
     status_value = request.data.get('status', 1)
     premium = request.data.get('premium')
     song_url = request.FILES.get('song')
+    upload_id = request.data.get('upload_id')
     lyrics = request.data.get('lyrics')
 
     if not all([name, artist_id, duration]):
@@ -139,41 +212,13 @@ def update_song(request, song_id):
     except Song.DoesNotExist:
         return Response({'error': 'Bài hát không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Xử lý file âm thanh mới (nếu có)
+    # Xử lý file âm thanh mới (nếu có); file cũ chỉ bị giảm tham chiếu, không xóa vì
+    # có thể bài hát khác đang dùng chung - gc_storage sẽ dọn khi không còn ai dùng
     file_name = None
+    old_file_name = song.song_url
     if song_url:
-        file_name = song_url.name
-        song_dir = os.path.join(settings.BASE_DIR, 'audio')
-
-        try:
-            os.makedirs(song_dir, exist_ok=True)
-        except Exception as e:
-            return Response({'error': f'Lỗi tạo thư mục audio: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        if not os.access(song_dir, os.W_OK):
-            return Response({'error': 'Không có quyền ghi vào thư mục audio'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Xóa file âm thanh cũ nếu tồn tại
-        if song.song_url:
-            old_file_path = os.path.join(song_dir, song.song_url)
-            if os.path.exists(old_file_path):
-                try:
-                    os.remove(old_file_path)
-                except Exception as e:
-                    return Response({'error': f'Lỗi xóa file âm thanh cũ: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Kiểm tra và tạo tên file mới
-        file_path = os.path.join(song_dir, file_name)
-        if os.path.exists(file_path):
-            base, ext = os.path.splitext(file_name)
-            file_name = f"{base}_{int(time.time())}{ext}"
-            file_path = os.path.join(song_dir, file_name)
-
-        # Lưu file âm thanh mới
         try:
-            with open(file_path, 'wb+') as destination:
-                for chunk in song_url.chunks():
-                    destination.write(chunk)
+            file_name = audio_store.save(song_url)
         except Exception as e:
             return Response({'error': f'Lỗi khi lưu file nhạc: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -189,14 +234,28 @@ def update_song(request, song_id):
         song.status = status_value
         song.premium = premium
         song.lyrics=lyrics
-        if file_name:
-            song.song_url = file_name
-        song.save()
+        with transaction.atomic():
+            if upload_id and not song_url:
+                file_name = uploads.consume(upload_id)
+            if file_name:
+                song.song_url = file_name
+            song.save()
+            if file_name:
+                audio_store.acquire(file_name)
+                audio_store.release(old_file_name)
+        search.index_song(song)
+        if file_name and file_name != old_file_name:
+            # File gốc đã đổi: bỏ các bản chuyển mã cũ và chuyển mã lại
+            transcoding.delete_renditions(song)
+            transcoding.enqueue_song(song.id)
+            audiometa.enqueue_song(song.id, song.song_url)
 
     except Artist.DoesNotExist:
         return Response({'error': 'Artist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
     except Album.DoesNotExist:
         return Response({'error': 'Album không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': f'Lỗi cập nhật bài hát: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -205,10 +264,11 @@ def update_song(request, song_id):
 
 #Lấy thông tin của một bài hát bằng id
 @api_view(['GET'])
+@with_stream_urls
 def get_song_by_id(request, song_id):
     try:
         # Tìm bài hát theo id
-        song = Song.objects.get(id=song_id)
+        song = Song.objects.for_listing().get(id=song_id)
     except Song.DoesNotExist:
         return Response({'message': 'Không tìm thấy bài hát'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -218,25 +278,186 @@ def get_song_by_id(request, song_id):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 #Update lượt nghe của bài hát
+# Lượt nghe được gom trong bộ nhớ và ghi theo lô (app/playcounts.py), request chỉ đọc một dòng theo khóa chính
 @api_view(['POST'])
+@throttle_classes([ratelimit.PlayRateLimit])
 def increment_play_count(request, song_id):
-    try:
-        song = Song.objects.get(id=song_id)
-        song.play_count += 1
-        song.save()
-        return Response({'message': 'Play count updated successfully.', 'play_count': song.play_count})
-    except Song.DoesNotExist:
+    play_count = Song.objects.filter(id=song_id).values_list('play_count', flat=True).first()
+    if play_count is None:
         return Response({'error': 'Song not found.'}, status=404)
+    record_play(song_id, auth.resolve_user_id(request, request.data.get('user_id')))
+    return Response({'message': 'Play count updated successfully.', 'play_count': play_count + pending_plays(song_id)})
     
+# Danh sách các bản chuyển mã (bitrate) của một bài hát. URL là link phát có chữ ký theo gói của người
+# gọi (token hoặc user_id); bài Premium trả 403 cho tài khoản thường
+@api_view(['GET'])
+def get_song_renditions(request, song_id):
+    try:
+        song = Song.objects.only('id', 'song_url', 'premium').get(id=song_id)
+    except Song.DoesNotExist:
+        return Response({'message': 'Không tìm thấy bài hát'}, status=status.HTTP_404_NOT_FOUND)
+    is_premium = auth.user_is_premium(request, auth.resolve_user_id(request, request.GET.get('user_id')))
+    if stream_urls.url_for(song.song_url, song.id, song.premium, is_premium) is None:
+        return Response({'error': 'Bài hát chỉ dành cho tài khoản Premium'}, status=status.HTTP_403_FORBIDDEN)
+
+    def media_url(file_name):
+        return stream_urls.url_for(file_name, song.id, song.premium, is_premium)
+
+    renditions = song.renditions.order_by('bitrate')
+    return Response({
+        'original': media_url(song.song_url),
+        'renditions': SongRenditionSerializer(renditions, many=True, context={'media_url': media_url}).data,
+    })
+
+# Chuyển hướng tới bản phát phù hợp: theo gói (token hoặc user_id -> isPremium), ?quality=low|normal|high
+# và client hint Save-Data / Downlink; chưa có bản chuyển mã thì phát file gốc. Đích là link có chữ ký
+# (app/stream_urls.py); bài Premium trả 403 cho tài khoản thường
+@api_view(['GET'])
+def stream_song(request, song_id):
+    try:
+        song = Song.objects.only('id', 'song_url', 'premium').get(id=song_id)
+    except Song.DoesNotExist:
+        return Response({'message': 'Không tìm thấy bài hát'}, status=status.HTTP_404_NOT_FOUND)
+    is_premium = auth.user_is_premium(request, auth.resolve_user_id(request, request.GET.get('user_id')))
+    rendition = transcoding.pick_rendition(song, transcoding.max_bitrate_for(request, is_premium))
+    file_name = rendition.file_name if rendition else song.song_url
+    url = stream_urls.url_for(file_name, song.id, song.premium, is_premium)
+    if url is None:
+        return Response({'error': 'Bài hát chỉ dành cho tài khoản Premium'}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponseRedirect(url)
+
+# Phát file âm thanh (hỗ trợ tua bằng Range, cache bằng ETag), thay cho static() chỉ chạy khi DEBUG.
+# Khi AUDIO_SIGNED_URLS_REQUIRED chỉ phát qua link có chữ ký (stream_signed_audio)
+@require_http_methods(['GET', 'HEAD'])
+def stream_audio(request, file_name):
+    if settings.AUDIO_SIGNED_URLS_REQUIRED:
+        return HttpResponseForbidden('Cần link phát có chữ ký (stream_url trong API bài hát)')
+    return serve_audio(request, file_name)
+
+# Phát file qua link có chữ ký: kiểm tra HMAC và hạn trong token, không query DB (app/stream_urls.py)
+@require_http_methods(['GET', 'HEAD'])
+def stream_signed_audio(request, token, file_name):
+    try:
+        stream_urls.verify(token, file_name)
+    except stream_urls.StreamUrlError as exc:
+        return HttpResponseForbidden(str(exc))
+    return serve_audio(request, file_name)
+
+# Bài hát tương tự (cùng xuất hiện trong các playlist): tra chỉ mục đã tính sẵn theo id bài hát
+# (app/recommendations.py) rồi lấy thông tin bài bằng một query
+@api_view(['GET'])
+@with_stream_urls
+def get_similar_songs(request, song_id):
+    try:
+        limit = min(int(request.GET.get('limit', settings.RECOMMENDATIONS_TOP_K)), settings.RECOMMENDATIONS_TOP_K)
+    except ValueError:
+        return Response({'error': 'limit phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    neighbors = recommendations.similar_songs(song_id, max(limit, 0))
+    songs = Song.objects.select_related('artist', 'album').in_bulk([neighbor for neighbor, _ in neighbors])
+    fields = [field for field in SongSerializer.Meta.fields if field not in SongSerializer.HEAVY_FIELDS]
+    results = []
+    for neighbor, score in neighbors:
+        # Bài đã bị xóa sau lần tính gần nhất thì bỏ qua
+        if neighbor in songs:
+            results.append({'song': SongSerializer(songs[neighbor], fields=fields).data, 'score': round(score, 4)})
+    return Response({'song_id': song_id, 'results': results})
+
+# Radio: trang đầu cần seed_type (song | artist | playlist) và seed_id, tùy chọn user_id, limit và
+# recent= (id các bài vừa phát ở client, cách nhau bởi dấu phẩy); các trang sau chỉ cần session=
+@api_view(['GET'])
+@with_stream_urls
+def get_radio(request):
+    try:
+        limit = min(int(request.GET.get('limit', settings.RADIO_PAGE_SIZE)), settings.RADIO_MAX_PAGE_SIZE)
+        user_id = auth.resolve_user_id(request, request.GET.get('user_id'))
+        recent = [int(value) for value in request.GET.get('recent', '').split(',') if value]
+    except ValueError:
+        return Response({'error': 'limit / user_id / recent phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    token = request.GET.get('session')
+    if token:
+        session = radio.load_session(token)
+        if session is None:
+            return Response({'error': 'Phiên radio không tồn tại hoặc đã hết hạn'}, status=status.HTTP_404_NOT_FOUND)
+    else:
+        seed_type = request.GET.get('seed_type')
+        if seed_type not in radio.SEED_TYPES:
+            return Response({'error': f'seed_type phải là một trong: {", ".join(radio.SEED_TYPES)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            session = radio.new_session(seed_type, int(request.GET.get('seed_id', '')), user_id)
+        except ValueError:
+            return Response({'error': 'seed_id phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+        except radio.SeedNotFound:
+            return Response({'error': 'Không tìm thấy bài hát cho seed này'}, status=status.HTTP_404_NOT_FOUND)
+        session['history'] += recent
+    user_id = session['user_id']
+    caller = auth.current_user(request)
+    is_premium = False
+    if caller is not None and caller.id == user_id:
+        # Token đã kiểm tra status / isPremium (thường lấy từ cache, không query)
+        is_premium = caller.isPremium
+    elif user_id is not None:
+        is_premium = User.objects.filter(id=user_id, status=1).values_list('isPremium', flat=True).first()
+        if is_premium is None:
+            return Response({'error': 'User không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    page, timed_out = radio.next_page(session, max(limit, 1), is_premium)
+    radio.save_session(session)
+    fields = [field for field in SongSerializer.Meta.fields if field not in SongSerializer.HEAVY_FIELDS]
+    songs = Song.objects.for_listing(fields).in_bulk(page)
+    return Response({
+        'session': session['token'],
+        'seed_type': session['seed_type'],
+        'seed_id': session['seed_id'],
+        'results': SongSerializer([songs[song_id] for song_id in page if song_id in songs], many=True, fields=fields).data,
+        'timed_out': timed_out,
+    })
+
+# Bảng xếp hạng bài hát: period = day | week | all, tùy chọn artist= / album= và limit=
+# Đọc thẳng top-N đã tính sẵn (app/charts.py), không sắp xếp bảng songs
+@api_view(['GET'])
+@with_stream_urls
+def get_chart(request, period):
+    if period not in charts.PERIODS:
+        return Response({'error': f'period phải là một trong: {", ".join(charts.PERIODS)}'}, status=status.HTTP_404_NOT_FOUND)
+    scope, scope_id = None, None
+    for name in charts.SCOPES:
+        if request.GET.get(name):
+            if name not in settings.CHARTS_SCOPES:
+                return Response({'error': f'Không có bảng xếp hạng theo {name}'}, status=status.HTTP_400_BAD_REQUEST)
+            scope, scope_id = name, request.GET[name]
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        scope_id = int(scope_id) if scope_id is not None else None
+    except ValueError:
+        return Response({'error': 'limit / artist / album phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    entries = charts.get_chart(period, scope, scope_id, limit)
+    fields = [field for field in SongSerializer.Meta.fields if field not in SongSerializer.HEAVY_FIELDS]
+    start = charts.period_start(period)
+    return Response({
+        'period': period,
+        'period_start': start.isoformat() if start else None,
+        'scope': scope,
+        'scope_id': scope_id,
+        'results': [
+            {'rank': entry.rank, 'plays': entry.plays, 'song': SongSerializer(entry.song, fields=fields).data}
+            for entry in entries
+        ],
+    })
+
 # Lấy danh sách playlist (chỉ của user đăng nhập hoặc rỗng nếu chưa đăng nhập)
 @api_view(['GET'])
 def get_playlists(request):
-    user_id = request.GET.get('user_id')
+    user_id = auth.resolve_user_id(request, request.GET.get('user_id'))
     search_query = request.GET.get('search', '').strip()
     playlists = Playlist.objects.filter(user_id=user_id) if user_id else Playlist.objects.none()
     if search_query:
-        playlists = playlists.filter(name__icontains=search_query)
-    serializer = PlaylistSerializer(playlists, many=True)
+        # Playlist đã được lọc theo user_id (có index) nên chỉ so khớp không dấu trên tên
+        # các playlist của user đó thay vì LIKE '%...%'
+        names = playlists.values_list('id', 'name')
+        playlists = playlists.filter(id__in=[pk for pk, name in names if search.matches(search_query, name)])
+    # Hai query cho mọi số lượng playlist: danh sách kèm tổng hợp, rồi ảnh bìa xem trước
+    playlists = list(playlists.with_summary().order_by('id'))
+    cover_images = PlaylistSong.objects.cover_images([playlist.id for playlist in playlists], settings.PLAYLIST_COVER_PREVIEW)
+    serializer = PlaylistSerializer(playlists, many=True, context={'cover_images': cover_images})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 # Thêm playlist mới
@@ -244,18 +465,26 @@ def get_playlists(request):
 def add_playlist(request):
     serializer = PlaylistSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            playlist = serializer.save()
+            if playlist.cover_image:
+                thumbnails.enqueue('playlist', playlist.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Lấy chi tiết một playlist
 @api_view(['GET'])
+@with_stream_urls
 def get_playlist(request, pk):
     try:
-        playlist = Playlist.objects.get(pk=pk)
+        playlist = Playlist.objects.with_summary().get(pk=pk)
     except Playlist.DoesNotExist:
         return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = PlaylistSerializer(playlist)
+    # summary=1: chỉ thông tin tóm tắt, bài hát đọc theo trang qua get_playlist_songs
+    if request.GET.get('summary') in ('1', 'true'):
+        serializer = PlaylistSerializer(playlist)
+    else:
+        serializer = PlaylistDetailSerializer(playlist)
     return Response(serializer.data)
 
 # Cập nhật playlist
@@ -267,8 +496,14 @@ def update_playlist(request, pk):
         return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
     serializer = PlaylistSerializer(playlist, data=request.data, partial=True)
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data)
+        old_cover_image = playlist.cover_image
+        with transaction.atomic():
+            playlist = serializer.save()
+            if playlist.cover_image != old_cover_image:
+                Playlist.objects.filter(pk=pk).update(cover_thumbnails={})
+                if playlist.cover_image:
+                    thumbnails.enqueue('playlist', playlist.id)
+        return Response(PlaylistSerializer(Playlist.objects.with_summary().get(pk=pk)).data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Xóa playlist
@@ -283,8 +518,14 @@ def delete_playlist(request, pk):
 
 # Lấy danh sách bài hát trong playlist
 @api_view(['GET'])
+@with_stream_urls
 def get_playlist_songs(request, playlist_id):
-    playlist_songs = PlaylistSong.objects.filter(playlist_id=playlist_id)
+    playlist_songs = PlaylistSong.objects.for_listing().filter(playlist_id=playlist_id).order_by('position', 'id')
+    if PlaylistSongCursorPagination.is_requested(request):
+        # limit / cursor: trả về {results, next_cursor} như /api/songs/
+        paginator = PlaylistSongCursorPagination(request)
+        page = paginator.paginate_queryset(playlist_songs)
+        return Response(paginator.get_paginated_data(PlaylistSongSerializer(page, many=True).data))
     serializer = PlaylistSongSerializer(playlist_songs, many=True)
     return Response(serializer.data)
 
@@ -296,32 +537,92 @@ def add_song_to_playlist(request):
     if not all([playlist_id, song_id]):
         return Response({'error': 'Thiếu thông tin playlist_id hoặc song_id'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        playlist = Playlist.objects.get(id=playlist_id)
-        song = Song.objects.get(id=song_id)
+        playlist_id, song_id = int(playlist_id), int(song_id)
+    except (TypeError, ValueError):
+        return Response({'error': 'playlist_id và song_id phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            added, existing, missing = playlists.add_songs(playlist_id, [song_id])
+            recommendations.enqueue_membership_change(playlist_id, added)
     except Playlist.DoesNotExist:
         return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-    except Song.DoesNotExist:
+    if missing:
         return Response({'error': 'Bài hát không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-    if PlaylistSong.objects.filter(playlist=playlist, song=song).exists():
+    if existing:
         return Response({'error': 'Bài hát đã có trong playlist'}, status=status.HTTP_400_BAD_REQUEST)
-    playlist_song = PlaylistSong.objects.create(playlist=playlist, song=song)
+    playlist_song = PlaylistSong.objects.get(playlist_id=playlist_id, song_id=song_id)
     serializer = PlaylistSongSerializer(playlist_song)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 # Xóa bài hát khỏi playlist
 @api_view(['DELETE'])
 def remove_song_from_playlist(request, playlist_id, song_id):
-    try:
-        playlist_song = PlaylistSong.objects.get(playlist_id=playlist_id, song_id=song_id)
-    except PlaylistSong.DoesNotExist:
+    with transaction.atomic():
+        removed = playlists.remove_songs(playlist_id, [song_id])
+        recommendations.enqueue_membership_change(playlist_id, removed)
+    if not removed:
         return Response({'error': 'Bài hát không có trong playlist'}, status=status.HTTP_404_NOT_FOUND)
-    playlist_song.delete()
     return Response({'message': 'Xóa bài hát khỏi playlist thành công'}, status=status.HTTP_204_NO_CONTENT)
 
+def _song_id_list(value):
+    if not isinstance(value, list) or not value:
+        raise ValueError
+    return [int(song_id) for song_id in value]
+
+# Thêm nhiều bài hát vào cuối playlist trong một transaction: {"song_ids": [...]}
+@api_view(['POST'])
+def add_songs_to_playlist(request, pk):
+    try:
+        song_ids = _song_id_list(request.data.get('song_ids'))
+    except (TypeError, ValueError):
+        return Response({'error': 'song_ids phải là danh sách id bài hát'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            added, existing, missing = playlists.add_songs(pk, song_ids)
+            recommendations.enqueue_membership_change(pk, added)
+    except Playlist.DoesNotExist:
+        return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'added': added, 'existing': existing, 'missing': missing})
+
+# Xóa nhiều bài hát khỏi playlist trong một transaction: {"song_ids": [...]}
+@api_view(['POST'])
+def remove_songs_from_playlist(request, pk):
+    try:
+        song_ids = _song_id_list(request.data.get('song_ids'))
+    except (TypeError, ValueError):
+        return Response({'error': 'song_ids phải là danh sách id bài hát'}, status=status.HTTP_400_BAD_REQUEST)
+    with transaction.atomic():
+        removed = playlists.remove_songs(pk, song_ids)
+        recommendations.enqueue_membership_change(pk, removed)
+    return Response({'removed': removed})
+
+# Đổi thứ tự bài hát: {"moves": [{"song_id": 5, "after": 3}, ...]} áp dụng lần lượt, after = null
+# đưa bài lên đầu; mỗi lần chuyển thường chỉ sửa position của một dòng
+@api_view(['POST'])
+def reorder_playlist_songs(request, pk):
+    moves = request.data.get('moves')
+    try:
+        if not isinstance(moves, list) or not moves:
+            raise ValueError
+        moves = [
+            (int(move['song_id']), int(move['after']) if move.get('after') is not None else None)
+            for move in moves
+        ]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return Response({'error': 'moves phải là danh sách {song_id, after}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        order = playlists.move_songs(pk, moves)
+    except Playlist.DoesNotExist:
+        return Response({'error': 'Playlist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    except playlists.NotInPlaylist as e:
+        return Response({'error': f'Bài hát {e.song_id} không có trong playlist'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'song_ids': order})
+
 # Lấy danh sách album
 @api_view(['GET'])
+@cached_response('albums')
 def get_albums(request):
-    albums = Album.objects.all()
+    albums = Album.objects.select_related('artist')
     serializer = AlbumsSerializer(albums, many=True)
     return Response(serializer.data)
 
@@ -337,35 +638,23 @@ def add_album(request):
         return Response({'error': 'Thiếu thông tin bắt buộc'}, status=status.HTTP_400_BAD_REQUEST)
     file_name = None
     if image_file:
-        project_root = os.path.dirname(settings.BASE_DIR)
-        upload_dir = os.path.join(project_root, 'frontend', 'uploads', 'albums')
         try:
-            os.makedirs(upload_dir, exist_ok=True)
-        except Exception as e:
-            return Response({'error': f'Lỗi khi tạo thư mục: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if not os.access(upload_dir, os.W_OK):
-            return Response({'error': 'Không có quyền ghi vào thư mục frontend/uploads/albums'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        file_name = image_file.name
-        file_path = os.path.join(upload_dir, file_name)
-        if os.path.exists(file_path):
-            base, ext = os.path.splitext(file_name)
-            file_name = f"{base}_{int(time.time())}{ext}"
-            file_path = os.path.join(upload_dir, file_name)
-        try:
-            with open(file_path, 'wb+') as destination:
-                for chunk in image_file.chunks():
-                    destination.write(chunk)
+            file_name = album_cover_store.save(image_file)
         except Exception as e:
             return Response({'error': f'Lỗi khi lưu file: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     try:
         artist = Artist.objects.get(id=artist_id)
-        album = Album.objects.create(
-            name=name,
-            created_at=created_at,
-            artist=artist,
-            cover_image=file_name,
-            status=status_value
-        )
+        with transaction.atomic():
+            album = Album.objects.create(
+                name=name,
+                created_at=created_at,
+                artist=artist,
+                cover_image=file_name,
+                status=status_value
+            )
+            album_cover_store.acquire(file_name)
+            if file_name:
+                thumbnails.enqueue('album', album.id)
     except Artist.DoesNotExist:
         return Response({'error': 'Artist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -397,37 +686,27 @@ def update_album(request, album_id):
             return Response({'error': 'Artist không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
     if status_value is not None:
         album.status = status_value
+    old_cover_image = album.cover_image
+    new_cover_image = None
     if image_file:
-        project_root = os.path.dirname(settings.BASE_DIR)
-        upload_dir = os.path.join(project_root, 'frontend', 'uploads', 'albums')
-        try:
-            os.makedirs(upload_dir, exist_ok=True)
-        except Exception as e:
-            return Response({'error': f'Lỗi khi tạo thư mục: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if not os.access(upload_dir, os.W_OK):
-            return Response({'error': 'Không có quyền ghi vào thư mục frontend/uploads/albums'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if album.cover_image:
-            old_file_path = os.path.join(upload_dir, album.cover_image)
-            if os.path.exists(old_file_path):
-                try:
-                    os.remove(old_file_path)
-                except Exception as e:
-                    return Response({'error': f'Lỗi khi xóa file cũ: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        file_name = image_file.name
-        file_path = os.path.join(upload_dir, file_name)
-        if os.path.exists(file_path):
-            base, ext = os.path.splitext(file_name)
-            file_name = f"{base}_{int(time.time())}{ext}"
-            file_path = os.path.join(upload_dir, file_name)
         try:
-            with open(file_path, 'wb+') as destination:
-                for chunk in image_file.chunks():
-                    destination.write(chunk)
-            album.cover_image = file_name
+            new_cover_image = album_cover_store.save(image_file)
         except Exception as e:
             return Response({'error': f'Lỗi khi lưu file: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        album.cover_image = new_cover_image
+        if new_cover_image != old_cover_image:
+            # Ảnh thu nhỏ của ảnh cũ không còn đúng; client dùng ảnh gốc tới khi bản mới tạo xong
+            album.cover_thumbnails = {}
     try:
-        album.save()
+        with transaction.atomic():
+            album.save()
+            if new_cover_image:
+                album_cover_store.acquire(new_cover_image)
+                album_cover_store.release(old_cover_image)
+                if new_cover_image != old_cover_image:
+                    thumbnails.enqueue('album', album.id)
+        if name:
+            search.reindex_album(album)
     except Exception as e:
         return Response({'error': f'Lỗi khi cập nhật album: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     serializer = AlbumsSerializer(album)
@@ -446,6 +725,7 @@ def change_album_status(request, pk):
 
 #Lấy chi tiết của một album
 @api_view(['GET'])
+@cached_response('albums')
 def get_album_details(request, pk):
     try:
         # Fetch the album by its primary key (id)
@@ -462,6 +742,7 @@ def get_album_details(request, pk):
 
 # Lấy danh sách nghệ sĩ
 @api_view(['GET'])
+@cached_response('artists')
 def get_artists(request):
     artists = Artist.objects.all()
     serializer = ArtistSerializer(artists, many=True)
@@ -472,7 +753,9 @@ def get_artists(request):
 def add_artist(request):
     serializer = ArtistSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            stats.increment(stats.ARTISTS)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -486,6 +769,8 @@ def update_artist(request, pk):
     serializer = ArtistSerializer(artist, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        if 'name' in serializer.validated_data:
+            search.reindex_artist(artist)
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -500,6 +785,163 @@ def change_artist_status(request, pk):
     artist.save()
     return Response({'message': 'Cập nhật trạng thái thành công', 'trangThai': artist.status}, status=status.HTTP_200_OK)
 
+# Số lần trúng / trượt cache catalog của tiến trình này
+@api_view(['GET'])
+def get_catalog_cache_stats(request):
+    return Response(catalog_cache.stats())
+
+# Số request được cho qua / bị chặn theo scope giới hạn tần suất của tiến trình này
+@api_view(['GET'])
+def get_ratelimit_stats(request):
+    return Response(ratelimit.stats())
+
+# Số kết nối đang dùng / rảnh, số lần mở mới / dùng lại / chờ của từng pool DB trong tiến trình này
+@api_view(['GET'])
+def get_db_pool_stats(request):
+    return Response(db_pool.stats())
+
+# Thống kê tổng cho Dashboard, đọc từ bộ đếm (app/stats.py)
+@api_view(['GET'])
+def get_stats(request):
+    totals = stats.totals()
+    return Response({
+        'total_songs': totals[stats.SONGS],
+        'total_users': totals[stats.USERS],
+        'total_artists': totals[stats.ARTISTS],
+    })
+
+# Số user mới theo ngày cho biểu đồ Dashboard; days= giới hạn số ngày gần nhất
+@api_view(['GET'])
+def get_users_by_date(request):
+    since = None
+    if request.GET.get('days'):
+        try:
+            since = timezone.localdate() - timedelta(days=int(request.GET['days']) - 1)
+        except ValueError:
+            return Response({'error': 'days phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(stats.users_by_date(since))
+
+# Import catalog hàng loạt chạy nền (app/catalog_import.py): manifest và audio_dir là đường dẫn
+# trên server, tương đối so với CATALOG_IMPORT_ROOT và không được ra ngoài thư mục đó
+@api_view(['POST'])
+def start_catalog_import(request):
+    manifest = request.data.get('manifest')
+    audio_dir = request.data.get('audio_dir')
+    if not all([manifest, audio_dir]):
+        return Response({'error': 'Thiếu thông tin manifest hoặc audio_dir'}, status=status.HTTP_400_BAD_REQUEST)
+    root = str(settings.CATALOG_IMPORT_ROOT)
+    manifest, audio_dir = os.path.join(root, manifest), os.path.join(root, audio_dir)
+    if not (catalog_import.inside(root, manifest) and catalog_import.inside(root, audio_dir)):
+        return Response({'error': 'Đường dẫn phải nằm trong thư mục import'}, status=status.HTTP_400_BAD_REQUEST)
+    if not os.path.isfile(manifest) or not os.path.isdir(audio_dir):
+        return Response({'error': 'Không tìm thấy manifest hoặc thư mục audio'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        catalog_import.read_manifest(manifest)
+    except catalog_import.ManifestError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    job = ImportJob.objects.create(manifest=manifest, audio_dir=audio_dir)
+    catalog_import.start(job)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+# Tiến độ của một lần import
+@api_view(['GET'])
+def get_catalog_import(request, job_id):
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return Response({'error': 'Job import không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ImportJobSerializer(job).data)
+
+# Chạy tiếp một lần import bị lỗi từ sau lô cuối đã ghi
+@api_view(['POST'])
+def resume_catalog_import(request, job_id):
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return Response({'error': 'Job import không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status == ImportJob.STATUS_DONE:
+        return Response({'error': 'Job import đã hoàn tất'}, status=status.HTTP_400_BAD_REQUEST)
+    if catalog_import.is_active(job.id):
+        return Response({'error': 'Job import đang chạy'}, status=status.HTTP_409_CONFLICT)
+    catalog_import.start(job)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+# Upload file audio chia nhỏ, tiếp tục được (app/uploads.py): {size, file_name, sha256?}
+@api_view(['POST'])
+def start_upload(request):
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'size phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        session = uploads.start(size, request.data.get('file_name'), request.data.get('sha256'))
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+def _get_upload(upload_id):
+    return UploadSession.objects.filter(id=upload_id).first()
+
+def _upload_conflict(session, error):
+    # 409 kèm offset server đang chờ để client gửi tiếp từ đó
+    data = UploadSessionSerializer(session).data
+    data['error'] = str(error)
+    data['received'] = error.offset
+    return Response(data, status=status.HTTP_409_CONFLICT)
+
+# Trạng thái phiên upload; sau khi mất kết nối client đọc received để biết gửi tiếp từ đâu
+@api_view(['GET'])
+def get_upload(request, upload_id):
+    session = _get_upload(upload_id)
+    if session is None:
+        return Response({'error': 'Phiên upload không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(UploadSessionSerializer(session).data)
+
+# Gửi một chunk: PUT ?offset=N, thân request là byte thô (application/octet-stream), đọc thẳng từ
+# stream vào file tạm chứ không nạp cả chunk vào bộ nhớ
+@api_view(['PUT'])
+def upload_chunk(request, upload_id):
+    session = _get_upload(upload_id)
+    if session is None:
+        return Response({'error': 'Phiên upload không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({'error': 'offset phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        uploads.write_chunk(session, offset, request.stream, length)
+    except uploads.OffsetMismatch as e:
+        return _upload_conflict(session, e)
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(UploadSessionSerializer(session).data)
+
+# Kết thúc upload: kiểm tra đủ byte và sha256 rồi đưa file vào thư mục audio; {sha256?}
+@api_view(['POST'])
+def finalize_upload(request, upload_id):
+    session = _get_upload(upload_id)
+    if session is None:
+        return Response({'error': 'Phiên upload không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        uploads.finalize(session, request.data.get('sha256'))
+    except uploads.OffsetMismatch as e:
+        return _upload_conflict(session, e)
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(UploadSessionSerializer(session).data)
+
+# Hủy phiên upload và xóa file tạm
+@api_view(['DELETE'])
+def abort_upload(request, upload_id):
+    session = _get_upload(upload_id)
+    if session is None:
+        return Response({'error': 'Phiên upload không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+    if session.status == UploadSession.STATUS_USED:
+        return Response({'error': 'Phiên upload đã được dùng'}, status=status.HTTP_400_BAD_REQUEST)
+    uploads.abort(session)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 # Lấy danh sách người dùng
 @api_view(['GET'])
 def get_users(request):
@@ -515,7 +957,9 @@ def get_users(request):
 def add_user(request):
     serializer = UserSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            user = serializer.save()
+            stats.user_created(user)
         new_user_data = serializer.data
         new_user_data['isPremium'] = bool(new_user_data['isPremium'])  # Chuyển 0/1 thành false/true
         return Response(new_user_data, status=status.HTTP_201_CREATED)
@@ -523,6 +967,7 @@ def add_user(request):
 
 # Đăng nhập người dùng
 @api_view(['POST'])
+@throttle_classes([ratelimit.LoginRateLimit])
 def login_user(request):
     email = request.data.get('email')
     password = request.data.get('password')
@@ -532,11 +977,13 @@ def login_user(request):
         user = User.objects.get(email=email)
     except User.DoesNotExist:
         return Response({'error': 'Sai email hoặc mật khẩu'}, status=status.HTTP_401_UNAUTHORIZED)
-    if password != user.password_hash:
+    if not auth.verify_password(user, password):
         return Response({'error': 'Sai email hoặc mật khẩu'}, status=status.HTTP_401_UNAUTHORIZED)
     if hasattr(user, 'status') and user.status != 1:
         return Response({'error': 'Tài khoản đã bị khóa hoặc chưa kích hoạt'}, status=status.HTTP_403_FORBIDDEN)
     return Response({
+        'token': auth.issue_token(user),
+        'expires_in': settings.AUTH_TOKEN_MAX_AGE,
         'user': {
             'id': user.id,
             'username': user.username,
@@ -546,6 +993,14 @@ def login_user(request):
         }
     }, status=status.HTTP_200_OK)
 
+# Người dùng của token hiện tại (Authorization: Bearer ...), lấy từ cache token nên không query DB
+@api_view(['GET'])
+def get_current_user(request):
+    user = auth.current_user(request)
+    if user is None:
+        return Response({'error': 'Cần đăng nhập'}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({'id': user.id, 'username': user.username, 'email': user.email, 'isPremium': user.isPremium})
+
 # Cập nhật thông tin người dùng
 @api_view(['PUT'])
 def update_user(request, pk):
@@ -587,7 +1042,9 @@ def delete_user(request, pk):
         user = User.objects.get(pk=pk)
     except User.DoesNotExist:
         return Response({"error": "Người dùng không tồn tại."}, status=status.HTTP_404_NOT_FOUND)
-    user.delete()
+    with transaction.atomic():
+        user.delete()
+        stats.user_deleted(user)
     return Response({"message": "Đã xóa người dùng thành công."}, status=status.HTTP_204_NO_CONTENT)
 
 #Đổi mật khẩu của người dùng
@@ -601,19 +1058,22 @@ def change_password(request, pk):
     current_password = request.data.get('current_password')
     new_password = request.data.get('new_password')
 
-    # Check if current password matches (plain text comparison)
-    if user.password_hash != current_password:
+    # Token của người khác không được đổi mật khẩu user này
+    if auth.resolve_user_id(request, user.id) != user.id:
+        return Response({"error": "Không có quyền đổi mật khẩu người dùng này."}, status=status.HTTP_403_FORBIDDEN)
+
+    # Check if current password matches
+    if not current_password or not auth.verify_password(user, current_password):
         return Response({"error": "Mật khẩu hiện tại không chính xác."}, status=status.HTTP_400_BAD_REQUEST)
 
     # Ensure new password is at least 6 characters
-    if len(new_password) < 6:
+    if not new_password or len(new_password) < 6:
         return Response({"error": "Mật khẩu mới phải có ít nhất 6 ký tự."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Update password_hash (plain text)
-    user.password_hash = new_password
-    user.save()
+    # Lưu bản băm; mọi token cũ của user hết hiệu lực, trả về token mới cho phiên hiện tại
+    auth.set_password(user, new_password)
 
-    return Response({"message": "Mật khẩu đã được thay đổi thành công."}, status=status.HTTP_200_OK)
+    return Response({"message": "Mật khẩu đã được thay đổi thành công.", "token": auth.issue_token(user)}, status=status.HTTP_200_OK)
 # Lấy tin nhắn giữa 2 người dùng
 @api_view(['GET'])
 def get_messages_between_users(request):
@@ -629,17 +1089,23 @@ def get_messages_between_users(request):
     except User.DoesNotExist:
         return Response({"error": "Người dùng không tồn tại."}, status=404)
 
-    messages = Message.objects.filter(
-        Q(sender=sender, receiver=receiver) | Q(sender=receiver, receiver=sender)
-    ).order_by("timestamp")
+    # Đọc theo index (conversation, timestamp, id) thay vì OR hai cặp sender/receiver
+    conversation = Conversation.objects.between(sender.id, receiver.id).first()
+    messages = conversation.messages.all() if conversation else Message.objects.none()
+    if MessageHistoryPagination.is_requested(request):
+        # limit / before: trang tin mới nhất, before=next_cursor để đọc các tin cũ hơn
+        paginator = MessageHistoryPagination(request)
+        page = paginator.paginate_queryset(messages)
+        return Response(paginator.get_paginated_data(MessageSerializer(page, many=True).data))
 
-    serializer = MessageSerializer(messages, many=True)
+    serializer = MessageSerializer(messages.order_by('timestamp', 'id'), many=True)
     return Response(serializer.data)
 
 # Gửi tin nhắn giữa 2 người dùng
 @api_view(['POST'])
+@throttle_classes([ratelimit.MessageRateLimit])
 def send_message(request):
-    sender_id = request.data.get('sender_id')
+    sender_id = auth.resolve_user_id(request, request.data.get('sender_id'))
     receiver_id = request.data.get('receiver_id')
     content = request.data.get('content')
 
@@ -659,11 +1125,22 @@ def send_message(request):
         )
 
     try:
-        message = Message.objects.create(
-            sender=sender,
-            receiver=receiver,
-            content=content
-        )
+        low, high = sorted((sender.id, receiver.id))
+        with transaction.atomic():
+            conversation, _ = Conversation.objects.get_or_create(user_low_id=low, user_high_id=high)
+            message = Message.objects.create(
+                conversation=conversation,
+                sender=sender,
+                receiver=receiver,
+                content=content
+            )
+            Conversation.objects.filter(pk=conversation.pk).update(
+                last_message=message, last_message_at=message.timestamp
+            )
+            # Tin mình gửi thì coi như mình đã đọc
+            conversation.mark_read(sender.id, message.id)
+        # Đẩy tới cả hai người qua WebSocket sau khi commit (app/realtime.py)
+        realtime.publish_message(message)
         serializer = MessageSerializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     except Exception as e:
@@ -673,6 +1150,36 @@ def send_message(request):
         )
 
 
+# Hộp thư: các cuộc trò chuyện của user, tin nhắn cuối và số tin chưa đọc (một query)
+@api_view(['GET'])
+def get_inbox(request):
+    user_id = auth.resolve_user_id(request, request.GET.get('user_id'))
+    if not user_id:
+        return Response({"error": "user_id là bắt buộc."}, status=status.HTTP_400_BAD_REQUEST)
+    conversations = Conversation.objects.inbox(user_id)
+    serializer = ConversationSerializer(conversations, many=True, context={'user_id': user_id})
+    return Response(serializer.data)
+
+# Đánh dấu đã đọc tới message_id (mặc định: tin nhắn cuối) trong cuộc trò chuyện với other_id
+@api_view(['POST'])
+def mark_messages_read(request):
+    user_id = auth.resolve_user_id(request, request.data.get('user_id'))
+    other_id = request.data.get('other_id')
+    if not user_id or not other_id:
+        return Response({"error": "user_id và other_id là bắt buộc."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        conversation = Conversation.objects.between(user_id, other_id).get()
+    except (Conversation.DoesNotExist, ValueError):
+        return Response({"error": "Cuộc trò chuyện không tồn tại."}, status=status.HTTP_404_NOT_FOUND)
+    message_id = request.data.get('message_id') or conversation.last_message_id
+    try:
+        message_id = int(message_id) if message_id else None
+    except (TypeError, ValueError):
+        return Response({'error': 'message_id phải là số nguyên'}, status=status.HTTP_400_BAD_REQUEST)
+    if message_id:
+        conversation.mark_read(user_id, message_id)
+    return Response({'message': 'Đã đánh dấu đã đọc'}, status=status.HTTP_200_OK)
+
 
 # @api_view(['POST'])
 # def create_vnpay_payment(request):
@@ -748,10 +1255,12 @@ def send_message(request):
 #         return Response({'status': 'failed', 'message': 'Thanh toán thất bại'}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@throttle_classes([ratelimit.PaymentRateLimit])
 def create_vnpay_payment(request):
-    user_id = request.data.get('user_id')
+    # Người thanh toán lấy từ token; user_id gửi kèm (nếu có) phải trùng
+    user_id = auth.resolve_user_id(request, request.data.get('user_id'))
     if not user_id:
-        return Response({'error': 'Thiếu user_id trong request'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'error': 'Cần đăng nhập để thanh toán'}, status=status.HTTP_401_UNAUTHORIZED)
 
     try:
         user = User.objects.get(id=user_id)
@@ -19,6 +19,7 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
 # Application definition
 INSTALLED_APPS = [
+    'daphne',  # runserver chạy qua ASGI (HTTP + WebSocket), phải đứng trước staticfiles
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -39,6 +40,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.db.middleware.DatabaseRequestMiddleware',  # số liệu pool theo request, ghim primary sau khi ghi
 ]
 
 # Cấu hình CORS
@@ -87,22 +89,47 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Channel layer cho WebSocket (app/realtime.py); InMemoryChannelLayer chỉ dùng được với một
+# tiến trình (dev/test). Prod chạy nhiều worker daphne thì dùng Redis:
+#   {'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [('127.0.0.1', 6379)]}}
+CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
 
 # Database
+# ENGINE 'app.db.mysql' là backend MySQL của Django cộng pool kết nối (app/db/pool.py): mỗi tiến trình giữ
+# tối đa max_size kết nối, request mượn rồi trả lại thay vì mở / đóng kết nối MySQL mỗi lần.
+# CONN_MAX_AGE để 0 vì pool đã giữ kết nối; pool: False để quay về mở kết nối theo request.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'app.db.mysql',
         'NAME': 'spotify_clone',
         'USER': 'root',
         'PASSWORD': '123456',
         'HOST': '127.0.0.1',
         'PORT': '3306',
+        'CONN_MAX_AGE': 0,
         'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'pool': {
+                'max_size': 10,  # kết nối tối đa mỗi tiến trình
+                'timeout': 5,  # giây chờ khi pool hết kết nối
+                'max_lifetime': 1800,  # giây, nhỏ hơn wait_timeout của MySQL
+                'check_after': 30,  # kết nối rảnh lâu hơn được ping trước khi dùng
+            },
         }
     }
 }
 
+# Đọc catalog từ replica (app/db/router.py). Thêm replica vào DATABASES rồi liệt kê alias ở đây, ví dụ:
+#   DATABASES['replica'] = {**DATABASES['default'], 'HOST': '10.0.0.2', 'TEST': {'MIRROR': 'default'}}
+#   DATABASE_REPLICAS = ['replica']
+# Danh sách rỗng: mọi truy vấn vào default.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['app.db.router.PrimaryReplicaRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -135,6 +162,166 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/audio/'
 MEDIA_ROOT = BASE_DIR / 'audio'
 
+# Ảnh bìa album được frontend phục vụ trực tiếp từ frontend/uploads/albums
+ALBUM_COVER_ROOT = BASE_DIR.parent / 'frontend' / 'uploads' / 'albums'
+
+# Lưu file theo nội dung (app/storage.py): gc_storage chỉ xóa file không còn tham chiếu
+# đã cũ hơn khoảng thời gian này, tránh xóa nhầm file vừa upload chưa kịp gắn vào bản ghi
+STORAGE_GC_GRACE_SECONDS = 3600
+
+# Phát audio (app/streaming.py)
+# None: Django tự đọc file; 'x-accel-redirect' (nginx) hoặc 'x-sendfile' (Apache) để web server gửi file
+AUDIO_SENDFILE_BACKEND = None
+AUDIO_ACCEL_REDIRECT_PREFIX = '/protected-audio/'  # location internal trong nginx trỏ tới MEDIA_ROOT
+AUDIO_CACHE_CONTROL = 'public, max-age=86400'
+
+# Link phát có chữ ký (app/stream_urls.py): API bài hát trả stream_url /audio/_signed/<token>/<file>
+# theo gói của người gọi, view phát file chỉ kiểm tra HMAC thay vì query bài hát / user mỗi request
+AUDIO_SIGNED_URLS = True  # False: stream_url là /audio/<file> như cũ (vẫn không cấp cho bài Premium)
+AUDIO_SIGNED_URLS_REQUIRED = True  # từ chối /audio/<file> không chữ ký; False chỉ để client cũ chưa dùng stream_url
+AUDIO_STREAM_URL_TTL = 6 * 60 * 60  # giây link còn hiệu lực
+AUDIO_STREAM_URL_ROUND = 10 * 60  # hạn làm tròn lên bội số này: link không đổi trong 10 phút, cache được
+
+# Phân trang danh sách bài hát (/api/songs/?limit=...)
+SONGS_PAGE_DEFAULT_LIMIT = 50
+SONGS_PAGE_MAX_LIMIT = 200
+
+# Phân trang lịch sử tin nhắn (/api/messages/?limit=...&before=...)
+MESSAGES_PAGE_DEFAULT_LIMIT = 50
+MESSAGES_PAGE_MAX_LIMIT = 200
+
+# Số ảnh bìa xem trước trong danh sách playlist (cover_images)
+PLAYLIST_COVER_PREVIEW = 4
+PLAYLIST_COVER_PREVIEW_SIZE = 300  # cỡ ảnh thu nhỏ (app/thumbnails.py) dùng cho ảnh xem trước nếu đã có
+
+# Tìm kiếm bài hát qua chỉ mục song_search_tokens (app/search.py)
+SEARCH_MAX_RESULTS = 500
+SEARCH_SUGGEST_LIMIT = 10
+
+# Chuyển mã nhiều mức bitrate sau khi upload (app/transcoding.py)
+TRANSCODE_ENABLED = True
+TRANSCODE_ENCODER = 'app.transcoding.FFmpegEncoder'  # 'app.transcoding.StubEncoder' khi không có ffmpeg
+TRANSCODE_FFMPEG_BINARY = 'ffmpeg'
+TRANSCODE_BITRATES = [64, 128, 320]  # kbps
+TRANSCODE_HLS_SEGMENT_SECONDS = None  # ví dụ 10 để tạo thêm các đoạn HLS
+TRANSCODE_WORKERS = 2  # 0: chuyển mã ngay trong request (chỉ dùng cho test)
+TRANSCODE_FREE_MAX_BITRATE = 128
+TRANSCODE_PREMIUM_MAX_BITRATE = 320
+TRANSCODE_QUALITY_BITRATES = {'low': 64, 'normal': 128, 'high': 320}
+
+# Ảnh thu nhỏ cho ảnh bìa album / playlist (app/thumbnails.py, lệnh build_cover_thumbnails)
+COVER_THUMBNAILS_ENABLED = True
+COVER_THUMBNAIL_SIZES = [64, 300, 640]  # cạnh dài, px
+COVER_THUMBNAIL_FORMATS = ['webp', 'jpeg']  # jpeg cho trình duyệt không hỗ trợ WebP
+COVER_THUMBNAIL_QUALITY = 80
+COVER_THUMBNAIL_WORKERS = 2  # 0: tạo ngay sau commit (chỉ dùng cho test)
+
+# Đọc thời lượng / bitrate / ảnh bìa từ file MP3 sau khi upload (app/audiometa.py)
+AUDIO_METADATA_ENABLED = True
+AUDIO_METADATA_WORKERS = 2  # số tiến trình con; 0: đọc ngay sau commit (chỉ dùng cho test)
+
+# Gom lượt nghe rồi ghi theo lô (app/playcounts.py)
+# Đặt PLAY_COUNT_FLUSH_INTERVAL = 0 để ghi ngay từng lượt
+PLAY_COUNT_FLUSH_INTERVAL = 5  # giây
+PLAY_COUNT_FLUSH_THRESHOLD = 1000  # số lượt đang chờ thì flush sớm
+PLAY_LOG_PATH = None  # ví dụ BASE_DIR / 'logs' / 'plays.jsonl' để bật nhật ký lượt nghe
+
+# Cache response các API đọc catalog (app/catalog_cache.py)
+# Prod: đổi alias 'catalog' sang Redis để mọi worker dùng chung, ví dụ
+#   {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_ENABLED = True
+# Thay đổi qua view / admin làm cũ cache ngay; TTL chỉ giới hạn độ trễ của play_count
+# (ghi theo lô bằng update(), không làm cũ cache)
+CATALOG_CACHE_TIMEOUT = 60  # giây
+
+# Các API đọc catalog hay gọi nhất (bài hát, album, nghệ sĩ, playlist) dùng bản async trong
+# app/async_views.py. Để True khi phục vụ HTTP bằng ASGI (daphne backend.asgi, cũng là cách
+# runserver chạy); False nếu HTTP chạy qua backend.wsgi (gunicorn...) để khỏi dựng event loop mỗi
+# request. So sánh hai cách chạy: python manage.py benchmark http
+CATALOG_ASYNC_VIEWS = True
+
+# Bảng xếp hạng (app/charts.py), cập nhật sau mỗi lần flush lượt nghe
+CHARTS_ENABLED = True
+CHARTS_TOP_N = 100
+CHARTS_SCOPES = ('artist', 'album')  # () để chỉ giữ bảng xếp hạng chung
+CHARTS_SCOPED_TOP_N = 20  # top-N cho bảng theo nghệ sĩ / album
+CHARTS_RETENTION_DAYS = 35  # rebuild_charts --prune xóa dữ liệu ngày / tuần cũ hơn
+
+# Gợi ý bài hát tương tự từ playlist (app/recommendations.py); chỉ mục lưu dạng file .npy
+# đọc bằng mmap, tạo lần đầu bằng: python manage.py rebuild_recommendations
+RECOMMENDATIONS_ENABLED = True
+RECOMMENDATIONS_DIR = BASE_DIR / 'data' / 'recommendations'
+RECOMMENDATIONS_TOP_K = 50  # số bài tương tự giữ lại cho mỗi bài
+RECOMMENDATIONS_MAX_PLAYLIST_SIZE = 500  # playlist dài hơn bị bỏ qua khi đếm cặp
+RECOMMENDATIONS_ASYNC = True  # False: cập nhật ngay khi commit (chỉ dùng cho test)
+
+# Radio (app/radio.py): hàng đợi phát sinh từ bài hát / nghệ sĩ / playlist
+RADIO_CACHE_ALIAS = 'default'  # phiên radio; cần cache dùng chung (Redis) khi chạy nhiều tiến trình
+RADIO_SESSION_TIMEOUT = 60 * 60
+RADIO_PAGE_SIZE = 20
+RADIO_MAX_PAGE_SIZE = 100
+RADIO_PAGE_BUDGET_MS = 150  # hết hạn thì trả về số bài đã có
+RADIO_HYDRATE_RESERVE_MS = 20  # phần cuối của budget dành cho câu SELECT lấy thông tin lô cuối
+RADIO_BATCH_SIZE = 50  # số id mỗi câu SELECT khi lấy thông tin ứng viên
+RADIO_TIER_LIMIT = 200  # số ứng viên tối đa lấy từ bài của nghệ sĩ / playlist gốc
+RADIO_SEED_FANOUT = 10  # số bài gốc dùng để lấy bài tương tự khi seed là nghệ sĩ / playlist
+RADIO_HISTORY_SIZE = 500  # số bài vừa phát được nhớ để không lặp lại
+RADIO_ARTIST_SPACING = 3  # không phát hai bài cùng nghệ sĩ trong khoảng này nếu tránh được
+RADIO_DIVERSITY_WINDOW = 10  # số ứng viên xem trước khi xếp lại
+
+# Import catalog hàng loạt (app/catalog_import.py, lệnh import_catalog, API /api/catalog/imports/)
+CATALOG_IMPORT_ROOT = BASE_DIR / 'imports'  # API chỉ đọc manifest / thư mục audio nằm trong đây
+CATALOG_IMPORT_BATCH_SIZE = 1000  # số dòng manifest mỗi transaction
+CATALOG_IMPORT_COPY_WORKERS = 8  # số luồng chép file audio song song
+CATALOG_IMPORT_WORKERS = 1  # số job chạy nền cùng lúc; 0: chạy ngay khi commit (chỉ dùng cho test)
+CATALOG_IMPORT_MAX_ERRORS = 100  # số lỗi từng dòng được lưu lại trong job
+
+# Upload file audio chia nhỏ, tiếp tục được (app/uploads.py, API /api/uploads/, lệnh clean_uploads)
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024  # byte
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # cỡ chunk gợi ý cho client
+UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 * 1024  # chunk lớn hơn bị từ chối
+UPLOAD_SESSION_TIMEOUT = 24 * 60 * 60  # phiên không cập nhật lâu hơn bị clean_uploads xóa
+UPLOAD_FINALIZE_WAIT = 30  # giây một request finalize chờ request khác đang finalize cùng phiên
+# Vùng tạm của chunk chưa kiểm tra: ngoài MEDIA_ROOT để không phát được qua /audio/; nên cùng ổ đĩa
+# với MEDIA_ROOT để finalize chỉ đổi tên file (khác ổ thì chép)
+UPLOAD_STAGING_DIR = BASE_DIR / 'upload_staging'
+
+# Đăng nhập (app/auth.py): mật khẩu băm bằng hasher đầu tiên, các hasher sau chỉ để đọc mật khẩu
+# băm theo kiểu cũ (được băm lại khi người dùng đăng nhập đúng). Scrypt mặc định tốn ~0.25s CPU mỗi lần
+# kiểm tra, đo bằng: python manage.py benchmark login
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+]
+AUTH_TOKEN_MAX_AGE = 7 * 24 * 3600  # giây; token hết hạn phải đăng nhập lại
+AUTH_TOKEN_CACHE_SIZE = 10000  # số token đã kiểm tra được giữ trong LRU mỗi tiến trình
+AUTH_TOKEN_CACHE_TTL = 60  # giây; độ trễ tối đa để tiến trình khác thấy user bị khóa / đổi premium
+AUTH_REQUIRE_TOKEN = True  # không nhận user_id do client tự gửi khi không có token; False chỉ cho client cũ
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['app.auth.TokenAuthentication'],
+}
+
+# Giới hạn tần suất (app/ratelimit.py): 'N/s|min|hour|day' theo scope và loại khóa (user / ip / email)
+RATELIMIT_ENABLED = True
+RATELIMIT_STORE = None  # None: bộ nhớ tiến trình; alias trong CACHES (Redis) khi chạy nhiều worker
+RATELIMIT_MEMORY_MAX_KEYS = 100000  # số bucket tối đa giữ trong bộ nhớ mỗi tiến trình
+RATELIMIT_RULES = {
+    'play': {'user': '30/min', 'ip': '300/min'},
+    'message': {'user': '60/min', 'ip': '300/min'},
+    'login': {'email': '5/min', 'ip': '30/min'},
+    'payment': {'user': '5/min', 'ip': '20/min'},
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -1,4 +1,6 @@
 import React, { createContext, useContext, useState, useRef, ReactNode, useEffect } from "react";
+import { coverUrl } from "./services/covers";
+import { authHeaders, streamUrl } from "./services/streams";
 
 type Song = {
   id: number;
@@ -7,6 +9,7 @@ type Song = {
   album: string | null;
   duration: number;
   song_url: string;
+  stream_url: string | null;
   image_url: string;
   premium: number;
 };
@@ -24,8 +27,26 @@ type AudioContextType = {
   setSongList: (songs: Song[]) => void;
   songList: Song[];
   playbackHistory: Song[];
+  startRadio: (seedType: RadioSeed, seedId: number) => Promise<void>;
+  isRadio: boolean;
 };
 
+type RadioSeed = "song" | "artist" | "playlist";
+
+const RADIO_URL = "http://127.0.0.1:8000/api/radio/";
+
+const toSong = (song: any): Song => ({
+  id: song.id,
+  name: song.name || "Unknown Song",
+  artist: song.artist_name || "Unknown Artist",
+  album: song.album_name || null,
+  duration: song.duration || 1,
+  song_url: song.song_url || "",
+  stream_url: song.stream_url || null,
+  image_url: coverUrl(song.album_img, song.album_thumbs, 300),
+  premium: song.premium || 0,
+});
+
 const AudioContext = createContext<AudioContextType | undefined>(undefined);
 
 export const useAudio = () => {
@@ -44,6 +65,39 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
   const [songList, setSongList] = useState<Song[]>([]);
   const [playbackHistory, setPlaybackHistory] = useState<Song[]>([]);
   const audioRef = useRef<HTMLAudioElement>(null);
+  // Phiên radio ở server: hết danh sách thì lấy trang tiếp theo thay vì quay lại bài đầu
+  const radioSession = useRef<string | null>(null);
+  const [isRadio, setIsRadio] = useState(false);
+
+  const fetchRadioPage = async (params: Record<string, string>) => {
+    const response = await fetch(`${RADIO_URL}?${new URLSearchParams(params)}`, { headers: authHeaders() });
+    if (!response.ok) throw new Error(`Radio request failed: ${response.status}`);
+    const data = await response.json();
+    radioSession.current = data.session;
+    return (data.results as any[]).map(toSong);
+  };
+
+  const startRadio = async (seedType: RadioSeed, seedId: number) => {
+    const user = JSON.parse(localStorage.getItem("user") || "{}");
+    const params: Record<string, string> = { seed_type: seedType, seed_id: String(seedId) };
+    if (user?.id) params.user_id = String(user.id);
+    if (playbackHistory.length > 0) params.recent = playbackHistory.map((song) => song.id).join(",");
+    try {
+      const songs = await fetchRadioPage(params);
+      setIsRadio(true);
+      setSongList(songs);
+      if (songs.length > 0) handlePlaySong(songs[0]);
+    } catch (error) {
+      console.error("Error starting radio:", error);
+      alert("Không thể bắt đầu radio. Vui lòng thử lại.");
+    }
+  };
+
+  const setPlainSongList = (songs: Song[]) => {
+    radioSession.current = null;
+    setIsRadio(false);
+    setSongList(songs);
+  };
 
   // Gắn các sự kiện audio để cập nhật trạng thái (chỉ cho audio)
   useEffect(() => {
@@ -77,6 +131,17 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
     const isUserPremium = user?.isPremium === true;
 
     let currentIndex = songList.findIndex((song) => song.id === currentSong.id);
+    if (radioSession.current && currentIndex === songList.length - 1) {
+      // Radio: bài cuối của trang hiện tại, server đã lọc sẵn premium / status cho user
+      fetchRadioPage({ session: radioSession.current })
+        .then((songs) => {
+          if (songs.length === 0) return;
+          setSongList((prev) => [...prev, ...songs]);
+          handlePlaySong(songs[0]);
+        })
+        .catch((error) => console.error("Error loading radio:", error));
+      return;
+    }
     let nextIndex = (currentIndex + 1) % songList.length;
     let attempts = 0;
     while (attempts < songList.length) {
@@ -110,6 +175,11 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
 
     const audio = audioRef.current;
     const isVideo = song.song_url.endsWith(".mp4");
+    const audioUrl = streamUrl(song);
+    if (!isVideo && !audioUrl) {
+      alert("Không thể phát bài hát này.");
+      return;
+    }
 
     try {
       // Pause and clear audio for any new song to prevent overlap
@@ -122,8 +192,7 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
           setIsPlaying(false);
         } else {
           if (!isVideo) {
-            const audioUrl = `http://127.0.0.1:8000/audio/${song.song_url}`;
-            audio.src = audioUrl;
+            audio.src = audioUrl!;
             await audio.play();
           }
           setIsPlaying(true);
@@ -132,8 +201,7 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
         setCurrentSong(song);
         setPlaybackHistory((prev) => [...prev, song].slice(-10));
         if (!isVideo) {
-          const audioUrl = `http://127.0.0.1:8000/audio/${song.song_url}`;
-          audio.src = audioUrl;
+          audio.src = audioUrl!;
           await audio.play();
         }
         setIsPlaying(true);
@@ -204,9 +272,11 @@ export const AudioProvider = ({ children }: { children: ReactNode }) => {
         seek,
         currentTime,
         duration,
-        setSongList,
+        setSongList: setPlainSongList,
         songList,
         playbackHistory,
+        startRadio,
+        isRadio,
       }}
     >
       <audio ref={audioRef} />
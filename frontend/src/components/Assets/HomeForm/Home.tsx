@@ -2,6 +2,8 @@ import React, { useState, useEffect } from "react";
 import { PlayIcon, CircleEllipsis, Download } from "lucide-react";
 import { useAudio } from "../../../AudioContext";
 import {useNavigate} from "react-router-dom";
+import { coverUrl, CoverThumbnails } from "../../../services/covers";
+import { authHeaders, streamUrl } from "../../../services/streams";
 
 interface Song {
   id: number;
@@ -10,6 +12,7 @@ interface Song {
   album: string | null;
   duration: number;
   song_url: string;
+  stream_url: string | null;
   image_url: string;
   premium: number;
   isVideo: boolean;
@@ -18,6 +21,7 @@ interface Album {
   id: number;
   name: string;
   cover_image: string;
+  cover_thumbnails?: CoverThumbnails;
   artist_name: string;
   status: number;
 }
@@ -44,7 +48,7 @@ const Home: React.FC = () => {
     const fetchTopSongs = async () => {
       setIsLoading(true);
       try {
-        const response = await fetch("http://localhost:8000/api/songs/");
+        const response = await fetch("http://localhost:8000/api/songs/", { headers: authHeaders() });
         if (!response.ok) throw new Error("Không thể tải bảng xếp hạng.");
         const data = await response.json();
         const sortedData = data.sort((a: any, b: any) => b.play_count - a.play_count);
@@ -59,9 +63,8 @@ const Home: React.FC = () => {
           album: song.album_name || null,
           duration: song.duration || 1,
           song_url: song.song_url || "",
-          image_url: song.album_img
-            ? `/uploads/albums/${song.album_img}`
-            : "/default-cover.png",
+          stream_url: song.stream_url || null,
+          image_url: coverUrl(song.album_img, song.album_thumbs, 300),
           premium: song.premium || 0,
           isVideo: song.song_url?.endsWith(".mp4") || false,
         }));
@@ -103,7 +106,11 @@ const Home: React.FC = () => {
       return;
     }
   
-    const songUrl = `http://localhost:8000/audio/${song.song_url}`;
+    const songUrl = streamUrl(song);
+    if (!songUrl) {
+      alert("Không thể tải bài hát này.");
+      return;
+    }
     const extension = song.song_url.split('.').pop(); // lấy phần mở rộng: mp3/mp4
   
     const xhr = new XMLHttpRequest();
@@ -149,7 +156,7 @@ const Home: React.FC = () => {
             >
               <div className="relative group">
                 <img
-                  src={`/uploads/albums/${album.cover_image}`}
+                  src={coverUrl(album.cover_image, album.cover_thumbnails, 300)}
                   alt={album.name}
                   className="w-full aspect-square object-cover rounded-md mb-3"
                 />
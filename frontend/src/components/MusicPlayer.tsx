@@ -10,6 +10,7 @@ import {
   VolumeIcon,
   ClockIcon,
   MicIcon,
+  RadioIcon,
 } from "lucide-react";
 import SleepTimer from "./SleepTimer";
 import LyricsModal from "./LyricsModal";
@@ -27,6 +28,8 @@ const MusicPlayer: React.FC = () => {
     duration,
     setSongList,
     songList,
+    startRadio,
+    isRadio,
   } = useAudio();
 
   const [isShuffled, setIsShuffled] = useState(false);
@@ -286,6 +289,15 @@ const MusicPlayer: React.FC = () => {
 
       {/* Điều khiển âm lượng và hẹn giờ */}
       <div className="w-1/4 flex justify-end items-center gap-2">
+        <button
+          onClick={() => startRadio("song", currentSong.id)}
+          title="Radio từ bài hát này"
+          className={`${
+            isRadio ? "text-green-500" : "text-gray-400"
+          } hover:text-white transition`}
+        >
+          <RadioIcon size={18} />
+        </button>
         <button
           onClick={() => setShowLyric(true)}
           className="text-gray-400 hover:text-white transition"
@@ -1,4 +1,5 @@
 import React, { useState, useRef, useEffect } from "react";
+import { authHeaders, streamUrl } from "../services/streams";
 
 interface PlayvideoProps {
     songId: number;
@@ -20,6 +21,7 @@ const Playvideo: React.FC<PlayvideoProps> = ({ songId, onClose }) => {
             headers: {
                 Accept: "application/json",
                 "Content-Type": "application/json",
+                ...authHeaders(),
             },
             });
 
@@ -38,7 +40,7 @@ const Playvideo: React.FC<PlayvideoProps> = ({ songId, onClose }) => {
             }));
 
             setSongData({
-            songUrl: data.song_url,
+            songUrl: streamUrl(data),
             lyrics: processedLyrics,
             });
         } catch (err: any) {
@@ -94,7 +96,7 @@ const Playvideo: React.FC<PlayvideoProps> = ({ songId, onClose }) => {
             <div className="relative flex-1">
                 <video
                 ref={videoRef}
-                src={`http://localhost:8000/audio/${songData.songUrl}`}
+                src={songData.songUrl || undefined}
                 className="h-full w-full object-cover rounded-xl border border-[#2A2A2A] shadow-lg"
                 controls
                 playsInline
@@ -2,6 +2,7 @@
 import { useState, useEffect } from "react";
 import { NavLink, useNavigate } from "react-router-dom";
 import { ListMusicIcon, PlusCircleIcon, Trash2Icon } from "lucide-react";
+import { authHeaders } from "../services/auth";
 
 interface Playlist {
   id: number;
@@ -41,7 +42,8 @@ const Sidebar: React.FC<SidebarProps> = ({ isLoggedIn, user }) => {
       setLoading(true);
       try {
         const response = await fetch(
-          `http://localhost:8000/api/playlists/?user_id=${user.id}`
+          "http://localhost:8000/api/playlists/",
+          { headers: authHeaders() }
         );
         if (!response.ok) throw new Error("Không thể tải danh sách playlist.");
         const data = await response.json();
@@ -75,7 +77,7 @@ const Sidebar: React.FC<SidebarProps> = ({ isLoggedIn, user }) => {
     try {
       const response = await fetch("http://localhost:8000/api/playlists/add/", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", ...authHeaders() },
         body: JSON.stringify({ name: newPlaylistName.trim(), user_id: user.id }),
       });
       if (!response.ok) throw new Error("Không thể tạo playlist.");
@@ -98,7 +100,7 @@ const Sidebar: React.FC<SidebarProps> = ({ isLoggedIn, user }) => {
     try {
       const response = await fetch(
         `http://localhost:8000/api/playlists/delete/${playlistId}/`,
-        { method: "DELETE" }
+        { method: "DELETE", headers: authHeaders() }
       );
       if (!response.ok) throw new Error("Không thể xóa playlist.");
       setPlaylists(playlists.filter((playlist) => playlist.id !== playlistId));
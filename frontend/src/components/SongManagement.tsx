@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import { Plus, Edit, Trash, RotateCcw, Save, XCircle, Music } from "lucide-react";
+import { authHeaders, streamUrl } from "../services/streams";
 
 interface Artist {
     id: number;
@@ -19,6 +20,7 @@ interface Song {
     artist: number;
     album: number | null;
     song_url?: string | null;
+    stream_url?: string | null;
     duration: number;
     status: number;
     premium: number;
@@ -63,7 +65,7 @@ export default function SongManager() {
                 const [artistsResponse, albumsResponse, songsResponse] = await Promise.all([
                     fetch(`${BASE_URL}/api/artists/`),
                     fetch(`${BASE_URL}/api/albums/`),
-                    fetch(`${BASE_URL}/api/songs/`),
+                    fetch(`${BASE_URL}/api/songs/`, { headers: authHeaders() }),
                 ]);
 
                 if (!artistsResponse.ok) throw new Error("Lỗi khi tải nghệ sĩ");
@@ -81,6 +83,7 @@ export default function SongManager() {
                     artist: song.artist || 0,
                     album: song.album || null,
                     song_url: song.song_url || null,
+                    stream_url: song.stream_url || null,
                     duration: song.duration || 1,
                     status: song.status ?? 1,
                     premium: song.premium !== undefined ? Number(song.premium) : 0,
@@ -230,7 +233,7 @@ export default function SongManager() {
             lyrics: song.lyrics || "",
         });
         setEditingSongId(song.id);
-        setAudioPreview(song.song_url ? `${BASE_URL}/audio/${song.song_url}` : null);
+        setAudioPreview(streamUrl(song));
         setAudioDuration(song.duration); // Set duration for editing
         setIsVideo(song.song_url?.endsWith(".mp4") || false);
         setIsFormVisible(true);
@@ -457,18 +460,20 @@ export default function SongManager() {
                                         <td className="p-5 text-gray-200">{getArtistName(song.artist)}</td>
                                         <td className="p-5 text-gray-200">{getAlbumName(song.album)}</td>
                                         <td className="p-5">
-                                            {song.song_url ? (
+                                            {song.song_url && streamUrl(song) ? (
                                                 song.song_url.endsWith(".mp4") ? (
                                                     <video controls className="w-full max-w-[300px] h-10">
-                                                        <source src={`${BASE_URL}/audio/${song.song_url}`} type="video/mp4" />
+                                                        <source src={streamUrl(song)!} type="video/mp4" />
                                                         Trình duyệt không hỗ trợ video.
                                                     </video>
                                                 ) : (
                                                     <audio controls className="w-full max-w-[300px] h-10">
-                                                        <source src={`${BASE_URL}/audio/${song.song_url}`} type="audio/mpeg" />
+                                                        <source src={streamUrl(song)!} type="audio/mpeg" />
                                                         Trình duyệt không hỗ trợ audio.
                                                     </audio>
                                                 )
+                                            ) : song.song_url ? (
+                                                <span className="text-gray-500 italic">Cần tài khoản Premium để nghe thử</span>
                                             ) : (
                                                 <span className="text-gray-500 italic">Không có file</span>
                                             )}
@@ -28,6 +28,7 @@ const UserMenu: React.FC<UserMenuProps> = ({
 
   const handleLogout = () => {
     localStorage.removeItem("token");
+    localStorage.removeItem("access_token");
     localStorage.removeItem("user");
     setIsLoggedIn(false);
     setUser(null);
@@ -1,7 +1,17 @@
 import { createRoot } from 'react-dom/client';
+import axios from 'axios';
 import { App } from './App';
 import './index.css';
 
+// Access token nhận khi đăng nhập: backend xác định người dùng từ header này thay cho user_id
+axios.interceptors.request.use((config) => {
+  const token = localStorage.getItem('access_token');
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
 const container = document.getElementById('root');
 const root = createRoot(container!);
 root.render(<App />);
\ No newline at end of file
@@ -2,6 +2,7 @@ import { useEffect, useState, useCallback } from "react";
 import axios from "axios";
 import { PlayIcon, Clock3Icon, CircleEllipsis } from "lucide-react";
 import { useAudio } from "../AudioContext";
+import { streamUrl } from "../services/streams";
 
 type Song = {
   id: number;
@@ -10,11 +11,14 @@ type Song = {
   album: string | null;
   duration: number;
   song_url: string;
+  stream_url: string | null;
   image_url: string;
   premium: number;
   isVideo: boolean;
 };
 
+const PAGE_SIZE = 50;
+
 const AllSongs: React.FC = () => {
   const [songs, setSongs] = useState<Song[]>([]);
   const [loading, setLoading] = useState(true);
@@ -23,35 +27,61 @@ const AllSongs: React.FC = () => {
   const user = JSON.parse(localStorage.getItem("user") || "{}");
   const isPremiumUser = user?.isPremium === true;
 
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Tải từng trang (mặc định không kèm lyrics), trang sau nối vào danh sách hiện có
+  const fetchSongs = useCallback(
+    (cursor: string | null) =>
+      axios
+        .get("http://127.0.0.1:8000/api/songs/", {
+          params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+        })
+        .then((response) => {
+          const mappedSongs = response.data.results.map((song: any) => ({
+            id: song.id,
+            name: song.name || "Unknown Song",
+            artist: song.artist_name || "Unknown Artist",
+            album: song.album_name || null,
+            duration: song.duration || 1,
+            song_url: song.song_url || "",
+            stream_url: song.stream_url || null,
+            image_url: song.album_img
+              ? `/uploads/albums/${song.album_img}`
+              : "/default-cover.png",
+            premium: song.premium || 0,
+            isVideo: song.song_url?.endsWith(".mp4") || false,
+          }));
+          setSongs((prev) => (cursor ? [...prev, ...mappedSongs] : mappedSongs));
+          setNextCursor(response.data.next_cursor);
+        })
+        .catch((error) => {
+          console.error("Error fetching songs:", error);
+          alert("Không thể tải danh sách bài hát.");
+        }),
+    []
+  );
+
+  useEffect(() => {
+    if (songs.length > 0) {
+      setSongList(songs);
+    }
+  }, [songs, setSongList]);
+
   useEffect(() => {
     setLoading(true);
-    axios
-      .get("http://127.0.0.1:8000/api/songs/")
-      .then((response) => {
-        const mappedSongs = response.data.map((song: any) => ({
-          id: song.id,
-          name: song.name || "Unknown Song",
-          artist: song.artist_name || "Unknown Artist",
-          album: song.album_name || null,
-          duration: song.duration || 1,
-          song_url: song.song_url || "",
-          image_url: song.album_img
-            ? `/uploads/albums/${song.album_img}`
-            : "/default-cover.png",
-          premium: song.premium || 0,
-          isVideo: song.song_url?.endsWith(".mp4") || false,
-        }));
-        setSongs(mappedSongs);
-        setSongList(mappedSongs);
-      })
-      .catch((error) => {
-        console.error("Error fetching songs:", error);
-        alert("Không thể tải danh sách bài hát.");
-      })
-      .finally(() => {
-        setLoading(false);
-      });
-  }, [setSongList]);
+    fetchSongs(null).finally(() => {
+      setLoading(false);
+    });
+  }, [fetchSongs]);
+
+  const handleLoadMore = useCallback(() => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    fetchSongs(nextCursor).finally(() => {
+      setLoadingMore(false);
+    });
+  }, [nextCursor, fetchSongs]);
 
   const handlePlayAll = useCallback(() => {
     if (songs.length > 0) {
@@ -69,7 +99,11 @@ const AllSongs: React.FC = () => {
     }
 
     // Proceed with download if the song is non-premium or the user is premium
-    const songUrl = `http://127.0.0.1:8000/audio/${song.song_url}`;
+    const songUrl = streamUrl(song);
+    if (!songUrl) {
+      alert("Không thể tải bài hát này.");
+      return;
+    }
     const xhr = new XMLHttpRequest();
     xhr.open("GET", songUrl, true);
     xhr.responseType = "blob";
@@ -192,6 +226,17 @@ const AllSongs: React.FC = () => {
           </tbody>
         </table>
       </div>
+      {nextCursor && (
+        <div className="flex justify-center p-5">
+          <button
+            onClick={handleLoadMore}
+            disabled={loadingMore}
+            className="px-6 py-2 bg-gray-800 text-white rounded-full hover:bg-gray-700 disabled:opacity-50"
+          >
+            {loadingMore ? "Đang tải..." : "Xem thêm"}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect } from "react";
 import { SendIcon, UserIcon, SearchIcon } from "lucide-react";
+import { authHeaders } from "../services/auth";
 
 interface Users {
   id: number;
@@ -17,6 +18,9 @@ interface Message {
   isCurrentUser: boolean;
 }
 
+// Số tin nhắn mỗi lần tải; tin cũ hơn tải thêm bằng cursor before=
+const HISTORY_PAGE_SIZE = 50;
+
 const Chat = () => {
   const [message, setMessage] = useState("");
   const [searchQuery, setSearchQuery] = useState("");
@@ -25,6 +29,7 @@ const Chat = () => {
   const [listUser, setListUsers] = useState<Users[]>([]);
   const [userMessages, setUserMessages] = useState<{ [key: string]: Message[] }>({});
   const [error, setError] = useState<string | null>(null);
+  const [olderCursors, setOlderCursors] = useState<{ [key: string]: string | null }>({});
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
@@ -64,7 +69,7 @@ const Chat = () => {
       try {
         const response = await fetch("http://127.0.0.1:8000/api/users/", {
           method: "GET",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", ...authHeaders() },
         });
 
         if (!response.ok) {
@@ -73,9 +78,18 @@ const Chat = () => {
 
         const data: Users[] = await response.json();
         console.log("Fetched users:", data);
+        // Trạng thái chưa đọc lấy từ hộp thư (số tin chưa đọc theo từng cuộc trò chuyện)
+        const inboxResponse = await fetch(
+          "http://127.0.0.1:8000/api/messages/inbox/",
+          { headers: authHeaders() }
+        );
+        const inbox: { user: { id: number }; unread: number }[] = inboxResponse.ok
+          ? await inboxResponse.json()
+          : [];
+        const unreadIds = new Set(inbox.filter((row) => row.unread > 0).map((row) => row.user.id));
         const filteredData = data
           .filter((user) => user.email !== currentUserEmail)
-          .map((user) => ({ ...user, unread: false }));
+          .map((user) => ({ ...user, unread: unreadIds.has(user.id) }));
         setListUsers(filteredData);
       } catch (error) {
         console.error("Error fetching users:", error);
@@ -88,6 +102,81 @@ const Chat = () => {
     }
   }, [currentUserEmail, currentUserId]);
 
+  const toMessage = (msg: any): Message => ({
+    id: msg.id,
+    user: "",
+    content: msg.content,
+    time: new Date(msg.timestamp).toLocaleTimeString([], {
+      hour: "2-digit",
+      minute: "2-digit",
+    }),
+    isCurrentUser: Number(msg.sender) === Number(currentUserId),
+  });
+
+  // Thêm một tin nhắn vào cuộc trò chuyện với partnerEmail, bỏ qua nếu đã có (cùng id)
+  const appendMessage = (partnerEmail: string, msg: Message) => {
+    setUserMessages((prev) => {
+      const existing = prev[partnerEmail] || [];
+      if (existing.some((item) => item.id === msg.id)) return prev;
+      return { ...prev, [partnerEmail]: [...existing, msg] };
+    });
+  };
+
+  const listUserRef = useRef<Users[]>([]);
+  const selectedUserRef = useRef<Users | null>(null);
+  useEffect(() => {
+    listUserRef.current = listUser;
+  }, [listUser]);
+  useEffect(() => {
+    selectedUserRef.current = selectedUser;
+  }, [selectedUser]);
+
+  // Nhận tin nhắn mới qua WebSocket thay vì tải lại cả cuộc trò chuyện
+  useEffect(() => {
+    if (!currentUserId) return;
+    let socket: WebSocket | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+
+    const token = localStorage.getItem("access_token");
+    if (!token) return;
+
+    const connect = () => {
+      // Xác thực bằng access token (subprotocol "bearer"), server lấy user từ token
+      socket = new WebSocket("ws://127.0.0.1:8000/ws/chat/", ["bearer", token]);
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type !== "message") return;
+        const msg = data.message;
+        const partnerId =
+          Number(msg.sender) === Number(currentUserId) ? Number(msg.receiver) : Number(msg.sender);
+        const partner = listUserRef.current.find((user) => user.id === partnerId);
+        if (!partner) return;
+        appendMessage(partner.email, toMessage(msg));
+        if (Number(msg.sender) === partnerId) {
+          if (selectedUserRef.current?.id === partnerId) {
+            markRead(partnerId);
+          } else {
+            setListUsers((prev) =>
+              prev.map((user) => (user.id === partnerId ? { ...user, unread: true } : user))
+            );
+          }
+        }
+      };
+      socket.onclose = () => {
+        // Kết nối lại sau vài giây nếu server khởi động lại / mất mạng
+        if (!closed) retryTimer = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+    };
+  }, [currentUserId]);
+
   // Gọi API để lấy tin nhắn
   const fetchMessages = async () => {
     if (!selectedUser || !currentUserId) {
@@ -97,10 +186,10 @@ const Chat = () => {
 
     try {
       const response = await fetch(
-        `http://127.0.0.1:8000/api/messages/?sender_id=${currentUserId}&receiver_id=${selectedUser.id}`,
+        `http://127.0.0.1:8000/api/messages/?sender_id=${currentUserId}&receiver_id=${selectedUser.id}&limit=${HISTORY_PAGE_SIZE}`,
         {
           method: "GET",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", ...authHeaders() },
         }
       );
 
@@ -111,7 +200,8 @@ const Chat = () => {
       const data = await response.json();
       console.log("Fetched messages:", JSON.stringify(data, null, 2));
 
-      const messages: Message[] = data.map((msg: any) => {
+      setOlderCursors((prev) => ({ ...prev, [selectedUser.email]: data.next_cursor }));
+      const messages: Message[] = data.results.map((msg: any) => {
         if (!msg.sender || msg.sender === undefined) {
           console.error(`Invalid sender data for message ID ${msg.id}:`, msg);
           return {
@@ -161,6 +251,7 @@ const Chat = () => {
         return updatedMessages;
       });
       setError(null);
+      markRead(selectedUser.id);
     } catch (error) {
       console.error("Error fetching messages:", error);
       setError("Failed to load messages. Please try again.");
@@ -171,6 +262,38 @@ const Chat = () => {
     }
   };
 
+  const markRead = (otherId: number) => {
+    fetch("http://127.0.0.1:8000/api/messages/read/", {
+      method: "POST",
+      headers: { "Content-Type": "application/json", ...authHeaders() },
+      body: JSON.stringify({ other_id: otherId }),
+    }).catch((error) => console.error("Error marking messages read:", error));
+  };
+
+  // Tải thêm các tin cũ hơn trang đang hiển thị
+  const loadOlderMessages = async () => {
+    if (!selectedUser) return;
+    const cursor = olderCursors[selectedUser.email];
+    if (!cursor) return;
+    try {
+      const response = await fetch(
+        `http://127.0.0.1:8000/api/messages/?sender_id=${currentUserId}&receiver_id=${selectedUser.id}&limit=${HISTORY_PAGE_SIZE}&before=${encodeURIComponent(cursor)}`,
+        { headers: authHeaders() }
+      );
+      if (!response.ok) throw new Error(`Failed to fetch messages: ${response.status}`);
+      const data = await response.json();
+      const older: Message[] = data.results.map(toMessage);
+      setOlderCursors((prev) => ({ ...prev, [selectedUser.email]: data.next_cursor }));
+      setUserMessages((prev) => ({
+        ...prev,
+        [selectedUser.email]: [...older, ...(prev[selectedUser.email] || [])],
+      }));
+    } catch (error) {
+      console.error("Error fetching older messages:", error);
+      setError("Failed to load messages. Please try again.");
+    }
+  };
+
   useEffect(() => {
     fetchMessages();
   }, [selectedUser, currentUserId]);
@@ -190,7 +313,7 @@ const Chat = () => {
       try {
         const response = await fetch("http://127.0.0.1:8000/api/send_message/", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", ...authHeaders() },
           body: JSON.stringify({
             sender_id: currentUserId,
             receiver_id: selectedUser.id,
@@ -207,7 +330,8 @@ const Chat = () => {
         const responseData = await response.json();
         console.log("Send message response:", responseData);
 
-        await fetchMessages();
+        // Không tải lại cả cuộc trò chuyện; WebSocket cũng đẩy tin này về nhưng bị bỏ qua vì trùng id
+        appendMessage(selectedUser.email, toMessage(responseData));
         // Xóa unread sau khi gửi tin nhắn
         setListUsers((prev) =>
           prev.map((user) =>
@@ -316,6 +440,16 @@ const Chat = () => {
 
             <div className="flex-1 p-4 overflow-y-auto">
               {error && <div className="text-red-500 text-center mb-4">{error}</div>}
+              {olderCursors[selectedUser.email] && (
+                <div className="flex justify-center mb-3">
+                  <button
+                    onClick={loadOlderMessages}
+                    className="text-sm text-gray-400 hover:text-white"
+                  >
+                    Xem tin nhắn cũ hơn
+                  </button>
+                </div>
+              )}
               {userMessages[selectedUser.email]?.length > 0 ? (
                 userMessages[selectedUser.email].map((msg) => (
                   <div
@@ -44,10 +44,11 @@ const LoginUser = ({ onLogin, setIsLoggedIn }: LoginUserProps) => {
           password,
         });
 
-        const { user } = response.data;
+        const { user, token } = response.data;
         console.log("User data from API (login):", user);
         user.isPremium = !!Number(user.isPremium); // Convert 0/1 to false/true
         localStorage.setItem("token", "logged_in");
+        localStorage.setItem("access_token", token); // gửi kèm mọi request qua interceptor trong index.tsx
         localStorage.setItem("user", JSON.stringify(user));
 
         if (onLogin) onLogin(email, password, user);
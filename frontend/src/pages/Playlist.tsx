@@ -9,6 +9,8 @@ import {
 } from "lucide-react";
 import { useState, useEffect, useCallback } from "react";
 import { useAudio } from "../AudioContext";
+import { coverUrl } from "../services/covers";
+import { authHeaders, streamUrl } from "../services/streams";
 
 type Song = {
   id: number;
@@ -17,6 +19,7 @@ type Song = {
   album: string | null;
   duration: number;
   song_url: string;
+  stream_url: string | null;
   image_url: string;
   premium: number;
   isVideo?: boolean;
@@ -61,7 +64,7 @@ const Playlist: React.FC = () => {
     const fetchPlaylist = async () => {
       setLoading(true);
       try {
-        const response = await fetch(`http://localhost:8000/api/playlists/${id}/`);
+        const response = await fetch(`http://localhost:8000/api/playlists/${id}/`, { headers: authHeaders() });
         if (!response.ok) throw new Error("Không thể tải playlist.");
         const data = await response.json();
         console.log("Playlist API response:", data); // Debug: Log API response
@@ -72,9 +75,8 @@ const Playlist: React.FC = () => {
           album: item.song.album_name || null, // Use album_name
           duration: item.song.duration,
           song_url: item.song.song_url,
-          image_url: item.song.album_img
-            ? `/uploads/albums/${item.song.album_img}`
-            : "/default-cover.png",
+          stream_url: item.song.stream_url || null,
+          image_url: coverUrl(item.song.album_img, item.song.album_thumbs, 300),
           premium: item.song.premium,
           isVideo: item.song.song_url?.endsWith(".mp4") || false,
         }));
@@ -91,7 +93,7 @@ const Playlist: React.FC = () => {
 
     const fetchAvailableSongs = async () => {
       try {
-        const response = await fetch("http://localhost:8000/api/songs/");
+        const response = await fetch("http://localhost:8000/api/songs/", { headers: authHeaders() });
         if (!response.ok) throw new Error("Không thể tải danh sách bài hát.");
         const data = await response.json();
         console.log("Songs API response:", data); // Debug: Log API response
@@ -102,9 +104,8 @@ const Playlist: React.FC = () => {
           album: song.album_name || null, // Use album_name
           duration: song.duration,
           song_url: song.song_url,
-          image_url: song.album_img
-            ? `/uploads/albums/${song.album_img}`
-            : "/default-cover.png",
+          stream_url: song.stream_url || null,
+          image_url: coverUrl(song.album_img, song.album_thumbs, 300),
           premium: song.premium,
           isVideo: song.song_url?.endsWith(".mp4") || false,
         }));
@@ -166,6 +167,7 @@ const Playlist: React.FC = () => {
           album: data.song.album_name || null, // Use album_name
           duration: data.song.duration,
           song_url: data.song.song_url,
+          stream_url: data.song.stream_url || song.stream_url,
           image_url: data.song.album_img
             ? `/uploads/albums/${data.song.album_img}`
             : "/default-cover.png",
@@ -231,7 +233,11 @@ const Playlist: React.FC = () => {
         alert("Bạn cần tài khoản Premium để tải bài hát này.");
         return;
       }
-      const songUrl = `http://localhost:8000/audio/${song.song_url}`;
+      const songUrl = streamUrl(song);
+      if (!songUrl) {
+        alert("Không thể tải bài hát này.");
+        return;
+      }
       const xhr = new XMLHttpRequest();
       xhr.open("GET", songUrl, true);
       xhr.responseType = "blob";
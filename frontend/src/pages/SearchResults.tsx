@@ -2,6 +2,7 @@ import { useEffect, useState, useRef } from "react";
 import axios from "axios";
 import { Clock3Icon, Download, PlayIcon } from "lucide-react";
 import { useAudio } from "../AudioContext";
+import { streamUrl } from "../services/streams";
 import { debounce } from "lodash";
 import { useNavigate, useLocation } from "react-router-dom";
 
@@ -13,10 +14,13 @@ type Song = {
   album_id: number;
   duration: number;
   song_url: string;
+  stream_url: string | null;
   image_url: string;
   premium: number;
 };
 
+const SEARCH_PAGE_SIZE = 30;
+
 const SearchResults: React.FC<{ query: string; searchTrigger?: boolean }> = ({
   query,
   searchTrigger,
@@ -46,10 +50,11 @@ const SearchResults: React.FC<{ query: string; searchTrigger?: boolean }> = ({
     try {
       console.log("Performing search with query:", searchQuery);
       const response = await axios.get("http://127.0.0.1:8000/api/songs/", {
-        params: { search: searchQuery },
+        // Chỉ lấy một màn hình kết quả, bỏ lyrics
+        params: { search: searchQuery, limit: SEARCH_PAGE_SIZE },
       });
       console.log("API response:", response.data);
-      const data = response.data.map((song: any) => ({
+      const data = response.data.results.map((song: any) => ({
         id: song.id,
         name: song.name || "Unknown Song",
         artist: song.artist_name || "Unknown Artist",
@@ -57,6 +62,7 @@ const SearchResults: React.FC<{ query: string; searchTrigger?: boolean }> = ({
         album_id: song.album,
         duration: song.duration || 0,
         song_url: song.song_url || "",
+        stream_url: song.stream_url || null,
         image_url: song.album_img
           ? `/Uploads/albums/${song.album_img}`
           : "/default-cover.png",
@@ -109,7 +115,11 @@ const SearchResults: React.FC<{ query: string; searchTrigger?: boolean }> = ({
       alert("Bạn cần tài khoản Premium để tải bài hát này.");
       return;
     }
-    const songUrl = `http://localhost:8000/audio/${song.song_url}`;
+    const songUrl = streamUrl(song);
+    if (!songUrl) {
+      alert("Không thể tải bài hát này.");
+      return;
+    }
     const xhr = new XMLHttpRequest();
     xhr.open("GET", songUrl, true);
     xhr.responseType = "blob";
@@ -58,6 +58,7 @@ const UserChangePassword: React.FC = () => {
             setNewPassword("");
             setConfirmNewPassword("");
             localStorage.removeItem("user");
+            localStorage.removeItem("access_token"); // token cũ hết hiệu lực sau khi đổi mật khẩu
             navigate("/login");
 
         } catch (err: any) {
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback} from "react";
 import { PlayIcon, Clock3Icon, MoreHorizontal, Download } from "lucide-react";
 import { useNavigate, useParams } from "react-router-dom";
 import { useAudio } from "../AudioContext";
+import { authHeaders, streamUrl } from "../services/streams";
 
 interface Song {
     id: number;
@@ -10,6 +11,7 @@ interface Song {
     duration: number;
     premium: number;
     song_url: string;
+    stream_url: string | null;
     album_img: string;
 }
 
@@ -56,7 +58,11 @@ const ViewAlbum: React.FC = () => {
             }
 
             // Proceed with download if the song is non-premium or the user is premium
-            const songUrl = `http://127.0.0.1:8000/audio/${song.song_url}`;
+            const songUrl = streamUrl(song);
+            if (!songUrl) {
+              alert("Không thể tải bài hát này.");
+              return;
+            }
             const xhr = new XMLHttpRequest();
             xhr.open("GET", songUrl, true);
             xhr.responseType = "blob";
@@ -95,7 +101,7 @@ const ViewAlbum: React.FC = () => {
                 }
                 const albumJson = await albumResponse.json();
                 
-                const songsResponse = await fetch(`http://localhost:8000/api/songs/album/${id}/`);
+                const songsResponse = await fetch(`http://localhost:8000/api/songs/album/${id}/`, { headers: authHeaders() });
                 if (!songsResponse.ok) {
                     throw new Error('Chưa có bài hát');
                 }
@@ -115,6 +121,7 @@ const ViewAlbum: React.FC = () => {
                         duration: song.duration || 1,
                         premium: song.premium || 0,
                         song_url: song.song_url || "",
+                        stream_url: song.stream_url || null,
                         image_url: song.album_img
                             ? `/uploads/albums/${song.album_img}`
                             : "/default-cover.png",
@@ -130,6 +137,7 @@ const ViewAlbum: React.FC = () => {
                     album: transformedData.name,
                     duration: song.duration || 1,
                     song_url: song.song_url,
+                    stream_url: song.stream_url,
                     image_url: song.album_img ? `/Uploads/albums/${song.album_img}` : (transformedData.cover_image ? `/Uploads/albums/${transformedData.cover_image}` : '/default-cover.png'),
                     premium: song.premium
                 }));
@@ -158,6 +166,7 @@ const ViewAlbum: React.FC = () => {
                     album: albumData.name,
                     duration: firstNonPremiumSong.duration,
                     song_url: firstNonPremiumSong.song_url,
+                    stream_url: firstNonPremiumSong.stream_url,
                     image_url: firstNonPremiumSong.album_img ? `/Uploads/albums/${firstNonPremiumSong.album_img}` : (albumData.cover_image ? `/Uploads/albums/${albumData.cover_image}` : '/default-cover.png'),
                     premium: firstNonPremiumSong.premium
                 });
@@ -246,6 +255,7 @@ const ViewAlbum: React.FC = () => {
                                 album: albumData.name,
                                 duration: song.duration,
                                 song_url: song.song_url,
+                                stream_url: song.stream_url,
                                 image_url: song.album_img ? `/Uploads/albums/${song.album_img}` : (albumData.cover_image ? `/Uploads/albums/${albumData.cover_image}` : '/default-cover.png'),
                                 premium: song.premium
                             })}
@@ -0,0 +1,6 @@
+// Header xác thực cho các request dùng fetch (axios tự gắn qua interceptor trong index.tsx):
+// backend xác định người dùng từ access token, không nhận user_id do client tự gửi
+export const authHeaders = (): Record<string, string> => {
+  const token = localStorage.getItem("access_token");
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
@@ -0,0 +1,19 @@
+// Ảnh bìa: dùng ảnh thu nhỏ do backend tạo sẵn (album_thumbs / cover_thumbnails) nếu có,
+// chưa có thì ảnh gốc. thumbs dạng {"64": {"webp": "...", "jpeg": "..."}, ...}
+export type CoverThumbnails = Record<string, Record<string, string>> | null | undefined;
+
+export const coverUrl = (
+  original: string | null | undefined,
+  thumbs: CoverThumbnails,
+  size: number,
+  fallback = "/default-cover.png"
+): string => {
+  const sizes = Object.keys(thumbs || {}).map(Number).sort((a, b) => a - b);
+  if (thumbs && sizes.length) {
+    const chosen = sizes.find((value) => value >= size) ?? sizes[sizes.length - 1];
+    const variant = thumbs[String(chosen)];
+    const name = variant.webp || variant.jpeg;
+    if (name) return `/uploads/albums/${name}`;
+  }
+  return original ? `/uploads/albums/${original}` : fallback;
+};
@@ -0,0 +1,9 @@
+// Link phát bài hát: API bài hát trả stream_url (/audio/_signed/<token>/<file>) theo gói của người
+// gọi nên request lấy bài phải gửi kèm access token (authHeaders); null khi bài Premium mà tài khoản
+// không phải Premium
+export { authHeaders } from "./auth";
+
+const AUDIO_HOST = "http://127.0.0.1:8000";
+
+export const streamUrl = (song: { stream_url?: string | null }): string | null =>
+  song.stream_url ? `${AUDIO_HOST}${song.stream_url}` : null;